@@ -3,9 +3,23 @@ import pymongo
 import pandas as pd
 from groq import Groq
 import os
+import time
+import json
 import requests
 from dotenv import load_dotenv
 from bson.objectid import ObjectId
+from crypto_queries import ensure_indexes, find_cryptos, find_cryptos_frame, cryptos_frame_from_rows
+from crypto_queries import count_cryptos, PAGE_SIZE, DISPLAY_FIELDS
+from crypto_queries import search_crypto, get_crypto_by_symbol, top_movers, category_stats, agent_limit
+from crypto_writes import new_coin, execute_batch, WRITE_TOOLS
+from snapshots import load_frame, MODIFIED_FIELD
+from market_summary import apply_change, refresh_summary, read_summary, TOP_N
+from read_cache import cached_read, bump_version
+from redis_cache import CryptoRedisCache
+from llm_cache import LLMCache
+from metrics import registry, serve
+from diagnostics import render_diagnostics
+from mongo_client import get_client, warm_pool
 
 st.set_page_config(page_title="Crypto Manager", page_icon="🏦", layout="wide")
 
@@ -13,45 +27,131 @@ st.set_page_config(page_title="Crypto Manager", page_icon="🏦", layout="wide")
 @st.cache_resource
 def init_connection():
     load_dotenv()
-    return pymongo.MongoClient(os.getenv("MONGO_URI"))
+    # Profil "ui" : pool gardé chaud, compression, échec rapide (voir mongo_client.py)
+    client = get_client("ui")
+    warm_pool(client)
+    return client
 
 client = init_connection()
 db = client["crypto_data"]
 collection = db["market_cap_clean"]
 
+@st.cache_resource
+def init_metrics_server():
+    # Exposition /metrics pour Prometheus si METRICS_PORT est défini
+    port = os.getenv("METRICS_PORT")
+    return serve(int(port)) if port else None
+
+init_metrics_server()
+
+@st.cache_resource
+def init_indexes():
+    ensure_indexes(collection)
+
+init_indexes()
+
+@st.cache_resource
+def init_redis():
+    # Optionnel : sans REDIS_URL (ou si Redis tombe), on lit directement MongoDB
+    return CryptoRedisCache()
+
+redis_cache = init_redis()
+
+@st.cache_resource
+def init_llm_cache():
+    return LLMCache(db["llm_cache"])
+
+llm_cache = init_llm_cache()
+
 # FONCTIONS CRUD
 
-def get_data():
-    """READ: Récupère tout"""
-    items = list(collection.find())
-    for item in items:
-        item['_id'] = str(item['_id'])
-    return items
+def get_market_frame():
+    """Toute la collection triée comme find_cryptos, depuis le snapshot Arrow (None sans snapshot)"""
+    def sort(frame):
+        with registry.timer("pandas_seconds", op="snapshot_sort"):
+            return frame.sort_values(["market_cap", "_id"], ascending=[False, True],
+                                     na_position="last", ignore_index=True)
+    with registry.timer("pandas_seconds", op="snapshot_load"):
+        return load_frame(collection, ["_id"] + DISPLAY_FIELDS, prepare=sort)
+
+def get_data(search="", categorie="Tout", page=0, page_size=PAGE_SIZE):
+    """READ: Récupère une page filtrée (filtre, tri et pagination côté MongoDB)"""
+    # Sans recherche : page découpée dans le snapshot en mémoire (la recherche par préfixe
+    # reste sur MongoDB, qui applique la collation insensible aux accents)
+    frame = None if (search or "").strip() else get_market_frame()
+    if frame is not None:
+        if categorie != "Tout":
+            frame = frame[frame["categorie"] == categorie]
+        return frame.iloc[page * page_size:(page + 1) * page_size]
+
+    params = ("get_data", search, categorie, page, page_size)
+
+    # Sans Redis : lots BSON décodés directement en colonnes typées (pas de dict par ligne)
+    if not redis_cache.enabled:
+        def load():
+            with registry.timer("pandas_seconds", op="arrow_page"):
+                return find_cryptos_frame(collection, search, categorie, page, page_size)
+        return cached_read(collection, params, load)
+
+    def fetch():
+        docs = find_cryptos(collection, search, categorie, page, page_size)
+        return [{**doc, "_id": str(doc["_id"])} for doc in docs]
+
+    # mémoire du process -> Redis (vue JSON partagée entre instances) -> MongoDB
+    def to_frame():
+        rows = redis_cache.read_view(list(params), fetch)
+        with registry.timer("pandas_seconds", op="dataframe"):
+            return cryptos_frame_from_rows(rows)
+
+    return cached_read(collection, params, to_frame)
+
+def get_count(search="", categorie="Tout"):
+    """READ: Nombre de résultats pour un filtre"""
+    frame = None if (search or "").strip() else get_market_frame()
+    if frame is not None:
+        return len(frame) if categorie == "Tout" else int((frame["categorie"] == categorie).sum())
+    params = ("count", search, categorie)
+    return cached_read(collection, params, lambda: redis_cache.read_view(
+        list(params), lambda: count_cryptos(collection, search, categorie)))
+
+def get_summary():
+    """Résumé matérialisé du marché (une lecture par _id, en cache jusqu'à la prochaine écriture)"""
+    return cached_read(collection, "summary", lambda: read_summary(db))
 
 def create_crypto(nom, symbole, prix, categorie):
     """CREATE: Ajoute une nouvelle crypto"""
-    nouvelle_crypto = {
-        "nom": nom,
-        "symbole": symbole.upper(),
-        "prix_usd": prix,
-        "variation_24h": 0, 
-        "tendance": "🆕 Nouveau",
-        "categorie": categorie,
-        "market_cap": 0,
-        "image": "https://cdn-icons-png.flaticon.com/512/1213/1213779.png" 
-    }
-    collection.insert_one(nouvelle_crypto)
+    nouvelle_crypto = new_coin(nom, symbole, prix, categorie)
+    try:
+        collection.insert_one(nouvelle_crypto)
+    except pymongo.errors.DuplicateKeyError:
+        # index unique sur "symbole" (cf. scripts/clean_crypto.py)
+        return False
+    redis_cache.set_coin(nouvelle_crypto)
+    apply_change(db, after=nouvelle_crypto)
+    bump_version(collection)
+    return True
 
 def update_crypto(id_str, nouveau_prix, nouvelle_cat):
     """UPDATE: Modifie une crypto existante"""
-    collection.update_one(
+    # Document d'avant : le résumé du marché retire l'ancienne ligne et ajoute la nouvelle
+    before = collection.find_one_and_update(
         {"_id": ObjectId(id_str)},
-        {"$set": {"prix_usd": nouveau_prix, "categorie": nouvelle_cat}}
+        {"$set": {"prix_usd": nouveau_prix, "categorie": nouvelle_cat}, "$currentDate": {MODIFIED_FIELD: True}},
+        return_document=pymongo.ReturnDocument.BEFORE
     )
+    if before:
+        doc = {**before, "prix_usd": nouveau_prix, "categorie": nouvelle_cat}
+        redis_cache.set_coin(doc)
+        apply_change(db, before, doc)
+    bump_version(collection)
 
 def delete_crypto(id_str):
     """DELETE: Supprime une crypto"""
-    collection.delete_one({"_id": ObjectId(id_str)})
+    doc = collection.find_one_and_delete({"_id": ObjectId(id_str)})
+    if doc:
+        redis_cache.delete_coin(doc["symbole"])
+        apply_change(db, before=doc)
+    bump_version(collection)
 
 
 st.title("🏦 Crypto CRUD Manager")
@@ -67,20 +167,34 @@ with st.sidebar:
         submitted = st.form_submit_button("Ajouter à la base")
         if submitted:
             if new_name and new_symbol:
-                create_crypto(new_name, new_symbol, new_price, new_cat)
-                st.success(f"{new_name} ajouté !")
-                st.rerun() 
+                if create_crypto(new_name, new_symbol, new_price, new_cat):
+                    st.success(f"{new_name} ajouté !")
+                    st.rerun()
+                else:
+                    st.error(f"Le symbole {new_symbol.upper()} existe déjà.")
             else:
                 st.error("Le nom et le symbole sont obligatoires.")
 
-data = get_data()
-df = pd.DataFrame(data)
+total_count = get_count()
 
-if not data:
+if not total_count:
     st.info("La base est vide.")
     st.stop()
 
 # Tools IA 
+CREATE_PROPERTIES = {
+    "nom": {"type": "string", "description": "Le nom de la crypto (ex: Bitcoin)"},
+    "symbole": {"type": "string", "description": "Le ticker (ex: BTC)"},
+    "prix": {"type": "number", "description": "Le prix actuel en USD"},
+    "categorie": {"type": "string", "enum": ["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"]}
+}
+UPDATE_PROPERTIES = {
+    "symbole": {"type": "string", "description": "Le ticker de la crypto à modifier (ex: BTC)"},
+    "prix": {"type": "number", "description": "Nouveau prix en USD"},
+    "categorie": {"type": "string", "enum": ["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"]},
+    "nom": {"type": "string", "description": "Nouveau nom"}
+}
+
 tools_schema = [
     {
         "type": "function",
@@ -89,12 +203,7 @@ tools_schema = [
             "description": "Ajouter une nouvelle cryptomonnaie dans la base de données.",
             "parameters": {
                 "type": "object",
-                "properties": {
-                    "nom": {"type": "string", "description": "Le nom de la crypto (ex: Bitcoin)"},
-                    "symbole": {"type": "string", "description": "Le ticker (ex: BTC)"},
-                    "prix": {"type": "number", "description": "Le prix actuel en USD"},
-                    "categorie": {"type": "string", "enum": ["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"]}
-                },
+                "properties": CREATE_PROPERTIES,
                 "required": ["nom", "symbole", "prix", "categorie"]
             }
         }
@@ -112,19 +221,224 @@ tools_schema = [
                 "required": ["nom"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "update_crypto_by_symbol",
+            "description": "Modifier le prix, la catégorie ou le nom d'une crypto à partir de son ticker.",
+            "parameters": {
+                "type": "object",
+                "properties": UPDATE_PROPERTIES,
+                "required": ["symbole"]
+            }
+        }
+    },
+    # Variantes par lot : une seule requête pour plusieurs cryptos
+    {
+        "type": "function",
+        "function": {
+            "name": "create_cryptos",
+            "description": "Ajouter plusieurs cryptomonnaies d'un coup.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "cryptos": {"type": "array", "items": {
+                        "type": "object",
+                        "properties": CREATE_PROPERTIES,
+                        "required": ["nom", "symbole", "prix", "categorie"]
+                    }}
+                },
+                "required": ["cryptos"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "update_cryptos_by_symbol",
+            "description": "Modifier plusieurs cryptos d'un coup (prix, catégorie ou nom), identifiées par leur ticker.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "cryptos": {"type": "array", "items": {
+                        "type": "object",
+                        "properties": UPDATE_PROPERTIES,
+                        "required": ["symbole"]
+                    }}
+                },
+                "required": ["cryptos"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "delete_cryptos_by_name",
+            "description": "Supprimer plusieurs cryptos d'un coup en donnant leurs noms.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "noms": {"type": "array", "items": {"type": "string"}, "description": "Les noms exacts des cryptos à supprimer"}
+                },
+                "required": ["noms"]
+            }
+        }
+    },
+    # Outils de lecture : l'agent interroge la base au lieu de recevoir les données dans le prompt
+    {
+        "type": "function",
+        "function": {
+            "name": "search_crypto",
+            "description": "Chercher des cryptos dont le nom ou le symbole commence par un texte, éventuellement dans une catégorie.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Début du nom ou du symbole (ex: bit, ETH). Vide = toutes."},
+                    "categorie": {"type": "string", "enum": ["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"]},
+                    "limit": {"type": "integer", "description": "Nombre maximum de résultats (max 20)"}
+                },
+                "required": ["query"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_crypto_by_symbol",
+            "description": "Obtenir le détail d'une crypto à partir de son ticker.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "symbole": {"type": "string", "description": "Le ticker (ex: BTC)"}
+                },
+                "required": ["symbole"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "top_movers",
+            "description": "Les plus fortes hausses ou baisses de prix sur 24h.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "direction": {"type": "string", "enum": ["hausse", "baisse"]},
+                    "limit": {"type": "integer", "description": "Nombre de cryptos (max 20)"}
+                },
+                "required": ["direction"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "category_stats",
+            "description": "Statistiques par catégorie : nombre de cryptos, prix moyen, capitalisation totale, variation moyenne.",
+            "parameters": {"type": "object", "properties": {}}
+        }
     }
 ]
 
-# fonction helper car l'IA ne connait pas les IDs MongoDB
-def delete_crypto_by_name(nom):
-    res = collection.delete_one({"nom": nom})
-    return "Supprimé avec succès." if res.deleted_count > 0 else "Crypto non trouvée."
-
-tab1, tab2, tab3 = st.tabs(["📈 Vue Marché", "🛠️ Gestion", "🧠 Assistant Llama"])
+# Prompt système constant : seulement le schéma, les données passent par les outils
+SYSTEM_PROMPT = (
+    "Tu es un gestionnaire de base de données crypto. Chaque crypto a les champs : "
+    "nom, symbole, prix_usd, variation_24h (%), market_cap, categorie "
+    "(Top 10, Altcoin, Meme Coin, Portfolio Perso), tendance. "
+    "Tu n'as pas les données sous les yeux : pour répondre, UTILISE LES OUTILS de lecture "
+    "(search_crypto, get_crypto_by_symbol, top_movers, category_stats). "
+    "Si l'utilisateur veut ajouter, modifier ou supprimer, UTILISE LES OUTILS fournis "
+    "(les variantes au pluriel pour plusieurs cryptos à la fois). Les écritures d'un même tour "
+    "sont appliquées ensemble : tout ou rien."
+)
+MAX_TOOL_ROUNDS = 5
+
+def tool_error(message):
+    """Erreur renvoyée au modèle comme résultat de l'outil (il peut corriger son appel)"""
+    return json.dumps({"erreur": message}, ensure_ascii=False)
+
+def parse_tool_args(raw):
+    """Arguments JSON d'un appel d'outil -> dict (ValueError si illisibles)"""
+    args = json.loads(raw or "{}")
+    if not isinstance(args, dict):
+        raise ValueError("un objet JSON est attendu")
+    return args
+
+def read_tool(func_name, args):
+    """Exécute un outil de lecture et renvoie un résultat compact (JSON)"""
+    try:
+        return json.dumps(_read_tool(func_name, args), ensure_ascii=False, default=str)
+    except KeyError as e:
+        return tool_error(f"argument manquant : {e}")
+    except (TypeError, ValueError, AttributeError) as e:
+        return tool_error(f"argument invalide : {e}")
+
+def _read_tool(func_name, args):
+    if func_name == "search_crypto":
+        query, categorie = args.get("query") or "", args.get("categorie")
+        if not isinstance(query, str) or not isinstance(categorie, (str, type(None))):
+            raise ValueError("query et categorie doivent être du texte")
+        result = search_crypto(collection, query, categorie, agent_limit(args.get("limit", 10)))
+    elif func_name == "get_crypto_by_symbol":
+        symbole = args["symbole"]
+        if not isinstance(symbole, str) or not symbole:
+            raise ValueError("symbole doit être un texte non vide")
+        doc = redis_cache.read_coin(symbole, lambda: get_crypto_by_symbol(collection, symbole))
+        fields = ("nom", "symbole", "prix_usd", "variation_24h", "market_cap", "categorie", "tendance")
+        result = {k: doc.get(k) for k in fields} if doc else "Crypto non trouvée."
+    elif func_name == "top_movers":
+        direction, limit = args.get("direction", "hausse"), agent_limit(args.get("limit", 5))
+        summary = get_summary() if limit <= TOP_N else None
+        if summary:
+            result = summary["top_hausses" if direction == "hausse" else "top_baisses"][:limit]
+        else:
+            result = top_movers(collection, direction, limit)
+    elif func_name == "category_stats":
+        summary = get_summary()
+        if summary:
+            result = [{k: v for k, v in c.items() if k != "part_market_cap"} for c in summary["categories"]]
+        else:
+            result = category_stats(collection)
+    else:
+        result = f"Outil inconnu : {func_name}"
+    return result
+
+def execute_writes(calls):
+    """Toutes les écritures d'un tour en un seul bulk_write (transactionnel si le serveur le permet) ; résultat JSON par appel"""
+    results, written, deleted = execute_batch(client, collection, calls)
+    if written or deleted:
+        # Write-through Redis après le commit, puis invalidation du cache local
+        for doc in collection.find({"symbole": {"$in": list(written)}}):
+            redis_cache.set_coin(doc)
+        for symbole in deleted:
+            redis_cache.delete_coin(symbole)
+        # Plusieurs lignes d'un coup : recalcul complet côté serveur plutôt que des $inc ligne à ligne
+        refresh_summary(db)
+        bump_version(collection)
+    return {call_id: json.dumps(ops, ensure_ascii=False) for call_id, ops in results.items()}, bool(written or deleted)
+
+tab1, tab2, tab3, tab4 = st.tabs(["📈 Vue Marché", "🛠️ Gestion", "🧠 Assistant Llama", "🩺 Diagnostics"])
 
 with tab1:
     st.subheader("📈 Vue Marché Global")
 
+    # KPIs : un seul document pré-agrégé (market_summary), pas d'agrégation à l'affichage
+    summary = get_summary()
+    if summary:
+        k1, k2, k3, k4 = st.columns(4)
+        k1.metric("Cryptos", summary["nb"])
+        k2.metric("Cap. totale", f"${summary['market_cap_totale']:,.0f}")
+        k3.metric("Var. moyenne 24h", f"{summary['variation_moyenne']:.2f}%")
+        if summary["top_hausses"]:
+            best = summary["top_hausses"][0]
+            k4.metric("Top hausse", best["symbole"], f"{best['variation_24h']:.2f}%")
+        with st.expander("📊 Par catégorie et top mouvements"):
+            st.dataframe(pd.DataFrame(summary["categories"]), hide_index=True, use_container_width=True)
+            c_up, c_down = st.columns(2)
+            c_up.dataframe(pd.DataFrame(summary["top_hausses"]), hide_index=True, use_container_width=True)
+            c_down.dataframe(pd.DataFrame(summary["top_baisses"]), hide_index=True, use_container_width=True)
+
     # BARRE DE RECHERCHE
     col_search, col_filter = st.columns([3, 1])
     
@@ -136,25 +450,16 @@ with tab1:
         # filtre par catégorie
         filter_cat = st.selectbox("Catégorie", ["Tout", "Top 10", "Altcoin", "Meme Coin"])
 
-    # LOGIQUE DE FILTRAGE (Pandas)
-    # DataFrame complet
-    df_filtered = df.copy()
-
-    # Filtre Recherche 
-    if search_query:
+    # LOGIQUE DE FILTRAGE (MongoDB)
+    # Recherche par début de nom/symbole et catégorie -> requête indexée
+    nb_results = get_count(search_query, filter_cat)
+    nb_pages = max(1, -(-nb_results // PAGE_SIZE))
+    page = st.number_input("Page", min_value=1, max_value=nb_pages, value=1, step=1) - 1
 
-        mask = (
-            df_filtered['nom'].str.contains(search_query, case=False, na=False) | 
-            df_filtered['symbole'].str.contains(search_query, case=False, na=False)
-        )
-        df_filtered = df_filtered[mask]
-
-    # Filtre Catégorie
-    if filter_cat != "Tout":
-        df_filtered = df_filtered[df_filtered['categorie'] == filter_cat]
+    df_filtered = get_data(search_query, filter_cat, page)
 
     # AFFICHAGE
-    st.caption(f"{len(df_filtered)} résultats trouvés.")
+    st.caption(f"{nb_results} résultats trouvés (page {page + 1}/{nb_pages}).")
     
     st.dataframe(
         df_filtered,
@@ -175,62 +480,74 @@ with tab1:
 with tab2:
     st.subheader("Modifier ou Supprimer une ligne")
     
-    crypto_options = {f"{row['nom']} ({row['symbole']})": row['_id'] for index, row in df.iterrows()}
-    selected_label = st.selectbox("Choisir la crypto à gérer :", options=list(crypto_options.keys()))
+    # On ne charge que les cryptos correspondant à la recherche (pas toute la base)
+    manage_query = st.text_input("🔍 Filtrer (Nom ou Symbole)", key="manage_search")
+    df_manage = get_data(manage_query)
+    if df_manage.empty:
+        st.info("Aucune crypto trouvée.")
+    else:
+        crypto_options = {f"{row['nom']} ({row['symbole']})": row['_id'] for index, row in df_manage.iterrows()}
+        selected_label = st.selectbox("Choisir la crypto à gérer :", options=list(crypto_options.keys()))
     
-    selected_id = crypto_options[selected_label]
+        selected_id = crypto_options[selected_label]
     
-    current_crypto = df[df['_id'] == selected_id].iloc[0]
-
-    # UPDATE
-    col1, col2 = st.columns(2)
-    with col1:
-        new_val_price = st.number_input(
-            "Nouveau Prix ($)", 
-            value=float(current_crypto['prix_usd']),
-            key="upd_price"
-        )
-    with col2:
-        new_val_cat = st.selectbox(
-            "Nouvelle Catégorie", 
-            ["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"],
-            index=["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"].index(current_crypto['categorie']) if current_crypto['categorie'] in ["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"] else 1,
-            key="upd_cat"
-        )
+        current_crypto = df_manage[df_manage['_id'] == selected_id].iloc[0]
+
+        # UPDATE
+        col1, col2 = st.columns(2)
+        with col1:
+            new_val_price = st.number_input(
+                "Nouveau Prix ($)", 
+                value=float(current_crypto['prix_usd']),
+                key="upd_price"
+            )
+        with col2:
+            new_val_cat = st.selectbox(
+                "Nouvelle Catégorie", 
+                ["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"],
+                index=["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"].index(current_crypto['categorie']) if current_crypto['categorie'] in ["Top 10", "Altcoin", "Meme Coin", "Portfolio Perso"] else 1,
+                key="upd_cat"
+            )
     
-    col_btn1, col_btn2 = st.columns([1, 4])
+        col_btn1, col_btn2 = st.columns([1, 4])
     
-    with col_btn1:
-        if st.button("💾 Sauvegarder"):
-            update_crypto(selected_id, new_val_price, new_val_cat)
-            st.success("Modification enregistrée !")
-            time.sleep(1)
-            st.rerun()
+        with col_btn1:
+            if st.button("💾 Sauvegarder"):
+                update_crypto(selected_id, new_val_price, new_val_cat)
+                st.success("Modification enregistrée !")
+                time.sleep(1)
+                st.rerun()
             
-    with col_btn2:
-        # DELETE
-        if st.button("🗑️ Supprimer", type="primary"):
-            delete_crypto(selected_id)
-            st.warning(f"Crypto supprimée.")
-            time.sleep(1)
-            st.rerun()
+        with col_btn2:
+            # DELETE
+            if st.button("🗑️ Supprimer", type="primary"):
+                delete_crypto(selected_id)
+                st.warning(f"Crypto supprimée.")
+                time.sleep(1)
+                st.rerun()
 
 # KPI en bas de page
 st.divider()
-st.caption(f"Total éléments dans la base : {len(df)}")
-
-import json
+st.caption(f"Total éléments dans la base : {total_count}")
+if redis_cache.enabled:
+    st.caption(f"Cache Redis : {redis_cache.stats['hits']} hits / {redis_cache.stats['misses']} misses / {redis_cache.stats['errors']} erreurs")
+llm_stats = llm_cache.stats()
+st.caption(f"Cache LLM : taux de hit {llm_stats['hit_rate']:.0%} · {llm_stats['saved_tokens']} tokens économisés")
+llm_latency = llm_cache.latency()
+if llm_latency["calls"]:
+    st.caption(f"Latence Groq ({llm_latency['calls']} derniers appels) : premier token {llm_latency['first_token_s'] * 1000:.0f} ms"
+               f" · total {llm_latency['total_s'] * 1000:.0f} ms")
 
 with tab3:
     st.header("🕵️‍♂️ Agent Autonome Llama")
-    st.caption("Je peux lire, mais aussi AJOUTER et SUPPRIMER des données. Essaie : 'Ajoute le token TestCoin à 50 dollars'.")
+    st.caption("Je peux lire, mais aussi AJOUTER, MODIFIER et SUPPRIMER des données (plusieurs à la fois). Essaie : 'Ajoute le token TestCoin à 50 dollars'.")
 
     # Historique
     if "messages" not in st.session_state:
         st.session_state.messages = [{"role": "assistant", "content": "Je suis prêt à gérer ta base de données."}]
 
     for msg in st.session_state.messages:
-        if msg["role"] != "tool": 
+        if msg["role"] != "tool" and msg.get("content"):
             st.chat_message(msg["role"]).write(msg["content"])
 
     # Input
@@ -240,77 +557,68 @@ with tab3:
         st.session_state.messages.append({"role": "user", "content": prompt})
         st.chat_message("user").write(prompt)
 
-        # 2. Contexte
-        csv_context = df[['nom', 'prix_usd', 'categorie']].head(30).to_csv(index=False)
-        
         client_groq = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
         with st.chat_message("assistant"):
-            with st.spinner("L'Agent réfléchit..."):
-                
-                # PREMIER APPEL
-                messages_history = [
-                    {"role": "system", "content": f"Tu es un gestionnaire de base de données. Tu as accès aux données actuelles :\n{csv_context}\n Si l'utilisateur veut ajouter ou supprimer, UTILISE LES OUTILS fournis."},
-                    *st.session_state.messages
-                ]
-                
-                response = client_groq.chat.completions.create(
+            # Réponse affichée token par token ; les lectures s'exécutent dès que leurs arguments sont complets,
+            # les écritures du tour sont regroupées dans une seule transaction à la fin du flux
+            wrote = False
+            rounds = 0
+            while True:
+                tool_results = {}
+                pending_writes = []
+                def on_tool_call(call):
+                    func_name = call["function"]["name"]
+                    try:
+                        args = parse_tool_args(call["function"]["arguments"])
+                    except ValueError as e:
+                        # JSON mal formé : le modèle reçoit l'erreur au lieu de faire planter la page
+                        st.warning(f"⚠️ Arguments illisibles pour {func_name} : {e}")
+                        tool_results[call["id"]] = tool_error(f"arguments JSON invalides : {e}")
+                        return
+                    st.info(f"🛠️ Exécution de : {func_name} avec {args}")
+                    if func_name in WRITE_TOOLS:
+                        pending_writes.append((call["id"], func_name, args))
+                    else:
+                        tool_results[call["id"]] = read_tool(func_name, args)
+
+                completion, from_cache = llm_cache.stream(
+                    client_groq,
+                    on_tool_call=on_tool_call,
                     model="llama-3.3-70b-versatile",
-                    messages=messages_history,
-                    tools=tools_schema, 
-                    tool_choice="auto"
+                    messages=[{"role": "system", "content": SYSTEM_PROMPT}, *st.session_state.messages],
+                    tools=tools_schema,
+                    # au dernier tour, réponse forcée
+                    tool_choice="auto" if rounds < MAX_TOOL_ROUNDS else "none"
                 )
-                
-                tool_calls = response.choices[0].message.tool_calls
-                ai_msg = response.choices[0].message
+                st.write_stream(completion)
+                st.caption(f"{'⚡ cache' if from_cache else '🆕 Groq'} · premier token {completion.first_token_s * 1000:.0f} ms"
+                           f" · total {completion.total_s * 1000:.0f} ms")
 
-                # CAS OU L'IA VEUT UTILISER UN OUTIL 
-                if tool_calls:
-                    # 1. On sauvegarde le message de l'IA
+                # CONVERSATION NORMALE
+                if not completion.tool_calls:
+                    break
+
+                # CAS OU L'IA A UTILISÉ UN OUTIL : on sauvegarde son message puis les résultats
+                rounds += 1
+                if pending_writes:
+                    write_results, changed = execute_writes(pending_writes)
+                    tool_results.update(write_results)
+                    wrote = wrote or changed
+                st.session_state.messages.append(completion.message())
+                for call in completion.tool_calls:
                     st.session_state.messages.append({
-                        "role": ai_msg.role,
-                        "content": ai_msg.content,
-                        "tool_calls": ai_msg.tool_calls
+                        "tool_call_id": call["id"],
+                        "role": "tool",
+                        "name": call["function"]["name"],
+                        "content": tool_results[call["id"]],
                     })
-                    
-                    # 2. Boucle sur les outils
-                    for tool_call in tool_calls:
-                        func_name = tool_call.function.name
-                        args = json.loads(tool_call.function.arguments)
-                        
-                        st.info(f"🛠️ Exécution de : {func_name} avec {args}")
-                        
-                        # Exécution réelle du code Python
-                        result_text = ""
-                        if func_name == "create_crypto":
-                            create_crypto(args["nom"], args["symbole"], args["prix"], args["categorie"])
-                            result_text = f"Succès : {args['nom']} a été ajouté."
-                        elif func_name == "delete_crypto_by_name":
-                            result_text = delete_crypto_by_name(args["nom"])
-                        
-                        # On renvoie le résultat technique à l'IA
-                        st.session_state.messages.append({
-                            "tool_call_id": tool_call.id,
-                            "role": "tool",
-                            "name": func_name,
-                            "content": result_text,
-                        })
-
-                    # L'IA CONFIRME À L'UTILISATEUR
-                    final_response = client_groq.chat.completions.create(
-                        model="llama-3.3-70b-versatile",
-                        messages=st.session_state.messages
-                    )
-                    final_text = final_response.choices[0].message.content
-                    st.write(final_text)
-                    st.session_state.messages.append({"role": "assistant", "content": final_text})
-                    
-                    # refresh pour voir les données à jour
-                    if "Succès" in final_text or "Supprimé" in final_text:
-                        st.rerun()
 
-                # CONVERSATION NORMALE
-                else:
-                    final_text = ai_msg.content
-                    st.write(final_text)
-                    st.session_state.messages.append({"role": "assistant", "content": final_text})
\ No newline at end of file
+            st.session_state.messages.append({"role": "assistant", "content": completion.content})
+
+            # refresh pour voir les données à jour
+            if wrote:
+                st.rerun()
+
+with tab4:
+    render_diagnostics("ui")
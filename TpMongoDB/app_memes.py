@@ -1,9 +1,16 @@
 import streamlit as st
-import pymongo
 import os
 from dotenv import load_dotenv
 from groq import Groq
-import pandas as pd
+from read_cache import cached_read
+from thumbnails import ThumbnailStore
+from bson.objectid import ObjectId
+from meme_queries import ensure_indexes, find_memes, count_memes, search_titres, PAGE_SIZE, PROJECTION
+from snapshots import load_frame
+from llm_cache import LLMCache
+from metrics import serve
+from diagnostics import render_diagnostics
+from mongo_client import get_client, warm_pool
 
 # Config de la page
 st.set_page_config(page_title="Meme Studio", page_icon="🐸", layout="wide")
@@ -12,22 +19,93 @@ st.set_page_config(page_title="Meme Studio", page_icon="🐸", layout="wide")
 load_dotenv()
 @st.cache_resource
 def init_connection():
-    return pymongo.MongoClient(os.getenv("MONGO_URI"))
+    # Profil "ui" : pool gardé chaud, compression, échec rapide (voir mongo_client.py)
+    client = get_client("ui")
+    warm_pool(client)
+    return client
 
 client = init_connection()
 db = client["meme_studio"]
 collection = db["memes_clean"]
 
-# Récupération des données
-memes = list(collection.find())
-df = pd.DataFrame(memes)
+@st.cache_resource
+def init_metrics_server():
+    # Exposition /metrics pour Prometheus si METRICS_PORT est défini
+    port = os.getenv("METRICS_PORT")
+    return serve(int(port)) if port else None
+
+init_metrics_server()
+
+@st.cache_resource
+def init_indexes():
+    ensure_indexes(collection)
+
+init_indexes()
+
+@st.cache_resource
+def init_thumbnails():
+    # Miniatures générées par scripts/clean_memes.py
+    return ThumbnailStore()
+
+thumbs = init_thumbnails()
+
+@st.cache_resource
+def init_llm_cache():
+    # 3 critiques différentes par mème, servies à tour de rôle (température élevée)
+    return LLMCache(db["llm_cache"], variants=3)
+
+llm_cache = init_llm_cache()
+
+@st.dialog("🔍 Taille réelle", width="large")
+def show_full_image(titre, url):
+    # L'original n'est téléchargé qu'à la demande
+    st.image(url, caption=titre, use_container_width=True)
+
+# Récupération des données : requêtes indexées, résultats en cache partagé
+# (invalidé par scripts/clean_memes.py)
+def get_gallery_frame():
+    """Toute la galerie triée par _id, depuis le snapshot Arrow (None sans snapshot)"""
+    return load_frame(collection, ["_id"] + list(PROJECTION),
+                      prepare=lambda frame: frame.sort_values("_id", ignore_index=True))
+
+def filter_frame(frame, fmt, nb_zones):
+    if fmt and fmt != "Tout":
+        frame = frame[frame["format"] == fmt]
+    if nb_zones is not None:
+        frame = frame[frame["nb_zones_texte"] == nb_zones]
+    return frame
+
+def get_page(fmt, nb_zones, after_id):
+    # Un document de plus que la page pour savoir s'il existe une page suivante
+    frame = get_gallery_frame()
+    if frame is not None:
+        # _id en texte : l'ordre des ObjectId hexadécimaux est celui des ObjectId
+        frame = filter_frame(frame, fmt, nb_zones)
+        if after_id is not None:
+            frame = frame[frame["_id"] > str(after_id)]
+        return frame.head(PAGE_SIZE + 1).to_dict("records")
+    if isinstance(after_id, str):
+        after_id = ObjectId(after_id) # curseur pris sur le snapshot
+    return cached_read(collection, ("page", fmt, nb_zones, after_id),
+                       lambda: find_memes(collection, fmt, nb_zones, after_id, PAGE_SIZE + 1))
+
+def get_count(fmt, nb_zones):
+    frame = get_gallery_frame()
+    if frame is not None:
+        return len(filter_frame(frame, fmt, nb_zones))
+    return cached_read(collection, ("count", fmt, nb_zones), lambda: count_memes(collection, fmt, nb_zones))
+
+def get_titres(prefix):
+    return cached_read(collection, ("titres", prefix), lambda: search_titres(collection, prefix))
+
+total = cached_read(collection, "total", collection.estimated_document_count)
 
 # --- HEADER ---
 st.title("🐸 Le Musée du Mème")
-st.caption(f"Collection actuelle : {len(memes)} œuvres d'art numérique.")
+st.caption(f"Collection actuelle : {total} œuvres d'art numérique.")
 
 # --- ONGLETS ---
-tab1, tab2 = st.tabs(["🖼️ La Galerie", "🧐 Le Critique IA"])
+tab1, tab2, tab3 = st.tabs(["🖼️ La Galerie", "🧐 Le Critique IA", "🩺 Diagnostics"])
 
 # === ONGLET 1 : GALERIE VISUELLE ===
 with tab1:
@@ -40,26 +118,41 @@ with tab1:
         # On utilise le champ renommé "nb_zones_texte"
         nb_cases = st.slider("Nombre de zones de texte", 2, 5, 2)
 
-    # Application des filtres sur le DataFrame
-    df_filtered = df.copy()
-    
-    if filtre_format != "Tout":
-        df_filtered = df_filtered[df_filtered['format'] == filtre_format]
-        
-    df_filtered = df_filtered[df_filtered['nb_zones_texte'] == nb_cases]
-    
-    st.subheader(f"Résultats : {len(df_filtered)} mèmes")
+    # Pagination par clé : on mémorise le dernier _id de chaque page visitée
+    # (pas de skip, chaque page coûte le même prix quelle que soit sa position)
+    if st.session_state.get("gallery_filter") != (filtre_format, nb_cases):
+        st.session_state.gallery_filter = (filtre_format, nb_cases)
+        st.session_state.gallery_cursors = [None]
+    cursors = st.session_state.gallery_cursors
+
+    docs = get_page(filtre_format, nb_cases, cursors[-1])
+    has_next = len(docs) > PAGE_SIZE
+    docs = docs[:PAGE_SIZE]
+
+    st.subheader(f"Résultats : {get_count(filtre_format, nb_cases)} mèmes (page {len(cursors)})")
+
+    c_prev, c_next = st.columns(2)
+    with c_prev:
+        if st.button("⬅️ Précédente", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with c_next:
+        if st.button("Suivante ➡️", disabled=not has_next):
+            cursors.append(docs[-1]["_id"])
+            st.rerun()
     
-    # Affichage en grille
+    # Affichage en grille (miniatures locales, l'URL d'origine en secours)
     cols = st.columns(3)
-    for index, row in df_filtered.iterrows():
-        col = cols[index % 3]
+    for i, row in enumerate(docs):
+        col = cols[i % 3]
         with col:
-            st.image(row['url_image'], use_container_width=True)
+            st.image(thumbs.get(row['url_image']) or row['url_image'], use_container_width=True)
             st.write(f"**{row['titre']}**")
             
             # On affiche nos métadonnées enrichies
             st.caption(f"📏 {row['format']} | 📝 {row['nb_zones_texte']} textes")
+            if st.button("🔍 Agrandir", key=f"full_{row['_id']}"):
+                show_full_image(row['titre'], row['url_image'])
 
 # === ONGLET 2 : AGENT CRITIQUE ===
 with tab2:
@@ -67,8 +160,9 @@ with tab2:
     st.markdown("Choisis une œuvre dans la base de données et soumets-la au jugement impitoyable de l'IA.")
 
     # 1. Préparation du menu déroulant (Titre -> URL)
-    # ⚠️ CORRECTION ICI : On utilise les noms francisés du script clean ('titre' et 'url_image')
-    meme_options = {row['titre']: row['url_image'] for index, row in df.iterrows()}
+    # Recherche par début de titre sur l'index : seuls les premiers résultats sont chargés
+    prefix = st.text_input("🔍 Rechercher un mème par son titre", placeholder="Ex: Drake, Distracted...")
+    meme_options = {row['titre']: row['url_image'] for row in get_titres(prefix)}
     
     # 2. Sélecteur
     selected_meme_titre = st.selectbox("Choisis une œuvre à critiquer :", list(meme_options.keys()))
@@ -89,25 +183,33 @@ with tab2:
             # Initialisation du client Groq
             client_groq = Groq(api_key=os.getenv("GROQ_API_KEY"))
             
-            with st.spinner("Le critique ajuste son monocle..."):
-                try:
-                    # Prompt amélioré pour le rôle "Critique Snob"
-                    prompt = (
-                        f"Tu es un critique d'art contemporain très snob et élitiste, mais spécialisé dans les 'Mèmes Internet'. "
-                        f"Analyse le potentiel du template de mème intitulé : '{selected_meme_titre}'. "
-                        f"Utilise un vocabulaire très soutenu et académique pour décrire ce mème (parle de 'composition', de 'juxtaposition', de 'néo-dadaisme'). "
-                        f"Conclus en disant si c'est un 'Chef d'œuvre Dank' ou un 'Déchet Cringe'."
-                    )
-                    
-                    chat_completion = client_groq.chat.completions.create(
-                        messages=[{"role": "user", "content": prompt}],
-                        model="llama-3.3-70b-versatile", # Le meilleur modèle actuel
-                        temperature=0.8, # Créativité élevée pour l'humour
-                    )
-                    
-                    # Affichage du résultat
-                    response = chat_completion.choices[0].message.content
-                    st.success(response)
-                    
-                except Exception as e:
-                    st.error(f"Le critique a renversé son thé (Erreur) : {e}")
\ No newline at end of file
+            try:
+                # Prompt amélioré pour le rôle "Critique Snob"
+                prompt = (
+                    f"Tu es un critique d'art contemporain très snob et élitiste, mais spécialisé dans les 'Mèmes Internet'. "
+                    f"Analyse le potentiel du template de mème intitulé : '{selected_meme_titre}'. "
+                    f"Utilise un vocabulaire très soutenu et académique pour décrire ce mème (parle de 'composition', de 'juxtaposition', de 'néo-dadaisme'). "
+                    f"Conclus en disant si c'est un 'Chef d'œuvre Dank' ou un 'Déchet Cringe'."
+                )
+                
+                # Streaming : la critique s'affiche au fil des tokens
+                completion, from_cache = llm_cache.stream(
+                    client_groq,
+                    messages=[{"role": "user", "content": prompt}],
+                    model="llama-3.3-70b-versatile", # Le meilleur modèle actuel
+                    temperature=0.8, # Créativité élevée pour l'humour
+                )
+                
+                # Affichage du résultat
+                with st.container(border=True):
+                    st.write_stream(completion)
+                stats = llm_cache.stats()
+                st.caption(f"{'⚡ Critique en cache' if from_cache else '🆕 Nouvelle critique'} · "
+                           f"premier token {completion.first_token_s * 1000:.0f} ms · total {completion.total_s * 1000:.0f} ms · "
+                           f"taux de hit {stats['hit_rate']:.0%} · {stats['saved_tokens']} tokens économisés")
+                
+            except Exception as e:
+                st.error(f"Le critique a renversé son thé (Erreur) : {e}")
+
+with tab3:
+    render_diagnostics("ui")
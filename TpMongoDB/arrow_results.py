@@ -0,0 +1,64 @@
+import bson
+import pandas as pd
+import pyarrow as pa
+
+try:
+    from pymongoarrow.api import Schema, find_arrow_all
+except ImportError:  # pymongoarrow est optionnel : sans lui, décodage par lots côté Python
+    find_arrow_all = None
+
+# Résultats de requêtes en colonnes Arrow typées, sans passer par un dict par document :
+# - avec pymongoarrow (requirements.txt, version alignée sur pyarrow), les lots BSON bruts
+#   sont décodés en C directement dans les colonnes ;
+# - sinon (pymongoarrow absent ou sans wheel pour la plateforme), chaque lot brut (find_raw_batches)
+#   est décodé par bson.decode_all, donc encore un dict par document : seuls le DataFrame construit
+#   depuis les dicts et la conversion des types sont évités. Gain partiel, le repli n'est qu'un secours.
+# _id est converti en texte par MongoDB ($toString dans la projection), pas ligne à ligne.
+
+def _read_type(t):
+    # Les colonnes dictionnaire sont lues en texte puis encodées (une passe Arrow en C)
+    return t.value_type if pa.types.is_dictionary(t) else t
+
+def projection_for(schema):
+    projection = {name: 1 for name in schema.names}
+    if "_id" in schema.names and _read_type(schema.field("_id").type) == pa.string():
+        projection["_id"] = {"$toString": "$_id"}
+    elif "_id" not in schema.names:
+        projection["_id"] = 0
+    return projection
+
+def find_table(collection, query, schema, **kwargs):
+    """Résultat de find() en pa.Table au schéma donné (sort, skip, limit, collation... en kwargs)"""
+    projection = projection_for(schema)
+    if find_arrow_all is None:
+        return table_from_raw_batches(collection.find_raw_batches(query, projection, **kwargs), schema)
+
+    read_schema = {f.name: _read_type(f.type) for f in schema}
+    table = find_arrow_all(collection, query, schema=Schema(read_schema), projection=projection, **kwargs)
+    return encode_dictionaries(table, schema)
+
+def table_from_raw_batches(batches, schema):
+    """Lots BSON bruts (documents concaténés) -> pa.Table : un décodage par lot, une conversion par colonne"""
+    read_schema = pa.schema([(f.name, _read_type(f.type)) for f in schema])
+    columns = {name: [] for name in read_schema.names}
+    for batch in batches:
+        docs = bson.decode_all(batch)
+        for name, values in columns.items():
+            values.extend([doc.get(name) for doc in docs])
+    table = pa.table({name: pa.array(values, type=read_schema.field(name).type)
+                      for name, values in columns.items()}, schema=read_schema)
+    return encode_dictionaries(table, schema)
+
+def encode_dictionaries(table, schema):
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).dictionary_encode())
+    return table
+
+def to_frame(table):
+    """DataFrame aux colonnes adossées à Arrow (pas de conversion en objets Python)"""
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def frame_from_rows(rows, schema):
+    """Lignes déjà décodées (ex : vue Redis) -> DataFrame aux mêmes types que find_table"""
+    return to_frame(pa.Table.from_pylist(rows, schema=schema))
@@ -0,0 +1,5 @@
+# Banc de mesure du pipeline : données synthétiques CoinGecko / imgflip,
+# débit, latences p50/p99 et pic mémoire par étape, comparaison entre deux rapports.
+#
+#   python -m bench run --size 100k --out bench_100k.json
+#   python -m bench compare bench_avant.json bench_apres.json --threshold 0.1
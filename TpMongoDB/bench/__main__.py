@@ -0,0 +1,131 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+from datetime import datetime
+from dotenv import load_dotenv
+
+from bench.generate import parse_size
+from bench.stages import STAGES, StageSkipped
+from bench.report import measure, print_report, compare
+from bench.decode import run_decode, print_decode
+from bench.correlation import run_correlation, print_correlation
+from crypto_correlations import TOP_K, CHUNK_SIZE
+from mongo_client import get_client
+
+load_dotenv()
+BENCH_DB = os.getenv("BENCH_DB", "crypto_bench")
+PROTECTED_DBS = {"crypto_data", "meme_studio", "admin", "local", "config"}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    if args.db in PROTECTED_DBS:
+        sys.exit(f"❌ Base '{args.db}' refusée : le bench vide ses collections.")
+    n = parse_size(args.size)
+    stages = args.stages.split(",") if args.stages else list(STAGES)
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        sys.exit(f"❌ Étape(s) inconnue(s) : {', '.join(unknown)} (disponibles : {', '.join(STAGES)})")
+
+    client = get_client("etl")
+    db = client[args.db]
+    report = {"size": n, "created_at": datetime.now().isoformat(timespec="seconds"),
+              "commit": git_commit(), "db": args.db, "repeat": args.repeat, "stages": {}}
+    try:
+        for name in stages:
+            print(f"⏱️  {name} ({n} documents, {args.repeat} passage(s))...")
+            try:
+                report["stages"][name] = measure(STAGES[name], db, n, repeat=args.repeat)
+            except StageSkipped as e:
+                report["stages"][name] = {"skipped": str(e)}
+    finally:
+        if not args.keep:
+            client.drop_database(args.db)
+
+    print_report(report)
+    out = args.out or f"bench_{args.size}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Rapport écrit dans {out}")
+
+def run_decode_bench(args):
+    """Décodage d'une page de résultats : dicts + DataFrame vs colonnes Arrow (sans serveur)"""
+    n = parse_size(args.size)
+    print(f"⏱️  décodage de {n} documents ({args.repeat} passage(s))...")
+    report = {"size": n, "created_at": datetime.now().isoformat(timespec="seconds"),
+              "commit": git_commit(), "repeat": args.repeat, "stages": run_decode(n, args.repeat)}
+    print_decode(report["stages"])
+    out = args.out or f"bench_decode_{args.size}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Rapport écrit dans {out}")
+
+def run_correlation_bench(args):
+    """Corrélations des rendements : produits matriciels par blocs vs boucle par paire (sans serveur)"""
+    n = parse_size(args.size)
+    print(f"⏱️  corrélations de {n} cryptos x {args.points} points ({args.repeat} passage(s))...")
+    report = {"created_at": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+              **run_correlation(n, args.points, args.k, args.chunk_size, args.repeat)}
+    print_correlation(report)
+    out = args.out or f"bench_correlation_{args.size}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Rapport écrit dans {out}")
+
+def run_compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} régression(s) au-delà de {args.threshold:.0%}.")
+        sys.exit(1)
+    print(f"\n✅ Aucune régression au-delà de {args.threshold:.0%}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Bench du pipeline crypto / mèmes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Mesure les étapes sur des données synthétiques")
+    p_run.add_argument("--size", default="100k", help="1k, 100k, 1M ou un nombre de documents")
+    p_run.add_argument("--stages", help=f"Étapes séparées par des virgules (défaut : {','.join(STAGES)})")
+    p_run.add_argument("--repeat", type=int, default=3, help="Passages par étape (latences et débit médian)")
+    p_run.add_argument("--db", default=BENCH_DB, help="Base MongoDB de travail (supprimée à la fin)")
+    p_run.add_argument("--keep", action="store_true", help="Ne pas supprimer la base de travail")
+    p_run.add_argument("--out", help="Fichier JSON du rapport (défaut : bench_<size>.json)")
+
+    p_dec = sub.add_parser("decode", help="Microbench du décodage BSON -> DataFrame (dicts vs Arrow)")
+    p_dec.add_argument("--size", default="100k", help="1k, 100k, 1M ou un nombre de documents")
+    p_dec.add_argument("--repeat", type=int, default=3, help="Passages par décodeur")
+    p_dec.add_argument("--out", help="Fichier JSON du rapport (défaut : bench_decode_<size>.json)")
+
+    p_cor = sub.add_parser("correlation", help="Microbench des corrélations (matrice NumPy vs boucle par paire)")
+    p_cor.add_argument("--size", default="5000", help="Nombre de cryptos (1k, 5000...)")
+    p_cor.add_argument("--points", type=int, default=169, help="Prix par crypto (169 = 7 jours horaires)")
+    p_cor.add_argument("--k", type=int, default=TOP_K, help="Voisins gardés par crypto")
+    p_cor.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Lignes par bloc de produit matriciel")
+    p_cor.add_argument("--repeat", type=int, default=3, help="Passages du calcul matriciel")
+    p_cor.add_argument("--out", help="Fichier JSON du rapport (défaut : bench_correlation_<size>.json)")
+
+    p_cmp = sub.add_parser("compare", help="Compare deux rapports et signale les régressions")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("candidate")
+    p_cmp.add_argument("--threshold", type=float, default=0.10, help="Écart relatif toléré (0.10 = 10 %%)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "decode":
+        run_decode_bench(args)
+    elif args.command == "correlation":
+        run_correlation_bench(args)
+    else:
+        run_compare(args)
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from crypto_correlations import normalized_returns, top_k_neighbours, TOP_K, CHUNK_SIZE
+
+# Microbench du calcul des corrélations (crypto_correlations), sans serveur :
+#   matrix : rendements normés + top-k par blocs de produits matriciels (NumPy)
+#   loop   : une np.corrcoef par paire, sur un échantillon puis extrapolé à toutes les paires
+
+LOOP_SAMPLE = 200 # cryptos de l'échantillon de la boucle par paire
+
+def random_walks(n, points, factors=20, seed=0):
+    """Prix synthétiques : marches aléatoires en partie pilotées par des facteurs communs"""
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(size=(n, factors)) * (rng.random((n, factors)) < 0.1)
+    returns = loadings @ rng.normal(size=(factors, points - 1)) + rng.normal(size=(n, points - 1))
+    return np.exp(np.cumsum(np.hstack([np.zeros((n, 1)), returns * 0.01]), axis=1))
+
+def matrix_top_k(prices, k=TOP_K, chunk_size=CHUNK_SIZE):
+    _, z, _ = normalized_returns(prices)
+    return top_k_neighbours(z, k, chunk_size)
+
+def loop_pairs(prices):
+    returns = np.diff(np.log(prices), axis=1)
+    for i in range(len(returns)):
+        for j in range(i + 1, len(returns)):
+            np.corrcoef(returns[i], returns[j])
+
+def run_correlation(n, points=169, k=TOP_K, chunk_size=CHUNK_SIZE, repeat=3):
+    """Temps médian et pic mémoire du calcul matriciel ; boucle par paire extrapolée"""
+    prices = random_walks(n, points)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matrix_top_k(prices, k, chunk_size)
+        timings.append(time.perf_counter() - start)
+    seconds = sorted(timings)[len(timings) // 2]
+
+    tracemalloc.start() # NumPy déclare ses tampons à tracemalloc
+    try:
+        matrix_top_k(prices, k, chunk_size)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    sample = min(n, LOOP_SAMPLE)
+    start = time.perf_counter()
+    loop_pairs(prices[:sample])
+    per_pair = (time.perf_counter() - start) / max(sample * (sample - 1) // 2, 1)
+
+    return {
+        "symbols": n,
+        "points": points,
+        "k": k,
+        "chunk_size": chunk_size,
+        "matrix": {"seconds": round(seconds, 4), "p99_ms": round(max(timings) * 1000, 3),
+                   "peak_mb": round(peak / 2**20, 2), "samples": repeat},
+        "loop": {"seconds_estimated": round(per_pair * n * (n - 1) / 2, 2), "sample": sample},
+    }
+
+def print_correlation(report):
+    matrix, loop = report["matrix"], report["loop"]
+    print(f"\n{'corrélation':<12}{'cryptos':>9}{'s':>12}{'pic Mo':>10}")
+    print(f"{'matrix':<12}{report['symbols']:>9}{matrix['seconds']:>12.3f}{matrix['peak_mb']:>10.1f}")
+    print(f"{'loop (est.)':<12}{report['symbols']:>9}{loop['seconds_estimated']:>12.1f}{'':>10}")
+    print(f"   -> matrice x{loop['seconds_estimated'] / matrix['seconds']:.0f} plus rapide "
+          f"(blocs de {report['chunk_size']} lignes, top {report['k']})")
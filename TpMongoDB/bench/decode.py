@@ -0,0 +1,99 @@
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import bson
+import pandas as pd
+import pyarrow as pa
+from bson import ObjectId
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([ROOT, os.path.join(ROOT, "scripts")])
+from clean_crypto import transform_coin
+from crypto_queries import FRAME_SCHEMA
+from arrow_results import table_from_raw_batches, to_frame
+from bench.generate import coingecko_coins, chunks
+
+# Microbench du décodage d'une page de résultats, sans serveur : les lots BSON sont
+# encodés à l'avance comme ceux renvoyés par find_raw_batches (documents concaténés).
+#   dicts : décodage en dict, copie {**doc, "_id": str(_id)} puis pd.DataFrame (ancien get_data)
+#   arrow : décodage par lot en colonnes typées (arrow_results), _id déjà en texte ($toString)
+
+BATCH_SIZE = 10_000
+PER = 100_000 # les mesures sont ramenées à 100k documents
+
+def clean_batches(n, string_ids=False, batch_size=BATCH_SIZE):
+    """n documents de market_cap_clean encodés en lots BSON"""
+    batches = []
+    for coins in chunks(coingecko_coins(n), batch_size):
+        docs = []
+        for coin in coins:
+            _id = ObjectId()
+            docs.append({"_id": str(_id) if string_ids else _id, **transform_coin(coin)})
+        batches.append(b"".join(bson.encode(doc) for doc in docs))
+    return batches
+
+def decode_dicts(batches):
+    rows = []
+    for batch in batches:
+        rows.extend({**doc, "_id": str(doc["_id"])} for doc in bson.decode_all(batch))
+    return pd.DataFrame(rows)
+
+def decode_arrow(batches):
+    return to_frame(table_from_raw_batches(batches, FRAME_SCHEMA))
+
+DECODERS = {"dicts": (decode_dicts, False), "arrow": (decode_arrow, True)}
+
+def run_decode(n, repeat=3):
+    """Mesure chaque décodeur : temps médian, pic Python (tracemalloc), mémoire Arrow, taille du DataFrame"""
+    stages = {}
+    scale = PER / n
+    for name, (decode, string_ids) in DECODERS.items():
+        batches = clean_batches(n, string_ids)
+
+        # Temps hors tracemalloc (qui ralentit surtout le chemin qui alloue le plus d'objets)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            decode(batches)
+            timings.append(time.perf_counter() - start)
+        seconds = sorted(timings)[len(timings) // 2]
+
+        # Pic des allocations Python ; les tampons Arrow, hors tracemalloc, sont mesurés à part
+        gc.collect()
+        before = pa.total_allocated_bytes()
+        tracemalloc.start()
+        try:
+            frame = decode(batches)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        arrow_bytes = pa.total_allocated_bytes() - before
+
+        stages[name] = {
+            "docs": len(frame),
+            "seconds": round(seconds, 4),
+            "throughput": round(n / seconds, 1),
+            "p50_ms": round(seconds * 1000, 3),
+            "p99_ms": round(max(timings) * 1000, 3),
+            "peak_mb": round(peak / 2**20, 2),
+            "samples": repeat,
+            "seconds_per_100k": round(seconds * scale, 4),
+            "peak_mb_per_100k": round(peak / 2**20 * scale, 2),
+            "arrow_mb_per_100k": round(arrow_bytes / 2**20 * scale, 2),
+            "frame_mb_per_100k": round(frame.memory_usage(deep=True).sum() / 2**20 * scale, 2),
+        }
+        del frame
+    return stages
+
+def print_decode(stages):
+    print(f"\n{'décodage':<10}{'s/100k':>10}{'docs/s':>14}{'pic Py Mo':>11}{'Arrow Mo':>10}{'DataFrame Mo':>14}")
+    for name, s in stages.items():
+        print(f"{name:<10}{s['seconds_per_100k']:>10.3f}{s['throughput']:>14,.0f}{s['peak_mb_per_100k']:>11.1f}"
+              f"{s['arrow_mb_per_100k']:>10.1f}{s['frame_mb_per_100k']:>14.1f}")
+    if "dicts" in stages and "arrow" in stages:
+        before, after = stages["dicts"], stages["arrow"]
+        print(f"   -> arrow : temps x{after['seconds'] / before['seconds']:.2f}, "
+              f"pic Python x{after['peak_mb'] / before['peak_mb']:.2f}, "
+              f"DataFrame x{after['frame_mb_per_100k'] / before['frame_mb_per_100k']:.2f}")
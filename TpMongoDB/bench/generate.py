@@ -0,0 +1,84 @@
+import random
+import itertools
+from datetime import datetime
+
+# Générateurs de documents bruts au format des API (mêmes champs, mêmes irrégularités) :
+# produits à la volée, la mémoire ne dépend pas de la taille demandée.
+
+SYLLABES = ["bit", "eth", "do", "ge", "sol", "ka", "ri", "pep", "sha", "ba", "lun", "ar",
+            "poly", "chain", "mo", "nero", "ton", "avax", "link", "uni", "ape", "floki"]
+MOTS_TITRES = ["Drake", "Distracted", "Woman", "Cat", "Doge", "Button", "Brain", "Buff",
+               "Change", "Mind", "Two", "Left", "Exit", "Ramp", "Success", "Kid"]
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+
+def parse_size(value):
+    """'1k' / '100k' / '1M' (ou un entier) -> nombre de documents"""
+    if value in SIZES:
+        return SIZES[value]
+    return int(value.replace("_", ""))
+
+def _base36(i):
+    chars = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while True:
+        i, r = divmod(i, 36)
+        out = chars[r] + out
+        if not i:
+            return out
+
+def coingecko_coins(n, seed=42, timestamp=None):
+    """n documents /coins/markets, classés par rang (≈0,5 % de symboles en double, variations nulles)"""
+    rng = random.Random(seed)
+    timestamp = timestamp or datetime.now()
+    previous = None
+    for i in range(n):
+        nom = "".join(rng.choice(SYLLABES) for _ in range(rng.randint(1, 3))).capitalize()
+        # Symbole court, rendu unique par le rang ; parfois repris d'une autre crypto
+        symbol = previous if previous and rng.random() < 0.005 else nom[:3].lower() + _base36(i)
+        previous = symbol
+        price = rng.lognormvariate(0, 3)
+        change = rng.gauss(0, 5)
+        market_cap = int(price * rng.randint(10**4, 10**9))
+        yield {
+            "id": f"{nom.lower()}-{i}",
+            "symbol": symbol,
+            "name": f"{nom} {i}",
+            "image": f"https://example.com/coins/{i}.png",
+            "current_price": price,
+            "market_cap": market_cap,
+            "market_cap_rank": i + 1 if rng.random() > 0.01 else None,
+            "fully_diluted_valuation": market_cap * rng.randint(1, 3),
+            "total_volume": rng.randint(10**3, 10**10),
+            "high_24h": price * (1 + abs(change) / 100),
+            "low_24h": price * (1 - abs(change) / 100),
+            "price_change_24h": price * change / 100,
+            "price_change_percentage_24h": change if rng.random() > 0.02 else None,
+            "circulating_supply": rng.uniform(10**5, 10**11),
+            "last_updated": timestamp.isoformat(),
+            "ingested_at": timestamp,
+        }
+
+def imgflip_memes(n, seed=42):
+    """n documents /get_memes (dimensions variées, box_count entre 2 et 5)"""
+    rng = random.Random(seed)
+    for i in range(n):
+        titre = " ".join(rng.choice(MOTS_TITRES) for _ in range(rng.randint(1, 4)))
+        yield {
+            "id": str(100_000 + i),
+            "name": f"{titre} {i}",
+            "url": f"https://i.imgflip.com/{_base36(i)}.jpg",
+            "width": rng.choice([500, 600, 680, 800, 1200]),
+            "height": rng.choice([400, 500, 600, 800, 1100, 1200]),
+            "box_count": rng.choice([2, 2, 2, 3, 4, 5]),
+            "captions": rng.randint(0, 10**6),
+        }
+
+def chunks(iterable, size):
+    """Découpe un générateur en listes de size éléments"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
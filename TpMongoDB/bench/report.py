@@ -0,0 +1,74 @@
+import time
+import tracemalloc
+import numpy as np
+
+# Mesure d'une étape et comparaison de deux rapports JSON
+
+# Métriques comparées : (clé, sens) ; +1 = plus haut est mieux, -1 = plus bas est mieux
+METRICS = [("throughput", +1), ("p50_ms", -1), ("p99_ms", -1), ("peak_mb", -1)]
+
+def measure(fn, *args, repeat=1):
+    """Exécute une étape repeat fois : débit médian, p50/p99 des latences unitaires, pic mémoire Python.
+
+    tracemalloc ralentit chaque allocation : les passages chronométrés s'en passent,
+    le pic mémoire vient d'un passage supplémentaire tracé à part.
+    """
+    runs = []
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        docs, run_samples = fn(*args)
+        runs.append((docs, time.perf_counter() - start))
+        samples.extend(run_samples)
+
+    tracemalloc.start()
+    try:
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    docs, elapsed = sorted(runs, key=lambda r: r[0] / r[1])[len(runs) // 2]
+    latencies = np.array(samples or [elapsed]) * 1000
+    return {
+        "docs": docs,
+        "seconds": round(elapsed, 4),
+        "throughput": round(docs / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "peak_mb": round(peak / 2**20, 2),
+        "samples": len(latencies),
+    }
+
+def print_report(report):
+    print(f"\n📊 Bench {report['size']} documents ({report['created_at']})")
+    print(f"{'étape':<14}{'docs':>10}{'docs/s':>14}{'p50 ms':>10}{'p99 ms':>10}{'pic Mo':>9}")
+    for name, stage in report["stages"].items():
+        if "skipped" in stage:
+            print(f"{name:<14}  ⏭️  ignorée : {stage['skipped']}")
+            continue
+        print(f"{name:<14}{stage['docs']:>10}{stage['throughput']:>14,.0f}"
+              f"{stage['p50_ms']:>10.2f}{stage['p99_ms']:>10.2f}{stage['peak_mb']:>9.1f}")
+
+def compare(baseline, candidate, threshold=0.10):
+    """Écart relatif par étape et par métrique ; renvoie la liste des régressions au-delà du seuil"""
+    regressions = []
+    if baseline.get("size") != candidate.get("size"):
+        print(f"⚠️ Tailles différentes : {baseline.get('size')} vs {candidate.get('size')}")
+
+    print(f"{'étape':<14}{'métrique':<12}{'avant':>14}{'après':>14}{'écart':>9}")
+    for name, before in baseline["stages"].items():
+        after = candidate["stages"].get(name)
+        if after is None or "skipped" in before or "skipped" in after:
+            continue
+        for key, direction in METRICS:
+            old, new = before[key], after[key]
+            if not old:
+                continue
+            delta = (new - old) / old
+            regressed = -direction * delta > threshold
+            flag = "❌" if regressed else ("✅" if direction * delta > threshold else "")
+            print(f"{name:<14}{key:<12}{old:>14,.2f}{new:>14,.2f}{delta:>+9.1%} {flag}")
+            if regressed:
+                regressions.append({"stage": name, "metric": key, "before": old, "after": new, "delta": delta})
+    return regressions
@@ -0,0 +1,109 @@
+import os
+import sys
+import math
+import time
+import random
+
+# Les étapes appellent le code de production (scripts/ et modules partagés)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([ROOT, os.path.join(ROOT, "scripts")])
+import clean_crypto
+import clean_memes
+import run_crypto
+from crypto_history import COLLECTION_HISTORY
+from crypto_queries import ensure_indexes, find_cryptos_frame, PAGE_SIZE
+from bench.generate import coingecko_coins, imgflip_memes, chunks, SYLLABES
+from bench.stub import start_coingecko_stub
+
+# Chaque étape reçoit la base de bench et la taille, et renvoie
+# (documents traités, latences unitaires en secondes).
+
+class StageSkipped(Exception):
+    """Étape impossible dans cet environnement (reportée comme ignorée dans le rapport)"""
+
+PER_PAGE = 250          # maximum de /coins/markets
+MEME_BATCH = 10_000
+NB_QUERIES = 200        # requêtes get_data par passage
+CATEGORIES = ["Tout", "Top 10", "Altcoin"]
+
+# n -> URL du faux CoinGecko : démarré (et les pages encodées) au premier passage, pris en
+# compte par le débit médian des passages
+_stubs = {}
+
+def coingecko_url(n):
+    if n not in _stubs:
+        pages = [[{k: v for k, v in coin.items() if k != "ingested_at"} for coin in page]
+                 for page in chunks(coingecko_coins(n), PER_PAGE)]
+        _stubs[n] = start_coingecko_stub(pages)[1]
+    return _stubs[n]
+
+def extract(db, n):
+    """run_crypto.extract_crypto sur un faux CoinGecko local (même rôle que COINGECKO_API_URL), sans rate limit"""
+    api_url = coingecko_url(n) + "/coins/markets"
+    # Historique repris de zéro : les passages (et le passage tracé) insèrent la même charge
+    db[COLLECTION_HISTORY].drop()
+    db["memes_top_100"].drop()
+    samples = []
+    run_crypto.extract_crypto(pages=math.ceil(n / PER_PAGE), per_page=PER_PAGE, rpm=0, api_url=api_url,
+                              client=db.client, db_name=db.name, timings=samples)
+    for memes in chunks(imgflip_memes(n), MEME_BATCH):
+        start = time.perf_counter()
+        db["memes_top_100"].insert_many(memes, ordered=False)
+        samples.append(time.perf_counter() - start)
+    return 2 * n, samples
+
+def clean_crypto_stage(db, n):
+    start = time.perf_counter()
+    stats = clean_crypto.load_batched(db)
+    return stats["inserted"], [time.perf_counter() - start]
+
+def clean_memes_stage(db, n):
+    start = time.perf_counter()
+    inserted = clean_memes.load_batched(db)
+    return inserted, [time.perf_counter() - start]
+
+def sync(db, n):
+    """sync_crypto_to_neo.sync_data, uniquement sur une instance dédiée (BENCH_NEO4J_URI) : le graphe y est vidé"""
+    uri = os.getenv("BENCH_NEO4J_URI")
+    if not uri:
+        raise StageSkipped("BENCH_NEO4J_URI non défini")
+    from neo4j import GraphDatabase
+    from sync_crypto_to_neo import sync_data, BATCH_SIZE
+
+    driver = GraphDatabase.driver(uri, auth=("neo4j", os.getenv("BENCH_NEO4J_PASSWORD")))
+    samples = []
+    try:
+        # Graphe vide à chaque passage : les passages mesurent la même charge
+        with driver.session() as session:
+            session.run("MATCH (n) DETACH DELETE n").consume()
+        nb_rows = sync_data(BATCH_SIZE, driver=driver, collection=db["market_cap_clean"], timings=samples)
+    finally:
+        driver.close()
+    return nb_rows, samples
+
+def get_data(db, n, seed=42):
+    """Pages du dashboard décodées en DataFrame typé : chemin MongoDB de app_crypto.get_data (sans Redis)"""
+    collection = db["market_cap_clean"]
+    ensure_indexes(collection)
+    rng = random.Random(seed)
+    nb_pages = max(1, min(n // PAGE_SIZE, 20))
+    samples = []
+    nb_docs = 0
+    for _ in range(NB_QUERIES):
+        search = rng.choice(["", "", rng.choice(SYLLABES)])
+        categorie = rng.choice(CATEGORIES)
+        page = rng.randrange(nb_pages)
+        start = time.perf_counter()
+        frame = find_cryptos_frame(collection, search, categorie, page)
+        samples.append(time.perf_counter() - start)
+        nb_docs += len(frame)
+    return nb_docs, samples
+
+# Ordre d'exécution : chaque étape lit ce que la précédente a écrit
+STAGES = {
+    "extract": extract,
+    "clean_crypto": clean_crypto_stage,
+    "clean_memes": clean_memes_stage,
+    "sync": sync,
+    "get_data": get_data,
+}
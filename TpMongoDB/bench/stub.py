@@ -0,0 +1,29 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Faux serveur /coins/markets (local) : run_crypto.extract_crypto est mesuré sans le réseau
+# ni le rate limit de CoinGecko. Les pages sont encodées en JSON une fois, au démarrage.
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        page = int(params.get("page", ["1"])[0])
+        body = self.server.pages[page - 1] if 0 < page <= len(self.server.pages) else b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # une ligne par page sur stderr sinon
+
+def start_coingecko_stub(pages):
+    """Sert les pages (listes de documents) sur un port libre ; renvoie (serveur, URL de base de l'API)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.pages = [json.dumps(page, default=str).encode() for page in pages]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
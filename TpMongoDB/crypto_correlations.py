@@ -0,0 +1,200 @@
+import os
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pyarrow as pa
+from dotenv import load_dotenv
+from crypto_history import DB_NAME, COLLECTION_HISTORY
+from arrow_results import table_from_raw_batches
+from mongo_client import get_client
+
+load_dotenv()
+
+# Cryptos qui bougent ensemble : corrélation des rendements de prix (historique time-series),
+# calculée en NumPy sur toute la matrice, écrite dans Neo4j en relations pondérées
+#   (:Crypto)-[:CORRELE_AVEC {coefficient, rang, points, calcule_le}]->(:Crypto)
+# Seuls les K plus proches voisins de chaque crypto sont gardés.
+#
+# Pas de boucle sur les paires : les rendements sont centrés et normés (une ligne par crypto),
+# la corrélation d'un bloc de lignes avec toutes les autres est un produit matriciel.
+# Les blocs (CHUNK_SIZE lignes) bornent la mémoire à CHUNK_SIZE x N valeurs au lieu de N x N.
+
+TOP_K = int(os.getenv("CORRELATION_TOP_K", "10"))
+MIN_CORRELATION = float(os.getenv("CORRELATION_MIN", "0.5")) # arêtes plus faibles ignorées
+MIN_POINTS = int(os.getenv("CORRELATION_MIN_POINTS", "24"))  # rendements observés minimum par crypto
+CHUNK_SIZE = int(os.getenv("CORRELATION_CHUNK_SIZE", "1024"))
+
+# Un point par (crypto, intervalle), lu en colonnes (aggregate_raw_batches + arrow_results)
+POINTS_SCHEMA = pa.schema([
+    ("symbole", pa.string()),
+    ("date", pa.timestamp("ms")),
+    ("prix_usd", pa.float64()),
+])
+
+def points_pipeline(start, end, unit="hour", bin_size=1):
+    """Prix moyen par crypto et par intervalle (même rééchantillonnage que get_resampled)"""
+    return [
+        {"$match": {"ingested_at": {"$gte": start, "$lt": end}, "prix_usd": {"$gt": 0}}},
+        {"$group": {
+            "_id": {"symbole": "$coin.symbole",
+                    "date": {"$dateTrunc": {"date": "$ingested_at", "unit": unit, "binSize": bin_size}}},
+            "prix_usd": {"$avg": "$prix_usd"},
+        }},
+        {"$project": {"_id": 0, "symbole": "$_id.symbole", "date": "$_id.date", "prix_usd": 1}},
+    ]
+
+def load_price_matrix(db, start, end=None, unit="hour", bin_size=1):
+    """(symboles, matrice des prix symboles x intervalles) ; trou = dernier prix connu, NaN avant le premier"""
+    end = end or datetime.now(timezone.utc)
+    batches = db[COLLECTION_HISTORY].aggregate_raw_batches(points_pipeline(start, end, unit, bin_size))
+    return price_matrix(table_from_raw_batches(batches, POINTS_SCHEMA))
+
+def price_matrix(table):
+    symboles, rows = np.unique(table.column("symbole").to_numpy(zero_copy_only=False), return_inverse=True)
+    dates, cols = np.unique(table.column("date").to_numpy(), return_inverse=True)
+    prices = np.full((len(symboles), len(dates)), np.nan)
+    prices[rows, cols] = table.column("prix_usd").to_numpy(zero_copy_only=False)
+    return symboles, forward_fill(prices)
+
+def forward_fill(prices):
+    """LOCF ligne par ligne, sans boucle : indice de la dernière valeur connue par colonne"""
+    idx = np.where(np.isnan(prices), 0, np.arange(prices.shape[1]))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return prices[np.arange(prices.shape[0])[:, None], idx]
+
+def normalized_returns(prices, min_points=MIN_POINTS):
+    """(lignes gardées, rendements log centrés de norme 1, rendements observés par ligne).
+
+    z[i] @ z[j] est alors la corrélation de Pearson de i et j. Les rendements manquants valent
+    la moyenne de la ligne (0 après centrage) : ils ne pèsent pas dans la covariance.
+    Les cryptos à prix constant (stablecoins) ou trop peu observées sont écartées.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(prices), axis=1)
+    observed = np.isfinite(returns)
+    points = observed.sum(axis=1)
+
+    returns = np.where(observed, returns, 0.0)
+    means = returns.sum(axis=1) / np.maximum(points, 1)
+    z = np.where(observed, returns - means[:, None], 0.0)
+    norms = np.linalg.norm(z, axis=1)
+
+    keep = np.flatnonzero((points >= min_points) & (norms > 1e-12))
+    # float32 : deux fois moins de mémoire par bloc, précision largement suffisante pour un classement
+    z = (z[keep] / norms[keep, None]).astype(np.float32)
+    return keep, z, points[keep]
+
+def top_k_neighbours(z, k=TOP_K, chunk_size=CHUNK_SIZE):
+    """(indices, coefficients) des k voisins les plus corrélés de chaque ligne, triés par coefficient"""
+    n = len(z)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64), np.empty((n, 0), dtype=np.float32)
+
+    neighbours = np.empty((n, k), dtype=np.int64)
+    scores = np.empty((n, k), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        block = z[start:start + chunk_size] @ z.T # (bloc, n) : corrélations avec toutes les cryptos
+        rows = np.arange(len(block))
+        block[rows, start + rows] = -np.inf # pas de lien vers soi-même
+
+        # Sélection partielle des k meilleurs (O(n)), puis tri de ces k seulement
+        best = np.argpartition(block, -k, axis=1)[:, -k:]
+        best_scores = np.take_along_axis(block, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        neighbours[start:start + len(block)] = np.take_along_axis(best, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(best_scores, order, axis=1)
+    return neighbours, np.clip(scores, -1.0, 1.0)
+
+def edge_rows(symboles, points, neighbours, scores, min_correlation=MIN_CORRELATION):
+    """Paramètres Cypher : une ligne par crypto, ses voisins au-dessus du seuil"""
+    rows = []
+    for i, symbole in enumerate(symboles):
+        strong = scores[i] >= min_correlation
+        rows.append({
+            "symbole": str(symbole),
+            "points": int(points[i]),
+            "voisins": [{"symbole": str(symboles[j]), "coefficient": round(float(s), 4), "rang": rang}
+                        for rang, (j, s) in enumerate(zip(neighbours[i][strong], scores[i][strong]), start=1)],
+        })
+    return rows
+
+# Les anciens voisins d'une crypto sont remplacés (les liens sortants sont ceux du dernier calcul)
+EDGES_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Crypto {symbole: row.symbole})
+OPTIONAL MATCH (a)-[old:CORRELE_AVEC]->()
+DELETE old
+
+WITH DISTINCT a, row
+UNWIND row.voisins AS v
+MATCH (b:Crypto {symbole: v.symbole})
+CREATE (a)-[:CORRELE_AVEC {coefficient: v.coefficient, rang: v.rang, points: row.points, calcule_le: $calcule_le}]->(b)
+"""
+
+# Cryptos sans assez d'historique ce coup-ci : leurs anciens liens ne sont plus fiables
+PRUNE_EDGES_QUERY = """
+MATCH (a:Crypto)-[r:CORRELE_AVEC]->()
+WHERE NOT a.symbole IN $symboles
+DELETE r
+"""
+
+def write_edges(tx, rows, calcule_le):
+    tx.run(EDGES_QUERY, rows=rows, calcule_le=calcule_le).consume()
+
+def prune_edges(tx, symboles):
+    tx.run(PRUNE_EDGES_QUERY, symboles=symboles).consume()
+
+def correlate(days=7, unit="hour", bin_size=1, k=TOP_K, min_correlation=MIN_CORRELATION,
+              batch_size=None, client=None, driver=None):
+    """Historique -> top-k des corrélations -> relations CORRELE_AVEC ; renvoie les statistiques"""
+    # neo4j n'est requis qu'ici : le calcul matriciel (et le bench) s'en passent
+    from sync_crypto_to_neo import get_driver, create_constraints, BATCH_SIZE
+    batch_size = batch_size or BATCH_SIZE
+    db = (client or get_client("etl"))[DB_NAME]
+
+    start = time.perf_counter()
+    symboles, prices = load_price_matrix(db, datetime.now(timezone.utc) - timedelta(days=days), unit=unit, bin_size=bin_size)
+    loaded = time.perf_counter()
+    keep, z, points = normalized_returns(prices)
+    neighbours, scores = top_k_neighbours(z, k)
+    rows = edge_rows(symboles[keep], points, neighbours, scores, min_correlation)
+    computed = time.perf_counter()
+
+    own_driver = driver is None
+    driver = driver or get_driver()
+    calcule_le = datetime.now().isoformat(timespec="seconds")
+    try:
+        with driver.session() as session:
+            create_constraints(session)
+            for i in range(0, len(rows), batch_size):
+                session.execute_write(write_edges, rows[i:i + batch_size], calcule_le)
+            session.execute_write(prune_edges, [row["symbole"] for row in rows])
+    finally:
+        if own_driver:
+            driver.close()
+
+    stats = {
+        "symboles": len(symboles),
+        "correles": len(rows),
+        "intervalles": prices.shape[1],
+        "aretes": sum(len(row["voisins"]) for row in rows),
+        "load_s": round(loaded - start, 3),
+        "matrix_s": round(computed - loaded, 3),
+        "write_s": round(time.perf_counter() - computed, 3),
+    }
+    print(f"🔗 {stats['aretes']} relations CORRELE_AVEC pour {stats['correles']}/{stats['symboles']} cryptos "
+          f"({stats['intervalles']} intervalles) : lecture {stats['load_s']:.2f}s, "
+          f"matrice {stats['matrix_s']:.2f}s, Neo4j {stats['write_s']:.2f}s.")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corrélations de prix -> relations CORRELE_AVEC dans Neo4j")
+    parser.add_argument("--days", type=float, default=7, help="Fenêtre d'historique (jours)")
+    parser.add_argument("--unit", default="hour", choices=["minute", "hour", "day"], help="Pas de rééchantillonnage")
+    parser.add_argument("--bin-size", type=int, default=1, help="Nombre d'unités par intervalle")
+    parser.add_argument("--k", type=int, default=TOP_K, help="Voisins gardés par crypto")
+    parser.add_argument("--min", type=float, default=MIN_CORRELATION, help="Coefficient minimum d'une relation")
+    args = parser.parse_args()
+    correlate(args.days, args.unit, args.bin_size, args.k, args.min)
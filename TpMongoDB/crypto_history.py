@@ -0,0 +1,106 @@
+import sys
+import itertools
+from datetime import datetime, timedelta, timezone
+
+# Config
+DB_NAME = "crypto_data"
+COLLECTION_HISTORY = "market_cap_history" # Collection time-series (historique)
+
+# Seuls les champs utiles à l'analyse sont historisés : les buckets restent compacts
+HISTORY_FIELDS = {
+    "current_price": "prix_usd",
+    "market_cap": "market_cap",
+    "total_volume": "volume",
+    "price_change_percentage_24h": "variation_24h",
+}
+
+def ensure_history_collection(db):
+    """Crée la collection time-series si elle n'existe pas encore"""
+    if COLLECTION_HISTORY not in db.list_collection_names():
+        db.create_collection(
+            COLLECTION_HISTORY,
+            timeseries={
+                "timeField": "ingested_at",
+                "metaField": "coin",    # {id, symbole} : une série par crypto
+                "granularity": "minutes"
+            }
+        )
+        # Index secondaire pour les requêtes par symbole sur une fenêtre de temps
+        db[COLLECTION_HISTORY].create_index([("coin.symbole", 1), ("ingested_at", 1)])
+    return db[COLLECTION_HISTORY]
+
+def append_snapshot(db, data, timestamp=None):
+    """Ajoute un snapshot CoinGecko à l'historique (jamais de drop)"""
+    col = ensure_history_collection(db)
+    timestamp = timestamp or datetime.now(timezone.utc)
+
+    points = []
+    for coin in data:
+        point = {
+            "ingested_at": coin.get("ingested_at", timestamp),
+            "coin": {"id": coin.get("id"), "symbole": (coin.get("symbol") or "").upper()},
+        }
+        for raw_field, field in HISTORY_FIELDS.items():
+            point[field] = coin.get(raw_field)
+        points.append(point)
+
+    if points:
+        col.insert_many(points, ordered=False)
+    return len(points)
+
+def append_collection(db, source, batch_size=5_000):
+    """Historise un snapshot complet déjà en base (ex: staging de run_crypto), par lots"""
+    projection = {"_id": 0, "id": 1, "symbol": 1, "ingested_at": 1, **{field: 1 for field in HISTORY_FIELDS}}
+    cursor = source.find({}, projection, batch_size=batch_size)
+    total = 0
+    while batch := list(itertools.islice(cursor, batch_size)):
+        total += append_snapshot(db, batch)
+    return total
+
+def get_ohlc(db, symbole, start, end=None, unit="hour", bin_size=1):
+    """OHLC d'une crypto par intervalle (calcul côté serveur)"""
+    end = end or datetime.now(timezone.utc)
+    pipeline = [
+        {"$match": {"coin.symbole": symbole.upper(), "ingested_at": {"$gte": start, "$lt": end}}},
+        {"$sort": {"ingested_at": 1}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$ingested_at", "unit": unit, "binSize": bin_size}},
+            "open": {"$first": "$prix_usd"},
+            "high": {"$max": "$prix_usd"},
+            "low": {"$min": "$prix_usd"},
+            "close": {"$last": "$prix_usd"},
+            "volume": {"$last": "$volume"},
+            "nb_points": {"$sum": 1},
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "date": "$_id", "open": 1, "high": 1, "low": 1,
+                      "close": 1, "volume": 1, "nb_points": 1}},
+    ]
+    return list(db[COLLECTION_HISTORY].aggregate(pipeline))
+
+def get_resampled(db, symbole, start, end=None, unit="hour", bin_size=1):
+    """Série de prix rééchantillonnée à pas fixe, trous comblés (côté serveur)"""
+    end = end or datetime.now(timezone.utc)
+    pipeline = [
+        {"$match": {"coin.symbole": symbole.upper(), "ingested_at": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$ingested_at", "unit": unit, "binSize": bin_size}},
+            "prix_usd": {"$avg": "$prix_usd"},
+        }},
+        {"$project": {"_id": 0, "date": "$_id", "prix_usd": 1}},
+        # Un point par intervalle entre le premier et le dernier snapshot
+        {"$densify": {"field": "date", "range": {"step": bin_size, "unit": unit, "bounds": "full"}}},
+        # Trou = dernier prix connu
+        {"$fill": {"sortBy": {"date": 1}, "output": {"prix_usd": {"method": "locf"}}}},
+        {"$sort": {"date": 1}},
+    ]
+    return list(db[COLLECTION_HISTORY].aggregate(pipeline))
+
+if __name__ == "__main__":
+    # Usage : python crypto_history.py BTC
+    symbole = sys.argv[1] if len(sys.argv) > 1 else "BTC"
+    from mongo_client import get_client
+    db = get_client("etl")[DB_NAME]
+
+    for bar in get_ohlc(db, symbole, datetime.now(timezone.utc) - timedelta(days=1)):
+        print(f"{bar['date']:%Y-%m-%d %H:%M} | O {bar['open']} H {bar['high']} L {bar['low']} C {bar['close']}")
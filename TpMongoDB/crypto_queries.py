@@ -0,0 +1,143 @@
+import pymongo
+import pyarrow as pa
+from pymongo.collation import Collation
+from arrow_results import find_table, to_frame, frame_from_rows
+from mongo_client import create_index
+
+# Couche de requêtes du dashboard : filtres, tri et pagination exécutés par MongoDB
+
+# Colonnes affichées par st.dataframe (+ _id pour la gestion)
+DISPLAY_FIELDS = ["image", "nom", "symbole", "prix_usd", "variation_24h", "market_cap", "categorie", "tendance"]
+PROJECTION = {field: 1 for field in DISPLAY_FIELDS}
+
+# Comparaisons insensibles à la casse et aux accents ("btc" == "BTC", "ether" == "Éther") :
+# la force 1 ne compare que les lettres de base (la force 2 distinguerait encore les accents)
+COLLATION = Collation(locale="fr", strength=1)
+
+PAGE_SIZE = 50
+
+# Date de dernière écriture d'un dashboard / de l'agent (deltas relus par snapshots.changes_since)
+MODIFIED_FIELD = "modifie_le"
+
+# Types des colonnes affichées (find_cryptos_frame) : catégorie et tendance ont peu de valeurs
+FRAME_SCHEMA = pa.schema([
+    ("_id", pa.string()),
+    ("image", pa.string()),
+    ("nom", pa.string()),
+    ("symbole", pa.string()),
+    ("prix_usd", pa.float64()),
+    ("variation_24h", pa.float64()),
+    ("market_cap", pa.int64()),
+    ("categorie", pa.dictionary(pa.int32(), pa.string())),
+    ("tendance", pa.dictionary(pa.int32(), pa.string())),
+])
+
+# Colonnes renvoyées aux outils de l'agent (réponses compactes = peu de tokens)
+AGENT_PROJECTION = {"_id": 0, "nom": 1, "symbole": 1, "prix_usd": 1, "variation_24h": 1, "categorie": 1}
+AGENT_MAX_RESULTS = 20
+
+def ensure_indexes(collection):
+    """Index utilisés par les requêtes du dashboard (même collation que les requêtes)"""
+    # Un index créé sous une ancienne collation est reconstruit (create_index de mongo_client)
+    create_index(collection, [("categorie", 1), ("market_cap", -1)], collation=COLLATION, name="categorie_market_cap")
+    create_index(collection, [("market_cap", -1)], collation=COLLATION, name="market_cap_ci")
+    create_index(collection, [("nom", 1)], collation=COLLATION, name="nom_ci")
+    create_index(collection, [("symbole", 1)], collation=COLLATION, name="symbole_ci")
+    create_index(collection, [("variation_24h", -1)], collation=COLLATION, name="variation_24h_ci")
+    # Sparse : seuls les documents écrits depuis le dernier clean portent le champ
+    create_index(collection, [(MODIFIED_FIELD, 1)], sparse=True, name="modifie_le")
+
+def build_filter(search="", categorie="Tout"):
+    """Traduit la barre de recherche et le filtre catégorie en filtre MongoDB"""
+    query = {}
+    search = (search or "").strip()
+    if search:
+        # Recherche par préfixe : un intervalle [q, q + U+FFFF) parcourt l'index,
+        # U+FFFF ayant le poids le plus élevé dans la collation ICU
+        prefix = {"$gte": search, "$lt": search + "\uffff"}
+        query["$or"] = [{"nom": prefix}, {"symbole": prefix}]
+    if categorie and categorie != "Tout":
+        query["categorie"] = categorie
+    return query
+
+def find_cryptos(collection, search="", categorie="Tout", page=0, page_size=PAGE_SIZE):
+    """Une page de résultats, triée par capitalisation, limitée aux colonnes affichées"""
+    cursor = (
+        collection.find(build_filter(search, categorie), PROJECTION, collation=COLLATION)
+        .sort([("market_cap", pymongo.DESCENDING), ("_id", pymongo.ASCENDING)])
+        .skip(page * page_size)
+        .limit(page_size)
+    )
+    return list(cursor)
+
+def find_cryptos_frame(collection, search="", categorie="Tout", page=0, page_size=PAGE_SIZE):
+    """Même page que find_cryptos, en DataFrame aux colonnes typées (arrow_results)"""
+    table = find_table(
+        collection, build_filter(search, categorie), FRAME_SCHEMA,
+        sort=[("market_cap", pymongo.DESCENDING), ("_id", pymongo.ASCENDING)],
+        skip=page * page_size, limit=page_size, collation=COLLATION,
+    )
+    return to_frame(table)
+
+def cryptos_frame_from_rows(rows):
+    return frame_from_rows(rows, FRAME_SCHEMA)
+
+def count_cryptos(collection, search="", categorie="Tout"):
+    """Nombre de résultats (métadonnées de la collection si aucun filtre)"""
+    query = build_filter(search, categorie)
+    if not query:
+        return collection.estimated_document_count()
+    return collection.count_documents(query, collation=COLLATION)
+
+# LECTURES DE L'AGENT (outils)
+
+def agent_limit(limit):
+    """Limite demandée par le modèle -> 1..AGENT_MAX_RESULTS (ValueError si ce n'est pas un nombre).
+
+    Jamais 0 : pour MongoDB, .limit(0) veut dire "sans limite".
+    """
+    if isinstance(limit, bool):
+        raise ValueError(f"limit invalide : {limit!r}")
+    return max(1, min(int(limit), AGENT_MAX_RESULTS))
+
+def search_crypto(collection, query="", categorie=None, limit=10):
+    """Cryptos dont le nom ou le symbole commence par query"""
+    cursor = (
+        collection.find(build_filter(query, categorie or "Tout"), AGENT_PROJECTION, collation=COLLATION)
+        .sort("market_cap", pymongo.DESCENDING)
+        .limit(agent_limit(limit))
+    )
+    return list(cursor)
+
+def get_crypto_by_symbol(collection, symbole):
+    """Une crypto par son ticker (index unique sur symbole)"""
+    return collection.find_one({"symbole": symbole.upper()}, {**AGENT_PROJECTION, "market_cap": 1, "tendance": 1})
+
+def top_movers(collection, direction="hausse", limit=5):
+    """Plus fortes hausses (ou baisses) sur 24h"""
+    order = pymongo.DESCENDING if direction == "hausse" else pymongo.ASCENDING
+    cursor = (
+        collection.find({"variation_24h": {"$ne": None}}, AGENT_PROJECTION, collation=COLLATION)
+        .sort("variation_24h", order)
+        .limit(agent_limit(limit))
+    )
+    return list(cursor)
+
+def category_stats(collection):
+    """Nombre de cryptos, prix moyen, capitalisation totale et variation moyenne par catégorie"""
+    pipeline = [
+        {"$project": {"categorie": 1, "prix_usd": 1, "market_cap": 1, "variation_24h": 1}},
+        {"$group": {
+            "_id": "$categorie",
+            "nb": {"$sum": 1},
+            "prix_moyen": {"$avg": "$prix_usd"},
+            "market_cap_totale": {"$sum": "$market_cap"},
+            "variation_moyenne": {"$avg": "$variation_24h"},
+        }},
+        {"$project": {"_id": 0, "categorie": "$_id", "nb": 1,
+                      "prix_moyen": {"$round": ["$prix_moyen", 2]},
+                      "market_cap_totale": 1,
+                      "variation_moyenne": {"$round": ["$variation_moyenne", 2]}}},
+        {"$sort": {"market_cap_totale": -1}},
+    ]
+    return list(collection.aggregate(pipeline))
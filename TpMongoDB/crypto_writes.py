@@ -0,0 +1,177 @@
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import PyMongoError, BulkWriteError
+from snapshots import MODIFIED_FIELD, now
+
+# Écritures de l'agent : tous les appels d'outils d'un tour -> un seul bulk_write
+# dans une transaction (tout ou rien, un aller-retour).
+# Sur un mongod standalone (pas de transactions) : même bulk_write non ordonné, hors transaction,
+# et le compte rendu le signale (une opération en échec n'annule pas les autres).
+
+NEW_COIN_IMAGE = "https://cdn-icons-png.flaticon.com/512/1213/1213779.png"
+
+# Outils d'écriture exposés à l'agent (les autres outils sont des lectures)
+WRITE_TOOLS = {
+    "create_crypto", "create_cryptos",
+    "update_crypto_by_symbol", "update_cryptos_by_symbol",
+    "delete_crypto_by_name", "delete_cryptos_by_name",
+}
+
+# Arguments des outils -> champs du document
+UPDATABLE_FIELDS = {"prix": "prix_usd", "categorie": "categorie", "nom": "nom"}
+
+def new_coin(nom, symbole, prix, categorie):
+    """Document d'une crypto ajoutée à la main (formulaire ou agent)"""
+    return {
+        "nom": nom,
+        "symbole": symbole.upper(),
+        "prix_usd": prix,
+        "variation_24h": 0,
+        "tendance": "🆕 Nouveau",
+        "categorie": categorie,
+        "market_cap": 0,
+        "image": NEW_COIN_IMAGE,
+        MODIFIED_FIELD: now(), # relu en delta par les dashboards partis d'un snapshot
+    }
+
+def expand_call(func_name, args):
+    """Un appel d'outil -> liste d'opérations unitaires (kind, arguments)"""
+    if func_name == "create_crypto":
+        return [("create", args)]
+    if func_name == "create_cryptos":
+        return [("create", item) for item in args.get("cryptos", [])]
+    if func_name == "update_crypto_by_symbol":
+        return [("update", args)]
+    if func_name == "update_cryptos_by_symbol":
+        return [("update", item) for item in args.get("cryptos", [])]
+    if func_name == "delete_crypto_by_name":
+        return [("delete", args)]
+    if func_name == "delete_cryptos_by_name":
+        return [("delete", {"nom": nom}) for nom in args.get("noms", [])]
+    return []
+
+def _to_op(kind, args):
+    if kind == "create":
+        doc = new_coin(args["nom"], args["symbole"], float(args["prix"]), args["categorie"])
+        # upsert + $setOnInsert : un symbole existant n'est pas écrasé et n'annule pas le lot
+        return UpdateOne({"symbole": doc["symbole"]}, {"$setOnInsert": doc}, upsert=True)
+    if kind == "update":
+        symbole = args["symbole"].upper()
+        fields = {field: args[arg] for arg, field in UPDATABLE_FIELDS.items() if args.get(arg) is not None}
+        if "prix_usd" in fields:
+            fields["prix_usd"] = float(fields["prix_usd"])
+        if not fields:
+            return None
+        return UpdateOne({"symbole": symbole}, {"$set": fields, "$currentDate": {MODIFIED_FIELD: True}})
+    return DeleteOne({"nom": args["nom"]})
+
+_transactions = {} # id(client) -> le serveur accepte les transactions
+
+def supports_transactions(client):
+    """Replica set ou mongos (réponse de hello) ; un mongod standalone refuse les transactions"""
+    key = id(client)
+    if key not in _transactions:
+        hello = client.admin.command("hello")
+        _transactions[key] = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+    return _transactions[key]
+
+def _label(kind, args):
+    return {"op": kind, "nom": args["nom"]} if kind == "delete" else {"op": kind, "symbole": args["symbole"].upper()}
+
+def execute_batch(client, collection, calls):
+    """Exécute les appels d'écriture d'un tour : calls = [(call_id, func_name, args)].
+
+    Renvoie (résultats par appel {call_id: [résultat par op]}, symboles écrits, symboles supprimés).
+    """
+    planned = [] # (call_id, kind, args, op)
+    results = {call_id: [] for call_id, _, _ in calls}
+    for call_id, func_name, args in calls:
+        try:
+            items = expand_call(func_name, args)
+        except (TypeError, AttributeError) as e:
+            # ex : "cryptos" qui n'est pas une liste
+            results[call_id].append({"op": func_name, "statut": f"argument invalide : {e}"})
+            continue
+        for kind, item in items:
+            try:
+                op = _to_op(kind, item)
+            except KeyError as e:
+                results[call_id].append({"op": kind, "statut": f"argument manquant : {e}"})
+                continue
+            except (TypeError, ValueError, AttributeError) as e:
+                results[call_id].append({"op": kind, "statut": f"argument invalide : {e}"})
+                continue
+            if op is None:
+                results[call_id].append({**_label(kind, item), "statut": "rien à modifier"})
+                continue
+            planned.append((call_id, kind, item, op))
+
+    if not planned:
+        return results, set(), set()
+
+    symboles = [item["symbole"].upper() for _, kind, item, _ in planned if kind != "delete"]
+    noms = [item["nom"] for _, kind, item, _ in planned if kind == "delete"]
+
+    def run(session=None):
+        # Lecture dans la transaction : état avant le lot, pour le compte rendu par opération
+        before = list(collection.find(
+            {"$or": [{"symbole": {"$in": symboles}}, {"nom": {"$in": noms}}]},
+            {"nom": 1, "symbole": 1}, session=session
+        ))
+        try:
+            result = collection.bulk_write([op for *_, op in planned], ordered=False, session=session)
+        except BulkWriteError as e:
+            if session is not None:
+                raise # transaction : tout est annulé
+            # Hors transaction, non ordonné : les opérations sans erreur sont appliquées
+            upserted = {u["index"] for u in e.details.get("upserted", [])}
+            failed = {err["index"]: err.get("errmsg", "") for err in e.details.get("writeErrors", [])}
+            return before, upserted, failed
+        return before, set(result.upserted_ids), {}
+
+    transactional = False
+    try:
+        transactional = supports_transactions(client)
+        if transactional:
+            with client.start_session() as session:
+                before, upserted, failed = session.with_transaction(run)
+        else:
+            before, upserted, failed = run()
+    except PyMongoError as e:
+        statut = "annulé" if transactional else "échec"
+        for call_id, kind, item, _ in planned:
+            results[call_id].append({**_label(kind, item), "statut": f"{statut} ({e.__class__.__name__})"})
+        return results, set(), set()
+
+    existing = {doc["symbole"] for doc in before}
+    by_name = {}
+    for doc in before:
+        by_name.setdefault(doc["nom"], []).append(doc["symbole"])
+
+    written, deleted = set(), set()
+    for i, (call_id, kind, item, _) in enumerate(planned):
+        label = _label(kind, item)
+        if not transactional:
+            label["transaction"] = "non (mongod standalone)"
+        if i in failed:
+            statut = f"échec : {failed[i]}"
+        elif kind == "create":
+            created = i in upserted
+            if created:
+                existing.add(label["symbole"])
+                written.add(label["symbole"])
+            statut = "créé" if created else "existe déjà"
+        elif kind == "update":
+            found = label["symbole"] in existing
+            if found:
+                written.add(label["symbole"])
+            statut = "modifié" if found else "introuvable"
+        else:
+            # DeleteOne : un document supprimé par nom, comme find_one_and_delete
+            matches = by_name.get(label["nom"])
+            if matches:
+                deleted.add(matches.pop(0))
+                statut = "supprimé"
+            else:
+                statut = "introuvable"
+        results[call_id].append({**label, "statut": statut})
+    return results, written - deleted, deleted
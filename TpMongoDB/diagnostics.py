@@ -0,0 +1,34 @@
+import pandas as pd
+import streamlit as st
+from metrics import registry
+from mongo_client import pool_report
+
+# Onglet "🩺 Diagnostics" commun aux deux dashboards
+
+def render_diagnostics(workload="ui"):
+    """Pool MongoDB, histogrammes et compteurs du process, export Prometheus"""
+    st.subheader("🩺 Diagnostics")
+    st.caption("Mesures de ce process depuis son démarrage : commandes MongoDB par collection, pool "
+               "(pymongo.monitoring), appels Groq, pandas.")
+    pool = pool_report(workload)
+    st.caption(f"🔌 Pool MongoDB : {pool['checkouts']} connexions empruntées, attente p50 {pool['p50_ms']} ms · "
+               f"p99 {pool['p99_ms']} ms · moyenne {pool['mean_ms']} ms")
+    latences = registry.summary()
+    if latences:
+        st.dataframe(pd.DataFrame(latences), hide_index=True, use_container_width=True)
+    else:
+        st.info("Aucune mesure pour l'instant.")
+    compteurs = registry.values()
+    if compteurs:
+        st.dataframe(pd.DataFrame(compteurs), hide_index=True, use_container_width=True)
+
+    prometheus = registry.render_prometheus()
+    with st.expander("Format texte Prometheus"):
+        st.code(prometheus, language="text")
+    c_dl, c_reset = st.columns(2)
+    with c_dl:
+        st.download_button("⬇️ metrics.prom", prometheus, file_name="metrics.prom", mime="text/plain")
+    with c_reset:
+        if st.button("🔄 Remettre à zéro", key="reset_metrics"):
+            registry.reset()
+            st.rerun()
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import hashlib
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from pymongo import ASCENDING, ReturnDocument
+from metrics import registry
+from read_cache import bump_version, cached_read
+
+# Cache persistant des réponses Groq, stocké dans MongoDB (index TTL).
+# Clé = hash de tous les paramètres de la requête (model, temperature, messages, tools, tool_choice,
+# max_tokens...) sauf ceux du transport (KEY_IGNORED) : même requête -> même réponse.
+# Compteurs et latences (un seul document _stats) sont relus via read_cache, la version de _stats
+# étant incrémentée à chaque appel : pas de requête MongoDB à chaque rerun du dashboard.
+
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))) # 7 jours
+LATENCY_WINDOW = 100 # appels à l'API gardés pour les latences moyennes
+# Paramètres sans effet sur le contenu de la réponse (streaming, délai, en-têtes HTTP)
+KEY_IGNORED = {"stream", "stream_options", "timeout", "extra_headers"}
+
+def _jsonable(obj):
+    # Objets pydantic du SDK Groq (ex: tool_calls gardés dans l'historique)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+def _revive(doc):
+    """Document stocké -> objet réponse (mêmes attributs que le SDK : .choices[0].message...)"""
+    try:
+        from groq.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(doc)
+    except Exception:
+        return json.loads(json.dumps(doc), object_hook=lambda d: SimpleNamespace(**d))
+
+def _replay(response):
+    """Réponse stockée -> faux flux (un seul fragment), même forme que les chunks du SDK"""
+    choice = response["choices"][0]
+    message = choice["message"]
+    calls = [
+        SimpleNamespace(index=i, id=c["id"], function=SimpleNamespace(**c["function"]))
+        for i, c in enumerate(message.get("tool_calls") or [])
+    ]
+    delta = SimpleNamespace(content=message.get("content"), tool_calls=calls or None)
+    yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=choice.get("finish_reason"))],
+                          x_groq=None)
+
+class StreamedCompletion:
+    """Réponse en streaming : itérable de fragments de texte (à passer à st.write_stream).
+
+    Les appels d'outils sont reconstitués au fil des deltas ; on_tool_call(call) est appelé
+    dès que les arguments d'un appel sont complets (appel suivant commencé ou fin du flux).
+    Après l'itération : .content, .tool_calls, .first_token_s, .total_s
+    """
+
+    def __init__(self, chunks, on_tool_call=None, on_done=None, started=None):
+        self._chunks = chunks
+        self._on_tool_call = on_tool_call
+        self._on_done = on_done
+        self.started = started or time.perf_counter()
+        self.content = ""
+        self.tool_calls = []
+        self.finish_reason = None
+        self.usage = None
+        self.first_token_s = None
+        self.total_s = None
+
+    def _emit(self, pending, upto=None):
+        # Appels d'index < upto terminés : on peut les exécuter sans attendre la fin du flux
+        for idx in sorted(i for i in pending if upto is None or i < upto):
+            call = pending.pop(idx)
+            self.tool_calls.append(call)
+            if self._on_tool_call:
+                self._on_tool_call(call)
+
+    def __iter__(self):
+        pending = {}
+        for chunk in self._chunks:
+            x_groq = getattr(chunk, "x_groq", None)
+            if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                self.usage = x_groq.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            delta = choice.delta
+            if self.first_token_s is None and (delta.content or delta.tool_calls):
+                self.first_token_s = time.perf_counter() - self.started
+
+            for tc in delta.tool_calls or []:
+                if tc.index not in pending:
+                    self._emit(pending, upto=tc.index)
+                    pending[tc.index] = {"id": tc.id, "type": "function",
+                                         "function": {"name": "", "arguments": ""}}
+                call = pending[tc.index]
+                call["id"] = tc.id or call["id"]
+                if tc.function is not None:
+                    call["function"]["name"] += tc.function.name or ""
+                    call["function"]["arguments"] += tc.function.arguments or ""
+
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+                self._emit(pending)
+            if delta.content:
+                self.content += delta.content
+                yield delta.content
+
+        self._emit(pending)
+        self.total_s = time.perf_counter() - self.started
+        if self.first_token_s is None:
+            self.first_token_s = self.total_s
+        if self._on_done:
+            self._on_done(self)
+
+    def message(self):
+        """Message assistant à remettre dans l'historique de la conversation"""
+        msg = {"role": "assistant", "content": self.content}
+        if self.tool_calls:
+            msg["tool_calls"] = self.tool_calls
+        return msg
+
+    def to_dict(self, model):
+        """Même structure qu'une ChatCompletion (pour le cache et les appels non streamés)"""
+        usage = self.usage.model_dump() if hasattr(self.usage, "model_dump") else self.usage
+        return {
+            "id": f"stream-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": self.finish_reason or ("tool_calls" if self.tool_calls else "stop"),
+                "logprobs": None,
+                "message": {"role": "assistant", "content": self.content, "tool_calls": self.tool_calls or None},
+            }],
+            "usage": usage,
+        }
+
+class LLMCache:
+
+    def __init__(self, collection, ttl=LLM_CACHE_TTL, variants=1):
+        # variants > 1 : jusqu'à N réponses différentes par clé, servies à tour de rôle
+        # (utile pour les prompts à température élevée)
+        self.col = collection
+        self.variants = variants
+        self.stats_col = collection.database[f"{collection.name}_stats"]
+        self.col.create_index("created_at", expireAfterSeconds=ttl)
+        self.col.create_index([("key", ASCENDING), ("served", ASCENDING)])
+
+    @staticmethod
+    def make_key(model, temperature=None, messages=None, tools=None, **params):
+        # params : tool_choice, max_tokens, top_p, seed... (un None vaut un paramètre absent)
+        payload = {"model": model, "temperature": temperature, "messages": messages, "tools": tools,
+                   **{name: value for name, value in params.items() if value is not None}}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=_jsonable).encode()).hexdigest()
+
+    def _key(self, kwargs):
+        return self.make_key(**{name: value for name, value in kwargs.items() if name not in KEY_IGNORED})
+
+    def _lookup(self, key):
+        if self.col.count_documents({"key": key}, limit=self.variants) < self.variants:
+            return None
+        # Variante la moins servie (rotation)
+        return self.col.find_one_and_update(
+            {"key": key}, {"$inc": {"served": 1}},
+            sort=[("served", ASCENDING)], return_document=ReturnDocument.AFTER
+        )
+
+    def _store(self, key, model, dumped):
+        self.col.insert_one({
+            "key": key,
+            "model": model,
+            "response": json.loads(json.dumps(dumped, default=_jsonable)),
+            "tokens": (dumped.get("usage") or {}).get("total_tokens") or 0,
+            "served": 1,
+            "created_at": datetime.now(timezone.utc), # UTC pour l'index TTL
+        })
+
+    def create(self, client, **kwargs):
+        """Remplace client.chat.completions.create(**kwargs) ; renvoie (réponse, depuis_le_cache)"""
+        key = self._key(kwargs)
+        started = time.perf_counter()
+
+        doc = self._lookup(key)
+        if doc is not None:
+            elapsed = time.perf_counter() - started
+            self._record(kwargs.get("model"), True, doc.get("tokens", 0), elapsed, elapsed)
+            return _revive(doc["response"]), True
+
+        response = client.chat.completions.create(**kwargs)
+        elapsed = time.perf_counter() - started
+        dumped = response.model_dump() if hasattr(response, "model_dump") else response
+        self._store(key, kwargs.get("model"), dumped)
+        # Sans streaming, le premier token arrive avec la réponse complète
+        self._record(kwargs.get("model"), False, 0, elapsed, elapsed)
+        return response, False
+
+    def stream(self, client, on_tool_call=None, **kwargs):
+        """Version streaming de create() ; renvoie (StreamedCompletion, depuis_le_cache).
+
+        La réponse n'est mise en cache qu'une fois le flux entièrement consommé.
+        """
+        key = self._key(kwargs)
+        model = kwargs.get("model")
+        started = time.perf_counter()
+
+        doc = self._lookup(key)
+        if doc is not None:
+            def on_hit(completion):
+                self._record(model, True, doc.get("tokens", 0), completion.first_token_s, completion.total_s)
+            return StreamedCompletion(_replay(doc["response"]), on_tool_call, on_hit, started), True
+
+        def on_miss(completion):
+            self._store(key, model, completion.to_dict(model))
+            self._record(model, False, 0, completion.first_token_s, completion.total_s)
+        chunks = client.chat.completions.create(stream=True, **kwargs)
+        return StreamedCompletion(chunks, on_tool_call, on_miss, started), False
+
+    def _record(self, model, hit, tokens, first_token_s, total_s):
+        """Compteurs + latence d'un appel (une seule écriture) ; rend obsolètes stats() et latency() en cache"""
+        registry.observe("groq_first_token_seconds", first_token_s, model=model, cached=hit)
+        registry.observe("groq_total_seconds", total_s, model=model, cached=hit)
+        update = {"$inc": {"hits": int(hit), "misses": int(not hit), "saved_tokens": tokens}}
+        if not hit:
+            # Fenêtre glissante des derniers appels à l'API, dans le même document que les compteurs
+            update["$push"] = {"latences": {"$each": [{"first_token_s": first_token_s, "total_s": total_s}],
+                                            "$slice": -LATENCY_WINDOW}}
+        self.stats_col.update_one({"_id": "stats"}, update, upsert=True)
+        bump_version(self.stats_col)
+
+    def _stats_doc(self):
+        # Lu au plus une fois par version (partagé par stats() et latency())
+        return cached_read(self.stats_col, "stats", lambda: self.stats_col.find_one({"_id": "stats"}) or {})
+
+    def latency(self, last=LATENCY_WINDOW):
+        """Latences moyennes des derniers appels envoyés à l'API (hors cache)"""
+        latences = self._stats_doc().get("latences", [])[-last:]
+        if not latences:
+            return {"calls": 0, "first_token_s": 0.0, "total_s": 0.0}
+        return {
+            "calls": len(latences),
+            "first_token_s": sum(l["first_token_s"] for l in latences) / len(latences),
+            "total_s": sum(l["total_s"] for l in latences) / len(latences),
+        }
+
+    def stats(self):
+        """Taux de hit et tokens économisés"""
+        doc = self._stats_doc()
+        hits, misses = doc.get("hits", 0), doc.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "saved_tokens": doc.get("saved_tokens", 0),
+        }
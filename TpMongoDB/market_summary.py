@@ -0,0 +1,114 @@
+from datetime import datetime
+from crypto_queries import top_movers
+
+# Vue matérialisée du marché : un seul document (market_summary, _id = collection source)
+# lu par le dashboard et l'agent en une recherche sur _id.
+# - recalculé entièrement par le clean (agrégation côté serveur + $merge) ;
+# - tenu à jour par $inc quand le dashboard crée / modifie / supprime une crypto.
+# Les moyennes sont stockées en sommes (additives) et divisées à la lecture.
+
+COLLECTION = "market_summary"
+SOURCE = "market_cap_clean"
+TOP_N = 5 # hausses / baisses conservées
+SANS_CATEGORIE = "Sans catégorie"
+SUMS = ("nb", "market_cap_totale", "somme_prix", "somme_variation")
+
+def _key(categorie):
+    # Clé de sous-document : pas de "." dans un nom de champ MongoDB
+    return (categorie or SANS_CATEGORIE).replace(".", "·")
+
+def summary_pipeline():
+    """Totaux par catégorie ($group), totaux du marché ($setWindowFields), un document ($merge)"""
+    categorie = {"$ifNull": ["$_id", SANS_CATEGORIE]}
+    return [
+        {"$project": {"categorie": 1, "prix_usd": 1, "market_cap": 1, "variation_24h": 1}},
+        {"$group": {
+            "_id": "$categorie",
+            "nb": {"$sum": 1},
+            "market_cap_totale": {"$sum": "$market_cap"},
+            "somme_prix": {"$sum": "$prix_usd"},
+            "somme_variation": {"$sum": "$variation_24h"},
+        }},
+        # Totaux du marché à côté de chaque catégorie (fenêtre = toutes les catégories),
+        # sans second passage sur la collection
+        {"$setWindowFields": {"output": {f"total_{field}": {"$sum": f"${field}"} for field in SUMS}}},
+        {"$group": {
+            "_id": None,
+            **{field: {"$first": f"$total_{field}"} for field in SUMS},
+            "categories": {"$push": {
+                "k": {"$replaceAll": {"input": categorie, "find": ".", "replacement": "·"}},
+                "v": {"categorie": categorie, **{field: f"${field}" for field in SUMS}},
+            }},
+        }},
+        {"$project": {"_id": {"$literal": SOURCE}, **{field: 1 for field in SUMS},
+                      "categories": {"$arrayToObject": "$categories"}}},
+        {"$merge": {"into": COLLECTION, "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ]
+
+def _tops(collection):
+    return {
+        "top_hausses": top_movers(collection, "hausse", TOP_N),
+        "top_baisses": top_movers(collection, "baisse", TOP_N),
+    }
+
+def refresh_summary(db):
+    """Recalcul complet (fin de clean, lots d'écritures de l'agent)"""
+    source = db[SOURCE]
+    if source.estimated_document_count():
+        source.aggregate(summary_pipeline())
+        db[COLLECTION].update_one({"_id": SOURCE}, {"$set": {
+            **_tops(source), "maj_le": datetime.now(), "mode": "complet"}})
+    else:
+        # Collection vide : l'agrégation ne produirait aucun document
+        db[COLLECTION].replace_one({"_id": SOURCE}, {
+            **{field: 0 for field in SUMS}, "categories": {}, "top_hausses": [], "top_baisses": [],
+            "maj_le": datetime.now(), "mode": "complet"}, upsert=True)
+
+def apply_change(db, before=None, after=None):
+    """Répercute la modification d'une ligne (before -> after, None = absente) sans relire la collection"""
+    inc = {}
+    names = {}
+    for doc, sign in ((before, -1), (after, 1)):
+        if doc is None:
+            continue
+        key = _key(doc.get("categorie"))
+        names[f"categories.{key}.categorie"] = doc.get("categorie") or SANS_CATEGORIE
+        values = (1, doc.get("market_cap") or 0, doc.get("prix_usd") or 0, doc.get("variation_24h") or 0)
+        for field, value in zip(SUMS, values):
+            for path in (field, f"categories.{key}.{field}"):
+                inc[path] = inc.get(path, 0) + sign * value
+
+    # Les tops sont relus par deux requêtes indexées (top 5), pas recalculés par $inc
+    update = {"$inc": inc, "$set": {**names, **_tops(db[SOURCE]), "maj_le": datetime.now(), "mode": "incrémental"}}
+    if not db[COLLECTION].update_one({"_id": SOURCE}, update).matched_count:
+        refresh_summary(db) # pas encore de résumé : calcul complet
+
+def read_summary(db):
+    """Résumé prêt à afficher (moyennes, parts de marché), ou None s'il n'a jamais été calculé"""
+    doc = db[COLLECTION].find_one({"_id": SOURCE})
+    if doc is None:
+        return None
+
+    def averages(stats):
+        nb = stats["nb"]
+        return {
+            "nb": nb,
+            "prix_moyen": round(stats["somme_prix"] / nb, 2) if nb else 0.0,
+            "market_cap_totale": stats["market_cap_totale"],
+            "variation_moyenne": round(stats["somme_variation"] / nb, 2) if nb else 0.0,
+        }
+
+    total_cap = doc["market_cap_totale"] or 0
+    categories = [
+        {"categorie": stats["categorie"], **averages(stats),
+         "part_market_cap": round(stats["market_cap_totale"] / total_cap, 4) if total_cap else 0.0}
+        for stats in doc["categories"].values() if stats["nb"] > 0
+    ]
+    categories.sort(key=lambda c: c["market_cap_totale"], reverse=True)
+    return {
+        **averages(doc),
+        "categories": categories,
+        "top_hausses": doc.get("top_hausses", []),
+        "top_baisses": doc.get("top_baisses", []),
+        "maj_le": doc.get("maj_le"),
+    }
@@ -0,0 +1,50 @@
+from pymongo.collation import Collation
+from mongo_client import create_index
+
+# Couche de requêtes de la galerie : filtres et pagination exécutés par MongoDB
+
+# Champs affichés par la galerie (+ _id pour la pagination)
+PROJECTION = {"titre": 1, "url_image": 1, "format": 1, "nb_zones_texte": 1}
+
+# Recherche de titre insensible à la casse et aux accents (force 1 : lettres de base seulement)
+COLLATION = Collation(locale="fr", strength=1)
+
+PAGE_SIZE = 12
+
+def ensure_indexes(collection):
+    """Index utilisés par la galerie et le sélecteur du critique"""
+    # _id en suffixe : filtre + tri de la pagination par clé servis par le même index
+    collection.create_index([("format", 1), ("nb_zones_texte", 1), ("_id", 1)], name="format_zones")
+    collection.create_index([("nb_zones_texte", 1), ("_id", 1)], name="zones") # filtre "Tout"
+    # Reconstruit s'il existe sous une ancienne collation
+    create_index(collection, [("titre", 1)], collation=COLLATION, name="titre_ci")
+
+def build_filter(fmt="Tout", nb_zones=None):
+    query = {}
+    if fmt and fmt != "Tout":
+        query["format"] = fmt
+    if nb_zones is not None:
+        query["nb_zones_texte"] = nb_zones
+    return query
+
+def find_memes(collection, fmt="Tout", nb_zones=None, after_id=None, page_size=PAGE_SIZE):
+    """Une page de la galerie, à partir du dernier _id de la page précédente (keyset)"""
+    query = build_filter(fmt, nb_zones)
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    return list(collection.find(query, PROJECTION).sort("_id", 1).limit(page_size))
+
+def count_memes(collection, fmt="Tout", nb_zones=None):
+    return collection.count_documents(build_filter(fmt, nb_zones))
+
+def search_titres(collection, prefix="", limit=20):
+    """Titres commençant par prefix (parcours de l'index titre_ci)"""
+    prefix = (prefix or "").strip()
+    # U+FFFF a le poids le plus élevé dans la collation ICU : [prefix, prefix + U+FFFF)
+    query = {"titre": {"$gte": prefix, "$lt": prefix + "\uffff"}} if prefix else {}
+    cursor = (
+        collection.find(query, {"_id": 0, "titre": 1, "url_image": 1}, collation=COLLATION)
+        .sort("titre", 1)
+        .limit(limit)
+    )
+    return list(cursor)
@@ -0,0 +1,300 @@
+import os
+import time
+import http.server
+import bisect
+import threading
+from contextlib import contextmanager
+import bson
+from pymongo import monitoring
+
+# Métriques du process (dashboards, scripts) : histogrammes de latence, compteurs, jauges.
+# Alimentées par les listeners pymongo.monitoring et par des timers (Groq, pandas),
+# lisibles dans l'onglet "🩺 Diagnostics" ou au format texte Prometheus.
+
+# Bornes des histogrammes en secondes (format Prometheus "le")
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Taille des réponses : ré-encoder chaque réponse (find, getMore, aggregate) coûte cher,
+# désactivé par défaut (MONGO_METRICS_BYTES=1 pour un diagnostic ponctuel)
+MEASURE_BYTES = os.getenv("MONGO_METRICS_BYTES", "0") == "1"
+
+HELP = {
+    "mongo_command_duration_seconds": "Durée des commandes MongoDB",
+    "mongo_command_failures_total": "Commandes MongoDB en échec",
+    "mongo_documents_returned_total": "Documents renvoyés par MongoDB",
+    "mongo_reply_bytes_total": "Octets BSON des réponses MongoDB",
+    "mongo_pool_checkout_wait_seconds": "Attente d'une connexion du pool",
+    "mongo_pool_checkout_failures_total": "Échecs d'obtention d'une connexion du pool",
+    "mongo_pool_connections": "Connexions ouvertes par serveur",
+    "mongo_server_changes_total": "Changements d'état des serveurs MongoDB",
+    "groq_first_token_seconds": "Latence du premier token Groq",
+    "groq_total_seconds": "Durée totale d'un appel Groq",
+    "pandas_seconds": "Durée des traitements pandas",
+}
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # dernier = +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Quantile estimé par interpolation linéaire dans le bucket concerné"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                low = BUCKETS[i - 1] if i > 0 else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return low + (high - low) * (rank - seen) / c
+            seen += c
+        return BUCKETS[-1]
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {} # (nom, labels) -> Histogram
+        self.counters = {}   # (nom, labels) -> valeur
+        self.gauges = {}
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.histograms.setdefault(key, Histogram()).observe(seconds)
+
+    def histogram(self, name, **labels):
+        return self.histograms.get((name, _labels_key(labels)))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_gauge(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        # Les jauges (connexions ouvertes) décrivent un état courant : conservées
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def summary(self):
+        """Une ligne par histogramme : appels, moyenne, p50, p95, p99 (en ms)"""
+        with self._lock:
+            items = sorted(self.histograms.items())
+            rows = []
+            for (name, labels), h in items:
+                rows.append({
+                    "métrique": name,
+                    "labels": ", ".join(f"{k}={v}" for k, v in labels),
+                    "appels": h.count,
+                    "moyenne_ms": round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+                    "p50_ms": round(h.quantile(0.50) * 1000, 2),
+                    "p95_ms": round(h.quantile(0.95) * 1000, 2),
+                    "p99_ms": round(h.quantile(0.99) * 1000, 2),
+                })
+        return rows
+
+    def values(self):
+        """Compteurs et jauges : [{"métrique", "labels", "valeur"}]"""
+        with self._lock:
+            items = sorted(self.counters.items()) + sorted(self.gauges.items())
+        return [{"métrique": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "valeur": value}
+                for (name, labels), value in items]
+
+    def render_prometheus(self):
+        """Exposition au format texte Prometheus (version 0.0.4)"""
+        def fmt_labels(pairs):
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            groups = {}
+            for (name, labels), h in self.histograms.items():
+                groups.setdefault(("histogram", name), []).append((labels, h))
+            for (name, labels), value in self.counters.items():
+                groups.setdefault(("counter", name), []).append((labels, value))
+            for (name, labels), value in self.gauges.items():
+                groups.setdefault(("gauge", name), []).append((labels, value))
+
+            for (kind, name), series in sorted(groups.items(), key=lambda g: g[0][1]):
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series, key=lambda s: s[0]):
+                    if kind != "histogram":
+                        lines.append(f"{name}{fmt_labels(labels)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, c in zip(list(BUCKETS) + ["+Inf"], value.counts):
+                        cumulative += c
+                        lines.append(f"{name}_bucket{fmt_labels(labels + (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_sum{fmt_labels(labels)} {value.sum}")
+                    lines.append(f"{name}_count{fmt_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# LISTENERS PYMONGO
+
+def _documents_returned(reply):
+    # find / aggregate / getMore : lot de documents dans reply.cursor
+    cursor = reply.get("cursor")
+    if cursor is None or not hasattr(cursor, "get"):
+        return 0
+    return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+
+def _address(address):
+    return f"{address[0]}:{address[1]}"
+
+class _Labelled:
+
+    def __init__(self, client="default"):
+        # client : profil du MongoClient (ui, etl...) ajouté à toutes les séries
+        self.client = client
+
+def _collection(event):
+    # La collection est la valeur de la commande ({"find": "market_cap_clean", ...}),
+    # sauf pour getMore (id du curseur) ; "" pour les commandes sans collection (ping, hello...)
+    command = event.command
+    target = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+    return target if isinstance(target, str) else ""
+
+class CommandMetrics(_Labelled, monitoring.CommandListener):
+
+    def __init__(self, client="default"):
+        super().__init__(client)
+        # request_id -> collection : seul l'événement started porte la commande
+        self._collections = {}
+
+    def started(self, event):
+        self._collections[event.request_id] = _collection(event)
+
+    def _labels(self, event):
+        return {"command": event.command_name, "collection": self._collections.pop(event.request_id, ""),
+                "client": self.client}
+
+    def succeeded(self, event):
+        labels = self._labels(event)
+        registry.observe("mongo_command_duration_seconds", event.duration_micros / 1e6, **labels)
+        reply = event.reply
+        docs = _documents_returned(reply)
+        if docs:
+            registry.inc("mongo_documents_returned_total", docs, **labels)
+        if MEASURE_BYTES and labels["command"] in ("find", "getMore", "aggregate"):
+            registry.inc("mongo_reply_bytes_total", len(bson.encode(reply)), **labels)
+
+    def failed(self, event):
+        labels = self._labels(event)
+        registry.observe("mongo_command_duration_seconds", event.duration_micros / 1e6, **labels)
+        registry.inc("mongo_command_failures_total", **labels)
+
+class PoolMetrics(_Labelled, monitoring.ConnectionPoolListener):
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        registry.inc("mongo_server_changes_total", address=_address(event.address), type="PoolCleared",
+                     client=self.client)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        registry.add_gauge("mongo_pool_connections", 1, address=_address(event.address), client=self.client)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        registry.add_gauge("mongo_pool_connections", -1, address=_address(event.address), client=self.client)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        registry.inc("mongo_pool_checkout_failures_total", reason=event.reason, client=self.client)
+        if event.duration is not None:
+            registry.observe("mongo_pool_checkout_wait_seconds", event.duration, client=self.client)
+
+    def connection_checked_out(self, event):
+        # duration : temps passé à attendre une connexion libre (ou à en ouvrir une)
+        if event.duration is not None:
+            registry.observe("mongo_pool_checkout_wait_seconds", event.duration, client=self.client)
+
+    def connection_checked_in(self, event):
+        pass
+
+class ServerMetrics(_Labelled, monitoring.ServerListener):
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        new_type = event.new_description.server_type_name
+        if new_type != event.previous_description.server_type_name:
+            registry.inc("mongo_server_changes_total",
+                         address=_address(event.server_address), type=new_type, client=self.client)
+
+    def closed(self, event):
+        pass
+
+def listeners(client="default"):
+    """À passer à MongoClient(event_listeners=...)"""
+    return [CommandMetrics(client), PoolMetrics(client), ServerMetrics(client)]
+
+# EXPOSITION HTTP (optionnelle) : GET /metrics pour un scraper Prometheus
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(port):
+    """Sert /metrics dans un thread de fond ; renvoie le serveur"""
+    server = http.server.ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
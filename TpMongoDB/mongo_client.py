@@ -0,0 +1,123 @@
+import os
+import time
+import threading
+import pymongo
+from pymongo import ReadPreference
+from pymongo.errors import OperationFailure
+from dotenv import load_dotenv
+from metrics import registry, listeners
+
+# Fabrique de MongoClient partagée par les dashboards et les scripts.
+# Un client par process et par profil de charge ("ui" ou "etl") : pool, compression,
+# préférence de lecture et write concern adaptés, métriques pymongo.monitoring branchées.
+
+load_dotenv()
+MONGO_URI = os.getenv("MONGO_URI")
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+# Profils par type de charge (surchargeables : MONGO_UI_MAX_POOL_SIZE, MONGO_ETL_W, ...)
+WORKLOADS = {
+    # Dashboards : requêtes courtes et concurrentes, pool gardé chaud, échec rapide
+    "ui": {
+        "maxPoolSize": _env_int("MONGO_UI_MAX_POOL_SIZE", 20),
+        "minPoolSize": _env_int("MONGO_UI_MIN_POOL_SIZE", 2),
+        "read_preference": os.getenv("MONGO_UI_READ_PREFERENCE", "primaryPreferred"),
+        "w": os.getenv("MONGO_UI_W", "1"),
+        "serverSelectionTimeoutMS": 5_000,
+        "socketTimeoutMS": 15_000,
+    },
+    # Scripts ETL : gros lots, écritures durables, pas de connexions inutiles entre deux passages
+    "etl": {
+        "maxPoolSize": _env_int("MONGO_ETL_MAX_POOL_SIZE", 10),
+        "minPoolSize": _env_int("MONGO_ETL_MIN_POOL_SIZE", 0),
+        "read_preference": os.getenv("MONGO_ETL_READ_PREFERENCE", "primary"),
+        "w": os.getenv("MONGO_ETL_W", "majority"),
+        "serverSelectionTimeoutMS": 30_000,
+        "socketTimeoutMS": 300_000,
+    },
+}
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+def available_compressors(wanted=None):
+    """Compresseurs demandés (MONGO_COMPRESSORS, ordre de préférence) dont la bibliothèque est installée"""
+    wanted = wanted or os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")
+    modules = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+    found = []
+    for name in (c.strip() for c in wanted.split(",") if c.strip()):
+        try:
+            __import__(modules[name])
+        except (KeyError, ImportError):
+            continue
+        found.append(name)
+    return found
+
+def create_client(workload="ui", uri=None, **overrides):
+    """Nouveau client pour un profil ; à fermer par l'appelant (préférer get_client)"""
+    profile = {**WORKLOADS[workload], **overrides}
+    w = profile.pop("w")
+    read_preference = profile.pop("read_preference")
+    return pymongo.MongoClient(
+        uri or MONGO_URI,
+        compressors=available_compressors() or None,
+        read_preference=READ_PREFERENCES[read_preference],
+        w=int(w) if str(w).isdigit() else w,
+        event_listeners=listeners(client=workload),
+        appname=f"tpmongodb-{workload}",
+        **profile,
+    )
+
+_clients = {}
+_lock = threading.Lock()
+
+def get_client(workload="ui"):
+    """Client partagé du process pour ce profil (recréé après un fork)"""
+    key = (workload, os.getpid())
+    with _lock:
+        if key not in _clients:
+            _clients[key] = create_client(workload)
+        return _clients[key]
+
+def warm_pool(client, connections=None):
+    """Ouvre les connexions du pool en parallèle (pings) ; renvoie la durée en secondes"""
+    connections = connections or max(1, client.options.pool_options.min_pool_size)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client.admin.command, args=("ping",)) for _ in range(connections)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+# IndexOptionsConflict, IndexKeySpecsConflict : même nom, autres options (ex. collation modifiée)
+INDEX_CONFLICTS = (85, 86)
+
+def create_index(collection, keys, name, **options):
+    """create_index qui reconstruit l'index s'il existe déjà sous ce nom avec d'autres options"""
+    try:
+        return collection.create_index(keys, name=name, **options)
+    except OperationFailure as e:
+        if e.code not in INDEX_CONFLICTS:
+            raise
+        collection.drop_index(name)
+        return collection.create_index(keys, name=name, **options)
+
+def pool_report(workload):
+    """Attente pour obtenir une connexion du pool (depuis le démarrage du process)"""
+    h = registry.histogram("mongo_pool_checkout_wait_seconds", client=workload)
+    if h is None or not h.count:
+        return {"checkouts": 0, "p50_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+    return {
+        "checkouts": h.count,
+        "p50_ms": round(h.quantile(0.50) * 1000, 2),
+        "p99_ms": round(h.quantile(0.99) * 1000, 2),
+        "mean_ms": round(h.sum / h.count * 1000, 2),
+    }
@@ -0,0 +1,64 @@
+import os
+import time
+import threading
+from cachetools import LRUCache
+from pymongo import ReturnDocument
+
+# Cache de lecture partagé par toutes les sessions Streamlit du process.
+# Chaque collection a un compteur de version (collection "cache_versions") :
+# toute écriture l'incrémente, ce qui rend obsolètes les entrées en cache.
+
+VERSIONS_COLLECTION = "cache_versions"
+# Durée pendant laquelle la version lue en base est considérée à jour
+# (écritures faites par un autre process, ex: scripts ETL)
+VERSION_TTL = float(os.getenv("CACHE_VERSION_TTL", "5"))
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+
+_lock = threading.Lock()
+_entries = LRUCache(maxsize=MAX_ENTRIES)
+_versions = {}  # full_name -> (version, heure de lecture)
+stats = {"hits": 0, "misses": 0}
+
+def _version_doc(collection):
+    return collection.database[VERSIONS_COLLECTION], {"_id": collection.name}
+
+def bump_version(collection):
+    """A appeler après chaque écriture sur la collection"""
+    versions, key = _version_doc(collection)
+    doc = versions.find_one_and_update(
+        key, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    with _lock:
+        _versions[collection.full_name] = (doc["version"], time.monotonic())
+    return doc["version"]
+
+def get_version(collection, fresh=False):
+    """Version courante ; relue en base au plus une fois par VERSION_TTL (toujours si fresh)"""
+    with _lock:
+        cached = _versions.get(collection.full_name)
+    if cached and not fresh and time.monotonic() - cached[1] < VERSION_TTL:
+        return cached[0]
+
+    versions, key = _version_doc(collection)
+    doc = versions.find_one(key) or {}
+    version = doc.get("version", 0)
+    with _lock:
+        _versions[collection.full_name] = (version, time.monotonic())
+    return version
+
+def cached_read(collection, key, loader):
+    """Renvoie loader() depuis le cache tant que la collection n'a pas changé.
+
+    Le résultat est partagé entre sessions : ne pas le modifier en place.
+    """
+    entry_key = (collection.full_name, get_version(collection), key)
+    with _lock:
+        if entry_key in _entries:
+            stats["hits"] += 1
+            return _entries[entry_key]
+        stats["misses"] += 1
+
+    value = loader()
+    with _lock:
+        _entries[entry_key] = value
+    return value
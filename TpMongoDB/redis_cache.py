@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import hashlib
+from dotenv import load_dotenv
+
+try:
+    import redis
+except ImportError:  # Redis est optionnel : sans lui, on lit directement MongoDB
+    redis = None
+
+load_dotenv()
+REDIS_URL = os.getenv("REDIS_URL")              # ex: redis://localhost:6379/0
+COIN_TTL = int(os.getenv("REDIS_COIN_TTL", "300"))  # Hash par crypto
+VIEW_TTL = int(os.getenv("REDIS_VIEW_TTL", "30"))   # Snapshot d'une vue filtrée = intervalle de rafraîchissement
+RETRY_AFTER = 30  # Secondes sans Redis après une erreur (on ne bloque pas le dashboard)
+
+REDIS_ERRORS = (redis.RedisError, OSError) if redis else (OSError,)
+
+def _to_json(value):
+    return json.dumps(value, default=str)
+
+class CryptoRedisCache:
+    """Cache Redis devant market_cap_clean (read-through + write-through).
+
+    - crypto:{SYMBOLE}            -> hash d'une crypto (valeurs encodées en JSON)
+    - crypto:view:{version}:{clé} -> snapshot JSON d'une vue filtrée du dashboard
+    - crypto:views:version        -> incrémenté à chaque écriture (invalide les vues)
+
+    Si Redis est absent ou injoignable, toutes les méthodes se comportent comme un miss.
+    """
+
+    def __init__(self, url=REDIS_URL, client=None, coin_ttl=COIN_TTL, view_ttl=VIEW_TTL):
+        # client : permet d'injecter un redis-server local ou un équivalent en mémoire
+        self.client = client
+        if self.client is None and url and redis is not None:
+            self.client = redis.Redis.from_url(url, decode_responses=True,
+                                               socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.coin_ttl = coin_ttl
+        self.view_ttl = view_ttl
+        self.stats = {"hits": 0, "misses": 0, "errors": 0}
+        self._down_until = 0.0
+
+    @property
+    def enabled(self):
+        return self.client is not None and time.monotonic() >= self._down_until
+
+    def _call(self, fn, default=None):
+        if not self.enabled:
+            return default
+        try:
+            return fn(self.client)
+        except REDIS_ERRORS as e:
+            self.stats["errors"] += 1
+            self._down_until = time.monotonic() + RETRY_AFTER
+            print(f"⚠️ Redis indisponible, repli sur MongoDB : {e}")
+            return default
+
+    # VUES FILTRÉES
+
+    def _view_key(self, r, params):
+        version = r.get("crypto:views:version") or 0
+        digest = hashlib.sha1(_to_json(params).encode()).hexdigest()
+        return f"crypto:view:{version}:{digest}"
+
+    def read_view(self, params, loader):
+        """Read-through : snapshot Redis si présent, sinon loader() (MongoDB) puis mise en cache"""
+        cached = self._call(lambda r: r.get(self._view_key(r, params)))
+        if cached is not None:
+            self.stats["hits"] += 1
+            return json.loads(cached)
+
+        self.stats["misses"] += 1
+        value = loader()
+        self._call(lambda r: self._store_view(r, params, value))
+        return value
+
+    def _store_view(self, r, params, value):
+        pipe = r.pipeline()
+        pipe.set(self._view_key(r, params), _to_json(value), ex=self.view_ttl)
+        # Les lignes d'une vue alimentent aussi les hashes par crypto
+        if isinstance(value, list):
+            for doc in value:
+                self._queue_coin(pipe, doc)
+        pipe.execute()
+
+    def invalidate_views(self):
+        self._call(lambda r: r.incr("crypto:views:version"))
+
+    def invalidate_all(self, batch=500):
+        """Après un clean : vues invalidées et hashes par crypto supprimés (sinon servis jusqu'à leur TTL)"""
+        def drop(r):
+            pipe = r.pipeline()
+            pipe.incr("crypto:views:version")
+            queued = 0
+            for key in r.scan_iter(match="crypto:*", count=batch):
+                if key.startswith("crypto:view"): # vues (expirent seules) et compteur de version
+                    continue
+                pipe.unlink(key)
+                queued += 1
+                if queued % batch == 0:
+                    pipe.execute()
+            pipe.execute()
+        self._call(drop)
+
+    # CRYPTOS UNITAIRES
+
+    def _queue_coin(self, pipe, doc):
+        if not doc.get("symbole"):
+            return
+        key = f"crypto:{doc['symbole']}"
+        pipe.delete(key)
+        pipe.hset(key, mapping={k: _to_json(v) for k, v in doc.items()})
+        pipe.expire(key, self.coin_ttl)
+
+    def get_coin(self, symbole):
+        data = self._call(lambda r: r.hgetall(f"crypto:{symbole.upper()}"))
+        if data:
+            self.stats["hits"] += 1
+            return {k: json.loads(v) for k, v in data.items()}
+        self.stats["misses"] += 1
+        return None
+
+    def read_coin(self, symbole, loader):
+        """Read-through d'une crypto : hash Redis si présent, sinon loader() puis mise en cache"""
+        cached = self.get_coin(symbole)
+        if cached is not None:
+            return cached
+        doc = loader()
+        if doc:
+            def write(r):
+                pipe = r.pipeline()
+                self._queue_coin(pipe, doc)
+                pipe.execute()
+            self._call(write)
+        return doc
+
+    def set_coin(self, doc):
+        """Write-through d'une crypto créée / modifiée"""
+        def write(r):
+            pipe = r.pipeline()
+            self._queue_coin(pipe, doc)
+            pipe.incr("crypto:views:version")
+            pipe.execute()
+        self._call(write)
+
+    def delete_coin(self, symbole):
+        """Write-through d'une suppression"""
+        def write(r):
+            pipe = r.pipeline()
+            pipe.delete(f"crypto:{symbole.upper()}")
+            pipe.incr("crypto:views:version")
+            pipe.execute()
+        self._call(write)
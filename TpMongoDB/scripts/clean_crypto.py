@@ -1,51 +1,469 @@
 import os
-import pymongo
-import pandas as pd
+import sys
+import math
+import time
+import random
+import itertools
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from pymongo import UpdateOne, DeleteMany
+from pymongo.errors import BulkWriteError
 from dotenv import load_dotenv
 
+# accès aux modules partagés à la racine du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from read_cache import bump_version
+from crypto_queries import ensure_indexes
+from redis_cache import CryptoRedisCache
+from mongo_client import get_client
+from snapshots import drop_snapshot, save_snapshot
+from market_summary import refresh_summary, read_summary
+
 load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
 
-def clean_crypto_data():
-    client = pymongo.MongoClient(MONGO_URI)
+BATCH_SIZE = 10_000 # Mode par lots : documents bruts lus / transformés / insérés à la fois
+RAW_FIELDS = ["name", "symbol", "current_price", "market_cap", "market_cap_rank",
+              "price_change_percentage_24h", "image"]
+DUPLICATE_KEY = 11000
+
+# Arrondi au centime : floor(x * 100 + 0.5) / 100 donne le même flottant en Python (math.floor),
+# en NumPy (np.floor) et en agrégation ($multiply / $add / $floor / $divide), opération par opération.
+# round(x, 2) ne se transpose ni en NumPy ni en $round (arrondis décimaux différents sur les demis).
+def round_cents(value):
+    return math.floor(value * 100 + 0.5) / 100
+
+def transform_coin(coin):
+    """Transforme un document brut CoinGecko en document propre"""
+    # Tendance
+    change = coin.get("price_change_percentage_24h") or 0
+    trend = "🔥 Hausse" if change > 0 else "🔻 Baisse"
+
+    # Catégorisation
+    rank = coin.get("market_cap_rank")
+    category = "Top 10" if rank is not None and rank <= 10 else "Altcoin"
+
+    return {
+        "nom": coin.get("name"),
+        "symbole": coin.get("symbol").upper(),
+        "prix_usd": round_cents(coin.get("current_price") or 0),
+        "variation_24h": round_cents(change),
+        "tendance": trend,
+        "categorie": category,
+        "image": coin.get("image"),
+        "market_cap": coin.get("market_cap")
+    }
+
+# Empreinte d'un document propre : ses champs mis bout à bout en texte, calculable à l'identique
+# en Python (fingerprint), en colonnes (transform_batch) et en agrégation (fingerprint_expr).
+# Ce n'est pas un hash : aucun opérateur d'agrégation ne hache une chaîne sans $function, et une
+# empreinte hachée d'un seul côté ne se comparerait plus. Coût accepté : ~150 octets par document.
+# Les nombres passent par des entiers (centimes, unités) : pas de différence de formatage des flottants.
+FINGERPRINT = [
+    ("nom", "text"), ("symbole", "text"), ("prix_usd", "cents"), ("variation_24h", "cents"),
+    ("tendance", "text"), ("categorie", "text"), ("image", "text"), ("market_cap", "units"),
+]
+FINGERPRINT_SEP = "\x1f"
+
+def fingerprint(doc):
+    """Empreinte (texte canonique) d'un document propre, même valeur que fingerprint_expr côté serveur"""
+    parts = []
+    for field, kind in FINGERPRINT:
+        value = doc.get(field)
+        if value is None:
+            parts.append("")
+        elif kind == "text":
+            parts.append(str(value))
+        else:
+            parts.append(str(math.floor((value * 100 if kind == "cents" else value) + 0.5)))
+    return FINGERPRINT_SEP.join(parts)
+
+def fingerprint_expr():
+    """fingerprint en expression d'agrégation (à placer après la projection du document propre)"""
+    parts = []
+    for field, kind in FINGERPRINT:
+        value = f"${field}"
+        if kind == "text":
+            part = {"$toString": {"$ifNull": [value, ""]}}
+        else:
+            scaled = {"$multiply": [value, 100]} if kind == "cents" else value
+            part = {"$cond": [{"$isNumber": value}, {"$toString": {"$toLong": {"$floor": {"$add": [scaled, 0.5]}}}}, ""]}
+        if parts:
+            parts.append(FINGERPRINT_SEP)
+        parts.append(part)
+    return {"$concat": parts}
+
+def load_full(col, clean_data):
+    """Mode historique : on vide et on remplit (Full Refresh)"""
+    col.drop()
+    if clean_data:
+        col.insert_many(clean_data)
+    return {"inserted": len(clean_data), "updated": 0, "unchanged": 0, "deleted": 0}
+
+def load_incremental(col, clean_data):
+    """Mode incrémental : upsert uniquement des lignes dont l'empreinte a changé"""
+    col.create_index("symbole", unique=True)
+
+    # Empreintes déjà en base (projection minimale)
+    existing = {d["symbole"]: d.get("empreinte") for d in col.find({}, {"symbole": 1, "empreinte": 1, "_id": 0})}
+
+    ops = []
+    unchanged = 0
+    seen = set()
+    for doc in clean_data:
+        seen.add(doc["symbole"])
+        if existing.get(doc["symbole"]) == doc["empreinte"]:
+            unchanged += 1
+            continue
+        ops.append(UpdateOne({"symbole": doc["symbole"]}, {"$set": doc}, upsert=True))
+
+    # Les cryptos sorties du classement sont supprimées
+    dropped = [s for s in existing if s not in seen]
+    if dropped:
+        ops.append(DeleteMany({"symbole": {"$in": dropped}}))
+
+    stats = {"inserted": 0, "updated": 0, "unchanged": unchanged, "deleted": 0}
+    if ops:
+        res = col.bulk_write(ops, ordered=False)
+        stats["inserted"] = res.upserted_count
+        stats["updated"] = res.modified_count
+        stats["deleted"] = res.deleted_count
+    return stats
+
+def round_cents_expr(value):
+    return {"$divide": [{"$floor": {"$add": [{"$multiply": [value, 100]}, 0.5]}}, 100]}
+
+def transform_pipeline():
+    """Mêmes règles que transform_coin, exprimées en agrégation (exécutées par MongoDB)"""
+    change = {"$ifNull": ["$price_change_percentage_24h", 0]}
+    return [
+        # Symbole en double : on garde la crypto la mieux classée (sans rang = après toutes les autres,
+        # MongoDB triant null avant les nombres)
+        {"$set": {"_rang": {"$cond": [{"$isNumber": "$market_cap_rank"}, "$market_cap_rank", float("inf")]}}},
+        {"$sort": {"_rang": 1}},
+        {"$group": {"_id": {"$toUpper": "$symbol"}, "coin": {"$first": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$coin"}},
+        {"$project": {
+            "_id": 0,
+            "nom": {"$ifNull": ["$name", None]},
+            "symbole": {"$toUpper": "$symbol"},
+            "prix_usd": round_cents_expr({"$ifNull": ["$current_price", 0]}),
+            "variation_24h": round_cents_expr(change),
+            "tendance": {"$cond": [{"$gt": [change, 0]}, "🔥 Hausse", "🔻 Baisse"]},
+            "categorie": {"$cond": [
+                {"$and": [{"$isNumber": "$market_cap_rank"}, {"$lte": ["$market_cap_rank", 10]}]},
+                "Top 10", "Altcoin"
+            ]},
+            "image": {"$ifNull": ["$image", None]},
+            "market_cap": {"$ifNull": ["$market_cap", None]},
+        }},
+        # Même empreinte que le mode incrémental : le passage suivant ne réécrit que ce qui a changé
+        {"$set": {"empreinte": fingerprint_expr()}},
+    ]
+
+def load_pipeline(db):
+    """Mode serveur : transformation + $merge, les documents ne quittent pas MongoDB"""
+    col = db["market_cap_clean"]
+    col.create_index("symbole", unique=True) # requis par $merge "on"
+
+    # Les cryptos sorties du classement (seuls leurs _id reviennent au client)
+    dropped = [d["_id"] for d in col.aggregate([
+        {"$project": {"_id": 0, "symbole": 1, "clean_id": "$_id", "in_raw": {"$literal": False}}},
+        {"$unionWith": {"coll": "market_cap_raw", "pipeline": [
+            {"$project": {"_id": 0, "symbole": {"$toUpper": "$symbol"}, "in_raw": {"$literal": True}}}
+        ]}},
+        {"$group": {"_id": "$symbole", "in_raw": {"$max": "$in_raw"}, "clean_ids": {"$push": "$clean_id"}}},
+        {"$match": {"in_raw": False}},
+        {"$unwind": "$clean_ids"},
+        {"$project": {"_id": "$clean_ids"}},
+    ])]
+
+    # whenMatched "replace" : un document identique n'est pas réécrit
+    db["market_cap_raw"].aggregate(transform_pipeline() + [
+        {"$merge": {"into": "market_cap_clean", "on": "symbole",
+                    "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ])
+
+    deleted = col.delete_many({"_id": {"$in": dropped}}).deleted_count if dropped else 0
+    return {"merged": col.estimated_document_count(), "deleted": deleted}
+
+def by_rank(raw_col, fields=None, batch_size=BATCH_SIZE):
+    """Documents bruts par rang croissant, ceux sans rang (null, absent) à la fin.
+
+    Un simple sort("market_cap_rank") mettrait les null en premier : en cas de symbole en double,
+    la crypto non classée l'emporterait sur la mieux classée.
+    """
+    projection = {field: 1 for field in fields} if fields else None
+    ranked = raw_col.find({"market_cap_rank": {"$type": "number"}}, projection, batch_size=batch_size) \
+        .sort("market_cap_rank", 1).allow_disk_use(True)
+    unranked = raw_col.find({"market_cap_rank": {"$not": {"$type": "number"}}}, projection, batch_size=batch_size)
+    return itertools.chain(ranked, unranked)
+
+def iter_batches(cursor, batch_size=BATCH_SIZE):
+    """Découpe un curseur en listes de batch_size documents"""
+    while True:
+        batch = list(itertools.islice(cursor, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def clean_docs(coins, seen):
+    """Documents propres (avec empreinte) ; symbole déjà vu = crypto moins bien classée, ignorée"""
+    for coin in coins:
+        clean_doc = transform_coin(coin)
+        if clean_doc["symbole"] in seen:
+            continue
+        seen.add(clean_doc["symbole"])
+        clean_doc["empreinte"] = fingerprint(clean_doc)
+        yield clean_doc
+
+def _floats(values):
+    """Colonne Python -> float64 (None -> NaN)"""
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+def _integer_text(values):
+    """Colonne float64 -> entiers floor(x + 0.5) en texte ("" pour NaN), comme fingerprint"""
+    integers = pa.array(np.floor(values + 0.5), mask=np.isnan(values)).cast(pa.int64())
+    return pc.fill_null(integers.cast(pa.string()), "")
+
+def _text(values):
+    return pc.fill_null(pa.array(values, pa.string()), "")
+
+def transform_batch(coins):
+    """Mêmes documents que transform_coin + fingerprint, calculés en colonnes sur tout un lot.
+
+    Arrondis, tendance et catégorie en NumPy, empreinte jointe par Arrow ; seule la construction
+    des documents (un dict par ligne, requis par insert_many) reste une boucle Python.
+    """
+    names = [coin.get("name") for coin in coins]
+    symbols = [coin.get("symbol").upper() for coin in coins]
+    images = [coin.get("image") for coin in coins]
+    market_caps = [coin.get("market_cap") for coin in coins] # laissés tels quels (int ou None)
+    price = np.nan_to_num(_floats([coin.get("current_price") for coin in coins]), nan=0.0)
+    change = np.nan_to_num(_floats([coin.get("price_change_percentage_24h") for coin in coins]), nan=0.0)
+    rank = _floats([coin.get("market_cap_rank") for coin in coins])
+
+    prix = np.floor(price * 100 + 0.5) / 100
+    variation = np.floor(change * 100 + 0.5) / 100
+    trends = np.where(change > 0, "🔥 Hausse", "🔻 Baisse")
+    categories = np.where(rank <= 10, "Top 10", "Altcoin") # NaN <= 10 -> False
+
+    # Même ordre de champs que FINGERPRINT
+    fingerprints = pc.binary_join_element_wise(
+        _text(names), _text(symbols), _integer_text(prix * 100), _integer_text(variation * 100),
+        pa.array(trends), pa.array(categories), _text(images), _integer_text(_floats(market_caps)),
+        FINGERPRINT_SEP,
+    ).to_pylist()
+
+    return [
+        {"nom": nom, "symbole": symbole, "prix_usd": p, "variation_24h": v, "tendance": t,
+         "categorie": cat, "image": image, "market_cap": market_cap, "empreinte": empreinte}
+        for nom, symbole, p, v, t, cat, image, market_cap, empreinte in zip(
+            names, symbols, prix.tolist(), variation.tolist(), trends.tolist(), categories.tolist(),
+            images, market_caps, fingerprints)
+    ]
+
+def dedup_batch(docs):
+    """Documents du lot sans les symboles en double (lot trié par rang : on garde le premier)"""
+    keep = first_of_each([doc["symbole"] for doc in docs])
+    return list(itertools.compress(docs, keep))
+
+def first_of_each(values):
+    """Masque de la première occurrence de chaque valeur (lot trié par rang : la mieux classée)"""
+    _, first = np.unique(np.array(values, dtype=object), return_index=True)
+    keep = np.zeros(len(values), dtype=bool)
+    keep[first] = True
+    return keep
+
+def insert_new(col, docs):
+    """insert_many non ordonné ; les symboles déjà insérés par un lot précédent (index unique) sont ignorés"""
+    try:
+        return len(col.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        if any(err["code"] != DUPLICATE_KEY for err in e.details["writeErrors"]):
+            raise
+        return e.details["nInserted"]
+
+def load_batched(db, batch_size=BATCH_SIZE):
+    """Mode par lots : lecture, transformation en colonnes (transform_batch) et insertion lot par lot.
+
+    Les lots sont écrits dans une collection de travail renommée à la fin : la mémoire reste
+    bornée par batch_size et le dashboard ne voit jamais de collection vide.
+    Doublons de symbole : dédoublonnés dans le lot, puis par l'index unique d'un lot à l'autre
+    (lecture triée par rang : le premier inséré est le mieux classé).
+    """
+    staging = db["market_cap_clean_staging"]
+    staging.drop()
+    staging.create_index("symbole", unique=True)
+    ensure_indexes(staging)
+
+    inserted = 0
+    for coins in iter_batches(by_rank(db["market_cap_raw"], RAW_FIELDS, batch_size), batch_size):
+        inserted += insert_new(staging, dedup_batch(transform_batch(coins)))
+
+    # Raw vide (extraction ratée) : la collection propre est gardée telle quelle
+    if inserted:
+        staging.rename("market_cap_clean", dropTarget=True)
+    else:
+        staging.drop()
+        print("⚠️ Aucun document dans 'market_cap_raw' : 'market_cap_clean' conservée.")
+    return {"inserted": inserted, "updated": 0, "unchanged": 0, "deleted": 0}
+
+def synthetic_coins(n, seed=42):
+    """Documents bruts au format CoinGecko (mesures de débit, sans serveur)"""
+    rng = random.Random(seed)
+    return [{
+        "name": f"Coin {i}",
+        "symbol": f"c{i}" if i % 200 else "dup", # quelques symboles en double
+        "current_price": rng.lognormvariate(0, 3),
+        "market_cap": rng.randint(10**5, 10**12) if i % 100 else None,
+        "market_cap_rank": i + 1 if i % 100 else None,
+        "price_change_percentage_24h": rng.gauss(0, 5) if i % 50 else None,
+        "image": f"https://example.com/{i}.png",
+    } for i in range(n)]
+
+def bench_transform(n=1_000_000, batch_size=BATCH_SIZE):
+    """Débit de la transformation seule (sans MongoDB) : document par document vs colonnes par lots.
+
+    Même lot synthétique transformé n / batch_size fois ; dédoublonnage et empreinte compris.
+    """
+    batch = synthetic_coins(batch_size)
+    nb_batches = max(1, n // batch_size)
+
+    start = time.perf_counter()
+    for _ in range(nb_batches):
+        list(clean_docs(batch, set()))
+    loop_rate = nb_batches * batch_size / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(nb_batches):
+        dedup_batch(transform_batch(batch))
+    batch_rate = nb_batches * batch_size / (time.perf_counter() - start)
+
+    print(f"⏱️  {nb_batches * batch_size} docs : document par document {loop_rate:,.0f} docs/s | "
+          f"colonnes par lots {batch_rate:,.0f} docs/s (x{batch_rate / loop_rate:.2f})")
+    return loop_rate, batch_rate
+
+def read_clean_data(raw_col):
+    """Mode Python : lecture du raw et transformation document par document"""
+    # Tri par rang : en cas de symbole en double, on garde la crypto la mieux classée
+    return list(clean_docs(by_rank(raw_col), set()))
+
+def batched_clean_data(raw_col, batch_size=BATCH_SIZE):
+    """Documents du mode par lots (transform_batch), sans écriture : {symbole: document}"""
+    docs = {}
+    for coins in iter_batches(by_rank(raw_col, RAW_FIELDS, batch_size), batch_size):
+        for doc in dedup_batch(transform_batch(coins)):
+            docs.setdefault(doc["symbole"], doc) # lot précédent = mieux classé
+    return docs
+
+def compare_docs(reference, other, label):
+    """Liste des clés dont le document diffère entre deux transformations (affiche les premières)"""
+    diffs = [k for k in reference.keys() | other.keys() if reference.get(k) != other.get(k)]
+    for k in diffs[:10]:
+        print(f"❌ {k} : python={reference.get(k)} {label}={other.get(k)}")
+    return diffs
+
+def check_parity(db, batch_size=BATCH_SIZE):
+    """Vérifie que les modes Python, par lots et pipeline produisent les mêmes documents (empreinte comprise)"""
+    python_docs = {d["symbole"]: {k: v for k, v in d.items() if k != "_id"}
+                   for d in read_clean_data(db["market_cap_raw"])}
+    batched_docs = batched_clean_data(db["market_cap_raw"], batch_size)
+    pipeline_docs = {d["symbole"]: d for d in db["market_cap_raw"].aggregate(transform_pipeline())}
+
+    diffs = set(compare_docs(python_docs, batched_docs, "lots"))
+    diffs |= set(compare_docs(python_docs, pipeline_docs, "pipeline"))
+    if diffs:
+        print(f"❌ {len(diffs)} document(s) différent(s) sur {len(python_docs)}.")
+    else:
+        print(f"✅ Parité OK : {len(python_docs)} documents identiques (python, lots, pipeline).")
+    return not diffs
+
+def snapshot(col):
+    """Snapshot Arrow de la collection propre (démarrage rapide des dashboards)"""
+    start = time.perf_counter()
+    manifest = save_snapshot(col)
+    if manifest:
+        print(f"📸 Snapshot v{manifest['version']} : {manifest['rows']} lignes en {time.perf_counter() - start:.2f}s.")
+
+def summarize(db):
+    """Recalcule market_summary (avant bump_version : le cache ne doit pas garder l'ancien résumé)"""
+    start = time.perf_counter()
+    refresh_summary(db)
+    print(f"📊 Résumé du marché recalculé en {time.perf_counter() - start:.2f}s.")
+
+def clean_crypto_data(mode="incremental", client=None):
+    client = client or get_client("etl")
     db = client["crypto_data"]
-    
+    col = db["market_cap_clean"]
+    drop_snapshot(col.full_name) # dashboards sur MongoDB le temps du clean
+
+    print(f"⚙️  Nettoyage et Analyse en cours ({mode})...")
+
+    if mode == "pipeline":
+        stats = load_pipeline(db)
+        summarize(db)
+        CryptoRedisCache().invalidate_all()
+        bump_version(col)
+        print(f"✨ $merge terminé : {stats['merged']} lignes dans 'market_cap_clean', "
+              f"{stats['deleted']} supprimées.")
+        snapshot(col)
+        return stats
+
+    if mode == "batched":
+        start = time.perf_counter()
+        stats = load_batched(db)
+        elapsed = time.perf_counter() - start
+        summarize(db)
+        CryptoRedisCache().invalidate_all()
+        bump_version(col)
+        print(f"✨ {stats['inserted']} lignes insérées dans 'market_cap_clean' en {elapsed:.2f}s "
+              f"({stats['inserted'] / elapsed:.0f} docs/s).")
+        snapshot(col)
+        return stats
+
     # 1. Lecture des données brutes
-    raw_data = list(db["market_cap_raw"].find())
-    
-    clean_data = []
-    
-    print("⚙️  Nettoyage et Analyse en cours...")
-    for coin in raw_data:
-        # Tendance
-        change = coin.get("price_change_percentage_24h", 0)
-        trend = "🔥 Hausse" if change > 0 else "🔻 Baisse"
-        
-        # Catégorisation
-        rank = coin.get("market_cap_rank")
-        category = "Top 10" if rank <= 10 else "Altcoin"
-        
-        # Build doc propre
-        clean_doc = {
-            "nom": coin.get("name"),
-            "symbole": coin.get("symbol").upper(),
-            "prix_usd": round(coin.get("current_price", 0), 2),
-            "variation_24h": round(change, 2),
-            "tendance": trend,
-            "categorie": category,
-            "image": coin.get("image"),
-            "market_cap": coin.get("market_cap")
-        }
-        clean_data.append(clean_doc)
-    
+    clean_data = read_clean_data(db["market_cap_raw"])
+
     # 2. Écriture dans la collection "market_cap_clean"
-    db["market_cap_clean"].drop()
-    
-    if clean_data:
-        db["market_cap_clean"].insert_many(clean_data)
-        print(f"✨ {len(clean_data)} lignes nettoyées et insérées dans 'market_cap_clean'.")
-    
-    client.close()
+    if mode == "full":
+        stats = load_full(col, clean_data)
+        # Index supprimés par le drop : unicité du symbole + requêtes du dashboard
+        col.create_index("symbole", unique=True)
+        ensure_indexes(col)
+    else:
+        stats = load_incremental(col, clean_data)
+
+    # Invalide le cache de lecture des dashboards
+    changed = stats["inserted"] or stats["updated"] or stats["deleted"] or mode == "full"
+    if changed or read_summary(db) is None:
+        summarize(db)
+    if changed:
+        CryptoRedisCache().invalidate_all()
+        bump_version(col)
+
+    print(f"✨ {len(clean_data)} lignes traitées dans 'market_cap_clean' ({mode}) : "
+          f"{stats['inserted']} insérées, {stats['updated']} modifiées, "
+          f"{stats['unchanged']} inchangées, {stats['deleted']} supprimées.")
+    snapshot(col)
+
+    return stats
 
 if __name__ == "__main__":
-    clean_crypto_data()
\ No newline at end of file
+    # --full : drop + insert | --pipeline : transformation côté serveur ($merge)
+    # --batched : lecture / transformation / insertion par lots (mémoire bornée)
+    # --parity : compare les transformations sans rien écrire
+    # --bench : débit de la transformation document par document vs par lots (1M documents synthétiques)
+    if "--bench" in sys.argv:
+        bench_transform()
+    elif "--parity" in sys.argv:
+        ok = check_parity(get_client("etl")["crypto_data"])
+        sys.exit(0 if ok else 1)
+    elif "--pipeline" in sys.argv:
+        clean_crypto_data("pipeline")
+    elif "--batched" in sys.argv:
+        clean_crypto_data("batched")
+    elif "--full" in sys.argv:
+        clean_crypto_data("full")
+    else:
+        clean_crypto_data("incremental")
@@ -1,57 +1,283 @@
 import os
-import pymongo
+import sys
+import math
+import time
+import random
+import itertools
+import numpy as np
 from dotenv import load_dotenv
 
+# accès aux modules partagés à la racine du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from read_cache import bump_version
+from thumbnails import ThumbnailStore
+from meme_queries import ensure_indexes
+from mongo_client import get_client
+from snapshots import drop_snapshot, save_snapshot
+
 load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = "meme_studio"
 
-def clean_memes():
-    client = pymongo.MongoClient(MONGO_URI)
+BATCH_SIZE = 10_000 # Mode par lots : mèmes bruts lus / transformés / insérés à la fois
+RAW_FIELDS = ["id", "name", "url", "width", "height", "box_count"]
+
+def transform_meme(meme):
+    """Transforme un mème brut imgflip en document propre (traduit en FR)"""
+    # Calcul du ratio (Largeur / Hauteur) ; dimension absente ou nulle (None) = 1, comme $ifNull du pipeline
+    width = meme.get("width")
+    width = 1 if width is None else width
+    height = meme.get("height")
+    height = 1 if height is None else height
+    ratio = width / height
+
+    # Détermination du format
+    if 0.9 <= ratio <= 1.1:
+        fmt = "Carré (Insta)"
+    elif ratio > 1.1:
+        fmt = "Paysage (YouTube)"
+    else:
+        fmt = "Portrait (TikTok)"
+
+    return {
+        "id_original": meme.get("id"),
+        "titre": meme.get("name"),
+        "url_image": meme.get("url"),
+        "largeur": width,
+        "hauteur": height,
+        "nb_zones_texte": meme.get("box_count"),
+        "format": fmt,  # Notre champ calculé !
+        "ratio": math.floor(ratio * 100 + 0.5) / 100 # même arrondi que NumPy et le pipeline
+    }
+
+def iter_batches(cursor, batch_size=BATCH_SIZE):
+    """Découpe un curseur en listes de batch_size documents"""
+    while True:
+        batch = list(itertools.islice(cursor, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def transform_batch(memes):
+    """Mêmes documents que transform_meme, ratio et format calculés en colonnes NumPy sur tout un lot"""
+    width = [1 if meme.get("width") is None else meme["width"] for meme in memes]
+    height = [1 if meme.get("height") is None else meme["height"] for meme in memes]
+    ratio = np.array(width, dtype=float) / np.array(height, dtype=float)
+
+    fmt = np.select(
+        [(ratio >= 0.9) & (ratio <= 1.1), ratio > 1.1],
+        ["Carré (Insta)", "Paysage (YouTube)"],
+        default="Portrait (TikTok)"
+    )
+    return [
+        {"id_original": meme.get("id"), "titre": meme.get("name"), "url_image": meme.get("url"),
+         "largeur": w, "hauteur": h, "nb_zones_texte": meme.get("box_count"), "format": f, "ratio": r}
+        for meme, w, h, f, r in zip(memes, width, height, fmt.tolist(), (np.floor(ratio * 100 + 0.5) / 100).tolist())
+    ]
+
+def load_batched(db, batch_size=BATCH_SIZE):
+    """Mode par lots : lecture, transformation en colonnes (transform_batch) et insertion lot par lot.
+
+    Mémoire bornée par batch_size ; la collection de travail est renommée à la fin
+    (pas de fenêtre où 'memes_clean' est vide).
+    """
+    staging = db["memes_clean_staging"]
+    staging.drop()
+    ensure_indexes(staging) # conservés par le rename
+
+    projection = {field: 1 for field in RAW_FIELDS}
+    inserted = 0
+    for memes in iter_batches(db["memes_top_100"].find({}, projection, batch_size=batch_size), batch_size):
+        clean_data = transform_batch(memes)
+        staging.insert_many(clean_data, ordered=False)
+        inserted += len(clean_data)
+
+    # Raw vide (extraction ratée) : la galerie est gardée telle quelle
+    if inserted:
+        staging.rename("memes_clean", dropTarget=True)
+    else:
+        staging.drop()
+        print("⚠️ Aucun mème dans 'memes_top_100' : 'memes_clean' conservée.")
+    return inserted
+
+def synthetic_memes(n, seed=42):
+    """Mèmes bruts au format imgflip (mesures de débit, sans serveur)"""
+    rng = random.Random(seed)
+    return [{
+        "id": str(i),
+        "name": f"Meme {i}",
+        "url": f"https://i.imgflip.com/{i}.jpg",
+        "width": rng.randint(200, 1200) if i % 100 else None,
+        "height": rng.randint(200, 1200),
+        "box_count": rng.randint(1, 5),
+    } for i in range(n)]
+
+def bench_transform(n=1_000_000, batch_size=BATCH_SIZE):
+    """Débit de la transformation seule (sans MongoDB) : document par document vs colonnes par lots"""
+    batch = synthetic_memes(batch_size)
+    nb_batches = max(1, n // batch_size)
+
+    start = time.perf_counter()
+    for _ in range(nb_batches):
+        [transform_meme(meme) for meme in batch]
+    loop_rate = nb_batches * batch_size / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(nb_batches):
+        transform_batch(batch)
+    batch_rate = nb_batches * batch_size / (time.perf_counter() - start)
+
+    print(f"⏱️  {nb_batches * batch_size} mèmes : document par document {loop_rate:,.0f} docs/s | "
+          f"colonnes par lots {batch_rate:,.0f} docs/s (x{batch_rate / loop_rate:.2f})")
+    return loop_rate, batch_rate
+
+def transform_pipeline():
+    """Mêmes règles que transform_meme, exprimées en agrégation (exécutées par MongoDB)"""
+    width = {"$ifNull": ["$width", 1]}
+    height = {"$ifNull": ["$height", 1]}
+    return [
+        {"$set": {"_ratio": {"$divide": [width, height]}}},
+        {"$project": {
+            "_id": 0,
+            "id_original": {"$ifNull": ["$id", None]},
+            "titre": {"$ifNull": ["$name", None]},
+            "url_image": {"$ifNull": ["$url", None]},
+            "largeur": width,
+            "hauteur": height,
+            "nb_zones_texte": {"$ifNull": ["$box_count", None]},
+            "format": {"$switch": {
+                "branches": [
+                    {"case": {"$and": [{"$gte": ["$_ratio", 0.9]}, {"$lte": ["$_ratio", 1.1]}]},
+                     "then": "Carré (Insta)"},
+                    {"case": {"$gt": ["$_ratio", 1.1]}, "then": "Paysage (YouTube)"},
+                ],
+                "default": "Portrait (TikTok)"
+            }},
+            "ratio": {"$divide": [{"$floor": {"$add": [{"$multiply": ["$_ratio", 100]}, 0.5]}}, 100]},
+        }},
+    ]
+
+def merge_memes(db):
+    """Mode serveur : transformation + $merge, les documents ne quittent pas MongoDB"""
+    target_col = db["memes_clean"]
+    target_col.create_index("id_original", unique=True) # requis par $merge "on"
+    ensure_indexes(target_col)
+
+    # Mèmes disparus du raw (seuls leurs _id reviennent au client)
+    vanished = [d["_id"] for d in target_col.aggregate([
+        {"$project": {"_id": 0, "id_original": 1, "clean_id": "$_id", "in_raw": {"$literal": False}}},
+        {"$unionWith": {"coll": "memes_top_100", "pipeline": [
+            {"$project": {"_id": 0, "id_original": "$id", "in_raw": {"$literal": True}}}
+        ]}},
+        {"$group": {"_id": "$id_original", "in_raw": {"$max": "$in_raw"}, "clean_ids": {"$push": "$clean_id"}}},
+        {"$match": {"in_raw": False}},
+        {"$unwind": "$clean_ids"},
+        {"$project": {"_id": "$clean_ids"}},
+    ])]
+
+    db["memes_top_100"].aggregate(transform_pipeline() + [
+        {"$merge": {"into": "memes_clean", "on": "id_original",
+                    "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ])
+
+    if vanished:
+        target_col.delete_many({"_id": {"$in": vanished}})
+    return target_col.estimated_document_count()
+
+def check_parity(db):
+    """Vérifie que les modes Python, par lots et pipeline produisent les mêmes documents"""
+    raw = db["memes_top_100"]
+    python_docs = {d["id_original"]: d for d in map(transform_meme, raw.find())}
+    batched_docs = {}
+    for memes in iter_batches(raw.find({}, {field: 1 for field in RAW_FIELDS})):
+        batched_docs.update((d["id_original"], d) for d in transform_batch(memes))
+    pipeline_docs = {d["id_original"]: d for d in raw.aggregate(transform_pipeline())}
+
+    diffs = set()
+    for label, docs in (("lots", batched_docs), ("pipeline", pipeline_docs)):
+        different = [k for k in python_docs.keys() | docs.keys() if python_docs.get(k) != docs.get(k)]
+        for k in different[:10]:
+            print(f"❌ {k} : python={python_docs.get(k)} {label}={docs.get(k)}")
+        diffs.update(different)
+
+    if diffs:
+        print(f"❌ {len(diffs)} mème(s) différent(s) sur {len(python_docs)}.")
+    else:
+        print(f"✅ Parité OK : {len(python_docs)} mèmes identiques (python, lots, pipeline).")
+    return not diffs
+
+def build_thumbnails(db):
+    """Télécharge (en parallèle) et réduit une seule fois les images des mèmes pour la galerie"""
+    urls = [d["url_image"] for d in db["memes_clean"].find({}, {"_id": 0, "url_image": 1}) if d.get("url_image")]
+    stats = ThumbnailStore().fetch_many(urls)
+    print(f"🖼️  Miniatures : {stats['fetched']} créées, {stats['cached']} déjà en cache, "
+          f"{stats['evicted']} évincées.")
+
+def snapshot(col):
+    """Snapshot Arrow de la galerie (démarrage rapide du dashboard)"""
+    start = time.perf_counter()
+    manifest = save_snapshot(col)
+    if manifest:
+        print(f"📸 Snapshot v{manifest['version']} : {manifest['rows']} mèmes en {time.perf_counter() - start:.2f}s.")
+
+def clean_memes(mode="python", client=None):
+    client = client or get_client("etl")
     db = client[DB_NAME]
-    
+    drop_snapshot(db["memes_clean"].full_name) # galerie sur MongoDB le temps du clean
+
+    if mode == "pipeline":
+        print("⚙️  Calcul des formats côté serveur ($merge)...")
+        nb = merge_memes(db)
+        bump_version(db["memes_clean"]) # Invalide le cache de lecture du dashboard
+        print(f"✨ {nb} mèmes nettoyés dans 'memes_clean'.")
+        snapshot(db["memes_clean"])
+        build_thumbnails(db)
+        return nb
+
+    if mode == "batched":
+        print("⚙️  Calcul des formats par lots...")
+        start = time.perf_counter()
+        nb = load_batched(db)
+        bump_version(db["memes_clean"]) # Invalide le cache de lecture du dashboard
+        elapsed = time.perf_counter() - start
+        print(f"✨ {nb} mèmes nettoyés dans 'memes_clean' en {elapsed:.2f}s ({nb / elapsed:.0f} docs/s).")
+        snapshot(db["memes_clean"])
+        build_thumbnails(db)
+        return nb
+
     # 1. Lecture (Raw)
     raw_memes = list(db["memes_top_100"].find())
     print(f"📦 {len(raw_memes)} mèmes bruts récupérés.")
-    
-    clean_data = []
-    
+
     # 2. Transformation
     print("⚙️  Calcul des formats et traduction...")
-    for meme in raw_memes:
-        # Calcul du ratio (Largeur / Hauteur)
-        width = meme.get("width", 1)
-        height = meme.get("height", 1)
-        ratio = width / height
-        
-        # Détermination du format
-        if 0.9 <= ratio <= 1.1:
-            fmt = "Carré (Insta)"
-        elif ratio > 1.1:
-            fmt = "Paysage (YouTube)"
-        else:
-            fmt = "Portrait (TikTok)"
-            
-        # Création du document propre (traduit en FR)
-        doc = {
-            "id_original": meme.get("id"),
-            "titre": meme.get("name"),
-            "url_image": meme.get("url"),
-            "largeur": width,
-            "hauteur": height,
-            "nb_zones_texte": meme.get("box_count"),
-            "format": fmt,  # Notre champ calculé !
-            "ratio": round(ratio, 2)
-        }
-        clean_data.append(doc)
-    
+    clean_data = [transform_meme(meme) for meme in raw_memes]
+
     # 3. Chargement (Clean)
     target_col = db["memes_clean"]
     target_col.drop() # On remplace tout
     target_col.insert_many(clean_data)
-    
+    ensure_indexes(target_col) # Index de la galerie (supprimés par le drop)
+    bump_version(target_col) # Invalide le cache de lecture du dashboard
+
     print(f"✨ {len(clean_data)} mèmes nettoyés sauvegardés dans 'memes_clean'.")
-    client.close()
+    snapshot(target_col)
+    build_thumbnails(db)
+    return len(clean_data)
 
 if __name__ == "__main__":
-    clean_memes()
\ No newline at end of file
+    # --pipeline : transformation côté serveur ($merge)
+    # --batched : lecture / transformation / insertion par lots (mémoire bornée)
+    # --parity : compare les transformations sans rien écrire
+    # --bench : débit de la transformation document par document vs par lots (1M mèmes synthétiques)
+    if "--bench" in sys.argv:
+        bench_transform()
+        sys.exit(0)
+    if "--parity" in sys.argv:
+        ok = check_parity(get_client("etl")[DB_NAME])
+        sys.exit(0 if ok else 1)
+    if "--pipeline" in sys.argv:
+        clean_memes("pipeline")
+    elif "--batched" in sys.argv:
+        clean_memes("batched")
+    else:
+        clean_memes("python")
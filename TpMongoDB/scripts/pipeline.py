@@ -0,0 +1,194 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+# Orchestrateur du pipeline : extract -> clean -> sync, sous forme de DAG.
+#
+#   crypto : extract_crypto -> clean_crypto -> sync_neo4j -> correlate_neo4j
+#   memes  : extract_memes  -> clean_memes
+#
+# Les deux branches tournent en parallèle, chacune dans son process avec un seul MongoClient
+# (get_client : un client par process et par profil).
+# Une étape est sautée si son entrée (empreinte du payload de l'API + code et mode de l'étape)
+# est identique à celle de son dernier passage réussi (checkpoints dans MongoDB).
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SCRIPTS_DIR)
+sys.path.extend([SCRIPTS_DIR, ROOT])
+
+from mongo_client import get_client, pool_report
+
+load_dotenv()
+STATE_DB = "crypto_data"
+COLLECTION_CHECKPOINTS = "pipeline_checkpoints" # un document par étape
+COLLECTION_RUNS = "pipeline_runs"               # un document par exécution (durées par étape)
+
+# ÉTAPES : fonction(client, options) -> résultat (dict)
+
+def extract_crypto(client, options):
+    from run_crypto import extract_crypto as extract
+    return extract(options.pages, options.per_page, options.workers, options.rpm, client=client)
+
+def clean_crypto(client, options):
+    from clean_crypto import clean_crypto_data
+    return clean_crypto_data(options.crypto_mode, client=client)
+
+def sync_neo4j(client, options):
+    from sync_crypto_to_neo import sync_data
+    return {"rows": sync_data(client=client)}
+
+def correlate_neo4j(client, options):
+    from crypto_correlations import correlate
+    return correlate(options.correlation_days, client=client)
+
+def extract_memes(client, options):
+    from run_memes import get_memes
+    return get_memes(client=client)
+
+def clean_memes(client, options):
+    from clean_memes import clean_memes as clean
+    return {"docs": clean(options.memes_mode, client=client)}
+
+# Une branche = une suite (nom, fonction, fichier source) ; la première étape (extraction)
+# tourne toujours et fournit l'empreinte du payload dont dépendent les suivantes.
+DAG = {
+    "crypto": [
+        ("extract_crypto", extract_crypto, None),
+        ("clean_crypto", clean_crypto, "scripts/clean_crypto.py"),
+        ("sync_neo4j", sync_neo4j, "sync_crypto_to_neo.py"),
+        ("correlate_neo4j", correlate_neo4j, "crypto_correlations.py"),
+    ],
+    "memes": [
+        ("extract_memes", extract_memes, None),
+        ("clean_memes", clean_memes, "scripts/clean_memes.py"),
+    ],
+}
+
+def file_hash(relpath):
+    """Empreinte du code d'une étape : une modification des règles relance l'étape"""
+    with open(os.path.join(ROOT, relpath), "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def input_hash(upstream, source, mode):
+    return hashlib.sha1(f"{upstream}|{file_hash(source)}|{mode}".encode()).hexdigest()
+
+def run_branch(branch, options):
+    """Exécute une branche dans le process courant ; renvoie un rapport par étape"""
+    client = get_client("etl") # le seul client de ce process
+    checkpoints = client[STATE_DB][COLLECTION_CHECKPOINTS]
+    mode = getattr(options, f"{branch}_mode")
+    reports = []
+    upstream = None
+
+    try:
+        for i, (name, stage, source) in enumerate(DAG[branch]):
+            if i > 0 and upstream is None:
+                reports.append({"stage": name, "status": "bloquée", "seconds": 0.0})
+                continue
+
+            expected = input_hash(upstream, source, mode) if i > 0 else None
+            if expected is not None and not options.force:
+                checkpoint = checkpoints.find_one({"_id": name}, {"input_hash": 1})
+                if checkpoint and checkpoint.get("input_hash") == expected:
+                    print(f"⏭️  [{branch}] {name} : entrée inchangée, étape sautée.")
+                    reports.append({"stage": name, "status": "inchangée", "seconds": 0.0})
+                    upstream = expected
+                    continue
+
+            start = time.perf_counter()
+            try:
+                result = stage(client, options) or {}
+                status = "ok"
+            except Exception as e:
+                print(f"❌ [{branch}] {name} : {e}")
+                result, status = {"erreur": str(e)}, "échec"
+            seconds = time.perf_counter() - start
+
+            if i == 0:
+                # Une page en échec lève (raw inchangé) ; par sécurité, rien de récupéré = échec aussi
+                expected = result.get("empreinte")
+                if status == "ok" and not (result.get("docs") and expected):
+                    status = "échec"
+
+            if status == "ok":
+                checkpoints.update_one({"_id": name}, {"$set": {
+                    "branch": branch,
+                    "input_hash": expected,
+                    "result": result,
+                    "seconds": seconds,
+                    "finished_at": datetime.now(),
+                }}, upsert=True)
+                upstream = expected
+            else:
+                upstream = None
+            reports.append({"stage": name, "status": status, "seconds": round(seconds, 3)})
+    finally:
+        pool = pool_report("etl")
+        print(f"🔌 [{branch}] pool : {pool['checkouts']} checkouts, attente p50 {pool['p50_ms']} ms, "
+              f"p99 {pool['p99_ms']} ms")
+    return reports
+
+def run_pipeline(options):
+    start = time.perf_counter()
+    branches = options.only or list(DAG)
+    reports = {}
+
+    # Un process par branche : les clients MongoDB sont créés après le fork
+    with ProcessPoolExecutor(max_workers=len(branches)) as pool:
+        futures = {branch: pool.submit(run_branch, branch, options) for branch in branches}
+        for branch, future in futures.items():
+            try:
+                reports[branch] = future.result()
+            except Exception as e:
+                print(f"❌ Branche {branch} interrompue : {e}")
+                reports[branch] = [{"stage": name, "status": "échec", "seconds": 0.0} for name, _, _ in DAG[branch]]
+
+    total = time.perf_counter() - start
+    print(f"\n📋 Pipeline terminé en {total:.2f}s")
+    for branch, stages in reports.items():
+        for report in stages:
+            print(f"   {branch:<7}{report['stage']:<16}{report['status']:<11}{report['seconds']:>8.2f}s")
+
+    get_client("etl")[STATE_DB][COLLECTION_RUNS].insert_one({
+        "started_at": datetime.now(),
+        "seconds": total,
+        "force": options.force,
+        "branches": reports,
+    })
+    return reports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline extract -> clean -> sync (crypto et mèmes en parallèle)")
+    parser.add_argument("--only", choices=list(DAG), action="append", help="Limiter à une branche (répétable)")
+    parser.add_argument("--force", action="store_true", help="Ignorer les checkpoints (tout relancer)")
+    parser.add_argument("--watch", type=float, metavar="SECONDES", help="Relancer le pipeline à intervalle fixe")
+    parser.add_argument("--pages", type=int, default=1, help="Pages CoinGecko à récupérer")
+    parser.add_argument("--per-page", type=int, default=50, help="Cryptos par page (max 250)")
+    parser.add_argument("--workers", type=int, default=4, help="Requêtes CoinGecko en parallèle")
+    parser.add_argument("--rpm", type=int, default=30, help="Budget de requêtes par minute")
+    parser.add_argument("--crypto-mode", default="incremental",
+                        choices=["incremental", "full", "pipeline", "batched"], help="Mode de clean_crypto")
+    parser.add_argument("--correlation-days", type=float, default=7,
+                        help="Fenêtre d'historique des corrélations (jours)")
+    parser.add_argument("--memes-mode", default="python",
+                        choices=["python", "pipeline", "batched"], help="Mode de clean_memes")
+    args = parser.parse_args()
+
+    if args.watch is None:
+        run_pipeline(args)
+        sys.exit(0)
+
+    print(f"👀 Pipeline relancé toutes les {args.watch:.0f}s (Ctrl+C pour arrêter)")
+    try:
+        while True:
+            started = time.monotonic()
+            run_pipeline(args)
+            # Intervalle mesuré de début à début : un passage long ne décale pas les suivants
+            time.sleep(max(0.0, args.watch - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        print("👋 Arrêt du pipeline.")
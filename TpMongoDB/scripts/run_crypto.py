@@ -1,43 +1,161 @@
 import os
+import sys
+import time
+import json
+import hashlib
+import argparse
+import threading
 import requests
-import pymongo
-from datetime import datetime
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 from dotenv import load_dotenv
 
+# accès aux modules partagés à la racine du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crypto_history import append_collection
+from mongo_client import get_client
+
 load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
 
 # Config
 DB_NAME = "crypto_data"
 COLLECTION_RAW = "market_cap_raw" # Collection "Sale"
-API_URL = "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=50&page=1&sparkline=false"
+# Les pages arrivent ici ; le raw n'est remplacé (rename) que si toutes ont été récupérées
+COLLECTION_STAGING = "market_cap_raw_staging"
+# Surchargeable pour pointer vers un serveur HTTP local (stub) en test
+API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3") + "/coins/markets"
 
-def extract_crypto():
-    print("📡 Récupération des cours crypto...")
-    try:
-        response = requests.get(API_URL, timeout=10)
+class RateLimiter:
+    """Espace les requêtes pour respecter un budget de requêtes par minute (partagé entre threads)"""
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+def is_retryable(exc):
+    """On réessaie sur les erreurs réseau, le 429 (rate limit) et les 5xx"""
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else 0
+        return status == 429 or status >= 500
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+def fetch_page(page, per_page, limiter, api_url=API_URL):
+    """Récupère une page du classement CoinGecko, avec backoff exponentiel"""
+
+    @retry(retry=retry_if_exception(is_retryable),
+           wait=wait_exponential(multiplier=1, min=1, max=30),
+           stop=stop_after_attempt(5),
+           reraise=True)
+    def _get():
+        limiter.wait()
+        response = requests.get(api_url, params={
+            "vs_currency": "usd",
+            "order": "market_cap_desc",
+            "per_page": per_page,
+            "page": page,
+            "sparkline": "false",
+        }, timeout=10)
         response.raise_for_status()
-        data = response.json()
-        
-        # timestamp d'ingestion
-        timestamp = datetime.now()
-        for coin in data:
-            coin['ingested_at'] = timestamp
-
-        # Connexion MongoDB
-        client = pymongo.MongoClient(MONGO_URI)
-        db = client[DB_NAME]
-        
-        db[COLLECTION_RAW].drop()
-        
-        if data:
-            db[COLLECTION_RAW].insert_many(data)
-            print(f"✅ {len(data)} cryptos mises à jour dans '{COLLECTION_RAW}'.")
-            
-        client.close()
-        
-    except Exception as e:
-        print(f"❌ Erreur : {e}")
+        return response.json()
+
+    return _get()
+
+def payload_hash(data):
+    """Empreinte d'une réponse de l'API (avant ajout de ingested_at)"""
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+def extract_crypto(pages=1, per_page=50, workers=4, rpm=30, api_url=API_URL, client=None,
+                   db_name=DB_NAME, timings=None):
+    """Pages CoinGecko -> staging -> raw ; timings (liste) reçoit la durée d'insertion de chaque page"""
+    print(f"📡 Récupération des cours crypto ({pages} page(s) de {per_page}, {workers} workers, {rpm} req/min)...")
+    start = time.perf_counter()
+    nb_pages = 0
+    nb_docs = 0
+    page_hashes = {}
+
+    # Connexion MongoDB (client partagé du process, profil ETL)
+    client = client or get_client("etl")
+    db = client[db_name]
+
+    # timestamp d'ingestion (le même pour tout le snapshot)
+    timestamp = datetime.now(timezone.utc)
+    limiter = RateLimiter(rpm)
+    failed = []
+    staging = db[COLLECTION_STAGING]
+    staging.drop()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_page, page, per_page, limiter, api_url): page
+                   for page in range(1, pages + 1)}
+
+        # Chaque page est insérée dès son arrivée (en staging), sans attendre les autres
+        for future in as_completed(futures):
+            page = futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                print(f"❌ Page {page} : {e}")
+                failed.append(page)
+                continue
+
+            nb_pages += 1
+            page_hashes[page] = payload_hash(data)
+            if not data:
+                continue
+
+            for coin in data:
+                coin['ingested_at'] = timestamp
+
+            insert_start = time.perf_counter()
+            staging.insert_many(data, ordered=False)
+            if timings is not None:
+                timings.append(time.perf_counter() - insert_start)
+            nb_docs += len(data)
+
+    # Extraction incomplète : le raw précédent reste en place (sinon le clean incrémental
+    # supprimerait toutes les cryptos des pages manquantes)
+    if failed:
+        staging.drop()
+        raise RuntimeError(f"{len(failed)} page(s) en échec ({', '.join(map(str, sorted(failed)))}), "
+                           f"'{COLLECTION_RAW}' inchangée")
+    if not nb_docs:
+        staging.drop()
+        raise RuntimeError(f"Aucune crypto récupérée, '{COLLECTION_RAW}' inchangée")
+
+    # Historique (time-series, jamais de drop) : uniquement des snapshots complets,
+    # relus depuis le staging une fois toutes les pages arrivées
+    append_collection(db, staging)
+    # Le raw ne garde que le dernier snapshot complet (entrée du clean) : remplacement atomique
+    staging.rename(COLLECTION_RAW, dropTarget=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {nb_docs} cryptos mises à jour dans '{COLLECTION_RAW}' (+ historique) "
+          f"en {elapsed:.2f}s : {nb_pages / elapsed:.1f} pages/s, {nb_docs / elapsed:.1f} docs/s.")
+
+    # Empreinte du snapshot complet : les étapes suivantes sont sautées si elle n'a pas changé
+    empreinte = hashlib.sha1("".join(page_hashes[p] for p in sorted(page_hashes)).encode()).hexdigest()
+    return {"pages": nb_pages, "docs": nb_docs, "empreinte": empreinte}
 
 if __name__ == "__main__":
-    extract_crypto()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Extraction paginée CoinGecko -> MongoDB")
+    parser.add_argument("--pages", type=int, default=1, help="Nombre de pages à récupérer")
+    parser.add_argument("--per-page", type=int, default=50, help="Cryptos par page (max 250)")
+    parser.add_argument("--workers", type=int, default=4, help="Requêtes en parallèle")
+    parser.add_argument("--rpm", type=int, default=30, help="Budget de requêtes par minute")
+    parser.add_argument("--api-url", default=API_URL, help="URL de l'endpoint /coins/markets")
+    args = parser.parse_args()
+
+    try:
+        extract_crypto(args.pages, args.per_page, args.workers, args.rpm, args.api_url)
+    except Exception as e:
+        # Code de sortie non nul : un enchaînement shell ne lance pas le clean sur un raw tronqué
+        sys.exit(f"❌ Erreur : {e}")
@@ -1,15 +1,21 @@
 import os
+import json
+import hashlib
 import requests
-import pymongo
+import sys
 from dotenv import load_dotenv
 
+# accès aux modules partagés à la racine du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mongo_client import get_client
+
 load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = "meme_studio"
 COLLECTION_NAME = "memes_top_100"
 
-def get_memes():
+def get_memes(client=None):
     print("Récupération des mèmes en cours...")
+    stats = {"docs": 0, "empreinte": None}
     url = "https://api.imgflip.com/get_memes"
     
     try:
@@ -19,9 +25,11 @@ def get_memes():
         if data["success"]:
             memes = data["data"]["memes"]
             print(f"✅ {len(memes)} mèmes récupérés !")
+            # Empreinte de la réponse (avant l'ajout des _id par insert_many)
+            stats["empreinte"] = hashlib.sha1(json.dumps(memes, sort_keys=True).encode()).hexdigest()
             
-            # Connexion Mongo
-            client = pymongo.MongoClient(MONGO_URI)
+            # Connexion Mongo (client partagé du process, profil ETL)
+            client = client or get_client("etl")
             db = client[DB_NAME]
             col = db[COLLECTION_NAME]
             
@@ -29,12 +37,14 @@ def get_memes():
             col.drop()
             col.insert_many(memes)
             print("💾 Sauvegardé dans MongoDB Atlas.")
-            client.close()
+            stats["docs"] = len(memes)
         else:
             print("❌ L'API a refusé la demande.")
             
     except Exception as e:
         print(f"❌ Erreur : {e}")
 
+    return stats
+
 if __name__ == "__main__":
     get_memes()
\ No newline at end of file
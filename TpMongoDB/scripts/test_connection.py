@@ -1,65 +1,335 @@
 import os
+import json
+import time
+import random
+import argparse
+import threading
 import pymongo
+import numpy as np
+from datetime import datetime
+from pymongo import UpdateOne
 from dotenv import load_dotenv
 import sys
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mongo_client import WORKLOADS, create_client, available_compressors, warm_pool, pool_report
+from metrics import registry
+
 # Chargement de la config
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME")
 
-print("--- 🛠 TEST DE DIAGNOSTIC MONGODB ---")
-
-# présence du .env
-if not MONGO_URI:
-    print("❌ ERREUR CRITIQUE : Variable MONGO_URI introuvable.")
-    print("   -> Vérifie que ton fichier .env existe et contient MONGO_URI.")
-    sys.exit(1)
-
-# Masquage du mot de passe pour l'affichage
-uri_masked = MONGO_URI.split("@")[-1] if "@" in MONGO_URI else "URI Malformée"
-print(f"ℹ️  Tentative de connexion vers : ...@{uri_masked}")
-
-try:
-    # Création du client avec un timeout court (5 secondes max)
-    # Si ça ne répond pas en 5s = dead
-    client = pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    
-    # commande "ping"
-    print("⏳ Envoi du ping au serveur...")
-    client.admin.command('ping')
-    print("✅ SUCCÈS : Le serveur MongoDB a répondu au ping !")
-
-    # Vérification des accès
-    print("📋 Vérification des droits d'accès...")
-    dbs = client.list_database_names()
-    
-    if DB_NAME in dbs:
-        print(f"✅ La base de données '{DB_NAME}' existe bien.")
-    else:
-        print(f"⚠️ La base '{DB_NAME}' n'existe pas encore (elle sera créée à la première insertion).")
-        print(f"   -> Bases existantes : {', '.join(dbs)}")
+# Mode --probe : mesures de charge sur une collection jetable (supprimée à la fin)
+PROBE_DB = os.getenv("PROBE_DB", "crypto_probe")
+WAIT_EXPLOSION_MS = 5.0 # au-delà (p99 d'attente du pool), les workers font la queue
+
+def diagnose():
+    """Test de connexion historique : ping, droits, version ; renvoie True si le serveur répond"""
+    print("--- 🛠 TEST DE DIAGNOSTIC MONGODB ---")
+
+    # présence du .env
+    if not MONGO_URI:
+        print("❌ ERREUR CRITIQUE : Variable MONGO_URI introuvable.")
+        print("   -> Vérifie que ton fichier .env existe et contient MONGO_URI.")
+        sys.exit(1)
+
+    # Masquage du mot de passe pour l'affichage
+    uri_masked = MONGO_URI.split("@")[-1] if "@" in MONGO_URI else "URI Malformée"
+    print(f"ℹ️  Tentative de connexion vers : ...@{uri_masked}")
+
+    ok = False
+    try:
+        # Même profil que les dashboards : timeout court (5 secondes max)
+        # Si ça ne répond pas en 5s = dead
+        client = create_client("ui", uri=MONGO_URI)
+        print(f"ℹ️  Compression proposée : {', '.join(available_compressors()) or 'aucune'}")
+
+        # commande "ping"
+        print("⏳ Envoi du ping au serveur...")
+        client.admin.command('ping')
+        print("✅ SUCCÈS : Le serveur MongoDB a répondu au ping !")
+        ok = True
+
+        # Vérification des accès
+        print("📋 Vérification des droits d'accès...")
+        dbs = client.list_database_names()
+
+        if DB_NAME in dbs:
+            print(f"✅ La base de données '{DB_NAME}' existe bien.")
+        else:
+            print(f"⚠️ La base '{DB_NAME}' n'existe pas encore (elle sera créée à la première insertion).")
+            print(f"   -> Bases existantes : {', '.join(dbs)}")
+
+        server_info = client.server_info()
+        version = server_info.get("version")
+        print(f"Version du serveur Atlas : {version}")
+
+    except pymongo.errors.ServerSelectionTimeoutError:
+        print("\n❌ ERREUR DE CONNEXION (Timeout)")
+        print("   -> Causes possibles :")
+        print("      1. Ton adresse IP n'est pas autorisée dans Atlas (Network Access).")
+        print("      2. Le lien MONGO_URI est incorrect (cluster0...).")
+        print("      3. Tu as un pare-feu/VPN qui bloque le port 27017.")
+
+    except pymongo.errors.OperationFailure as e:
+        print(f"\n❌ ERREUR D'AUTHENTIFICATION : {e}")
+        print("   -> Vérifie ton utilisateur et ton mot de passe dans le .env.")
+
+    except Exception as e:
+        print(f"\n❌ ERREUR INCONNUE : {e}")
+
+    finally:
+        if 'client' in locals():
+            client.close()
+        print("--- FIN DU TEST ---")
+    return ok
+
+# SONDE DE CHARGE (--probe)
+
+def percentiles(samples):
+    """Latences en secondes -> p50 / p95 / p99 / moyenne / max en ms"""
+    if not samples:
+        return {"n": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "max_ms": 0.0}
+    ms = np.array(samples) * 1000
+    return {
+        "n": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+def probe_docs(n, seed=42):
+    """n documents au format /coins/markets (champs utiles à la sonde), "id" unique"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    docs = []
+    for i in range(n):
+        price = rng.lognormvariate(0, 3)
+        docs.append({
+            "id": f"probe-{i}",
+            "symbol": f"p{i}",
+            "name": f"Probe {i}",
+            "current_price": price,
+            "market_cap": int(price * rng.randint(10**4, 10**9)),
+            "total_volume": rng.randint(10**3, 10**10),
+            "price_change_percentage_24h": rng.gauss(0, 5),
+            "ingested_at": now,
+        })
+    return docs
+
+def batches(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def probe_ping(client, n):
+    """RTT applicatif : n pings séquentiels (le premier ouvre la connexion, il est écarté)"""
+    client.admin.command("ping")
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        client.admin.command("ping")
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
 
-    server_info = client.server_info()
-    version = server_info.get("version")
-    print(f"Version du serveur Atlas : {version}")
+def probe_writes(col, n, batch_sizes):
+    """Débit insert_many puis bulk_write (upserts sur index unique, comme le clean) par taille de lot"""
+    results = {}
+    for size in batch_sizes:
+        # Collection vidée entre deux tailles (drop + index : plus rapide qu'un delete_many)
+        col.drop()
+        col.create_index("id", unique=True)
+        docs = probe_docs(n)
 
-except pymongo.errors.ServerSelectionTimeoutError:
-    print("\n❌ ERREUR DE CONNEXION (Timeout)")
-    print("   -> Causes possibles :")
-    print("      1. Ton adresse IP n'est pas autorisée dans Atlas (Network Access).")
-    print("      2. Le lien MONGO_URI est incorrect (cluster0...).")
-    print("      3. Tu as un pare-feu/VPN qui bloque le port 27017.")
+        samples = []
+        start = time.perf_counter()
+        for batch in batches(docs, size):
+            t = time.perf_counter()
+            col.insert_many(batch, ordered=False)
+            samples.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        insert = {"docs_per_s": round(n / elapsed, 1), **percentiles(samples)}
 
-except pymongo.errors.OperationFailure as e:
-    print(f"\n❌ ERREUR D'AUTHENTIFICATION : {e}")
-    print("   -> Vérifie ton utilisateur et ton mot de passe dans le .env.")
+        # Mêmes documents : les upserts modifient l'existant (cas courant de l'ETL incrémental)
+        ops = [UpdateOne({"id": d["id"]}, {"$set": {"current_price": d["current_price"] * 1.01,
+                                                    "ingested_at": datetime.now()}}, upsert=True)
+               for d in docs]
+        samples = []
+        start = time.perf_counter()
+        for batch in batches(ops, size):
+            t = time.perf_counter()
+            col.bulk_write(batch, ordered=False)
+            samples.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        bulk = {"docs_per_s": round(n / elapsed, 1), **percentiles(samples)}
 
-except Exception as e:
-    print(f"\n❌ ERREUR INCONNUE : {e}")
+        results[size] = {"insert_many": insert, "bulk_write": bulk}
+        print(f"   lot {size:>6} : insert_many {insert['docs_per_s']:>10,.0f} docs/s, "
+              f"bulk_write {bulk['docs_per_s']:>10,.0f} docs/s")
+    return results
 
-finally:
-    if 'client' in locals():
+def probe_reads(col, ids, n, seed=42):
+    """Lectures ponctuelles sur l'index unique "id" (find_one, comme get_crypto_by_symbol)"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        key = rng.choice(ids)
+        start = time.perf_counter()
+        col.find_one({"id": key}, {"_id": 0, "id": 1, "current_price": 1})
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+def _worker(col, ids, deadline, read_ratio, seed, samples):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        key = rng.choice(ids)
+        start = time.perf_counter()
+        if rng.random() < read_ratio:
+            col.find_one({"id": key}, {"_id": 0, "current_price": 1})
+        else:
+            col.update_one({"id": key}, {"$inc": {"total_volume": 1}})
+        samples.append(time.perf_counter() - start)
+
+def probe_concurrency(uri, db_name, col_name, ids, levels, duration, pool_size, read_ratio):
+    """Workers lecteurs/écrivains de plus en plus nombreux sur un pool de taille fixe.
+
+    Pour chaque palier : débit, latence des opérations et attente d'une connexion du pool
+    (listeners pymongo.monitoring). Un client neuf par palier, métriques remises à zéro.
+    """
+    results = {}
+    for workers in levels:
+        client = create_client("ui", uri=uri, maxPoolSize=pool_size)
+        try:
+            warm_pool(client, min(workers, pool_size))
+            registry.reset() # l'ouverture des connexions n'est pas comptée comme attente
+            col = client[db_name][col_name]
+            per_thread = [[] for _ in range(workers)]
+            deadline = time.perf_counter() + duration
+            threads = [threading.Thread(target=_worker, args=(col, ids, deadline, read_ratio, i, per_thread[i]))
+                       for i in range(workers)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            client.close()
+
+        samples = [s for thread_samples in per_thread for s in thread_samples]
+        pool = pool_report("ui")
+        results[workers] = {
+            "ops_per_s": round(len(samples) / elapsed, 1),
+            "ops": percentiles(samples),
+            "checkout_wait": pool,
+        }
+        print(f"   {workers:>3} workers : {results[workers]['ops_per_s']:>9,.0f} ops/s, "
+              f"p99 op {results[workers]['ops']['p99_ms']:>8.2f} ms, p99 attente pool {pool['p99_ms']:>8.2f} ms")
+    return results
+
+def find_knee(concurrency):
+    """Premier palier où l'attente du pool explose, et palier au meilleur débit avant celui-ci"""
+    knee = None
+    best = None
+    for workers, level in sorted(concurrency.items()):
+        if level["checkout_wait"]["p99_ms"] > WAIT_EXPLOSION_MS:
+            knee = workers
+            break
+        if best is None or level["ops_per_s"] > concurrency[best]["ops_per_s"]:
+            best = workers
+    return knee, best
+
+def print_probe_report(report):
+    print(f"\n📊 Sonde de charge ({report['created_at']}, compression : {report['compressors'] or 'aucune'})")
+    ping = report["ping"]
+    print(f"🏓 Ping : p50 {ping['p50_ms']:.2f} ms · p95 {ping['p95_ms']:.2f} ms · p99 {ping['p99_ms']:.2f} ms")
+
+    print(f"\n{'lot':>8}{'insert docs/s':>16}{'p99 lot ms':>12}{'bulk docs/s':>16}{'p99 lot ms':>12}")
+    for size, w in report["writes"].items():
+        print(f"{size:>8}{w['insert_many']['docs_per_s']:>16,.0f}{w['insert_many']['p99_ms']:>12.1f}"
+              f"{w['bulk_write']['docs_per_s']:>16,.0f}{w['bulk_write']['p99_ms']:>12.1f}")
+    best_batch = max(report["writes"], key=lambda s: report["writes"][s]["bulk_write"]["docs_per_s"])
+    print(f"   -> meilleur débit bulk_write avec des lots de {best_batch}")
+
+    reads = report["reads"]
+    print(f"\n🔎 Lecture ponctuelle indexée : p50 {reads['p50_ms']:.2f} ms · p95 {reads['p95_ms']:.2f} ms · "
+          f"p99 {reads['p99_ms']:.2f} ms")
+
+    pool_size = report["pool_size"]
+    print(f"\n{'workers':>8}{'ops/s':>12}{'p50 op ms':>11}{'p99 op ms':>11}{'p99 attente ms':>16}  (maxPoolSize={pool_size})")
+    for workers, level in report["concurrency"].items():
+        print(f"{workers:>8}{level['ops_per_s']:>12,.0f}{level['ops']['p50_ms']:>11.2f}"
+              f"{level['ops']['p99_ms']:>11.2f}{level['checkout_wait']['p99_ms']:>16.2f}")
+    knee, best = report["knee"], report["best_workers"]
+    if knee:
+        print(f"   -> l'attente du pool explose à {knee} workers (p99 > {WAIT_EXPLOSION_MS:.0f} ms)")
+    else:
+        print(f"   -> pas d'explosion de l'attente du pool jusqu'à {max(report['concurrency'])} workers")
+    if best:
+        print(f"   -> meilleur débit sans file d'attente : {best} workers "
+              f"({report['concurrency'][best]['ops_per_s']:,.0f} ops/s)")
+
+def run_probe(args):
+    pool_size = args.pool_size or WORKLOADS["ui"]["maxPoolSize"]
+    col_name = f"probe_{os.getpid()}_{int(time.time())}"
+    client = create_client("ui", uri=MONGO_URI)
+    col = client[args.db][col_name]
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "db": args.db,
+        "compressors": available_compressors(),
+        "pool_size": pool_size,
+    }
+    print(f"\n--- 🚦 SONDE DE CHARGE ({args.db}.{col_name}, supprimée à la fin) ---")
+    try:
+        print(f"🏓 {args.pings} pings...")
+        report["ping"] = probe_ping(client, args.pings)
+
+        print(f"✍️  Écritures de {args.docs} documents par taille de lot...")
+        report["writes"] = probe_writes(col, args.docs, args.batch_sizes)
+
+        ids = [d["id"] for d in col.find({}, {"_id": 0, "id": 1})]
+        print(f"🔎 {args.reads} lectures ponctuelles...")
+        report["reads"] = probe_reads(col, ids, args.reads)
+
+        print(f"🧵 Concurrence ({args.duration:.0f}s par palier, {args.read_ratio:.0%} de lectures)...")
+        report["concurrency"] = probe_concurrency(MONGO_URI, args.db, col_name, ids,
+                                                  args.workers, args.duration, pool_size, args.read_ratio)
+        report["knee"], report["best_workers"] = find_knee(report["concurrency"])
+    finally:
+        col.drop()
         client.close()
-    print("--- FIN DU TEST ---")
\ No newline at end of file
+        print(f"🧹 Collection {col_name} supprimée.")
+
+    print_probe_report(report)
+    out = args.out or f"probe_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Rapport écrit dans {out}")
+    return report
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diagnostic de connexion MongoDB (et sonde de charge avec --probe)")
+    parser.add_argument("--probe", action="store_true", help="Mesurer latences et débits sur une collection jetable")
+    parser.add_argument("--uri", help="URI à sonder (défaut : MONGO_URI)")
+    parser.add_argument("--db", default=PROBE_DB, help="Base de la collection jetable")
+    parser.add_argument("--pings", type=int, default=200, help="Pings pour la distribution du RTT")
+    parser.add_argument("--docs", type=int, default=20_000, help="Documents écrits par taille de lot")
+    parser.add_argument("--batch-sizes", type=int_list, default=[100, 1000, 5000], help="Tailles de lot (ex : 100,1000,5000)")
+    parser.add_argument("--reads", type=int, default=2_000, help="Lectures ponctuelles")
+    parser.add_argument("--workers", type=int_list, default=[1, 2, 4, 8, 16, 32, 64], help="Paliers de workers concurrents")
+    parser.add_argument("--duration", type=float, default=5.0, help="Durée de chaque palier en secondes")
+    parser.add_argument("--pool-size", type=int, help="maxPoolSize sondé (défaut : profil ui)")
+    parser.add_argument("--read-ratio", type=float, default=0.8, help="Part de lectures des workers")
+    parser.add_argument("--out", help="Fichier JSON du rapport (défaut : probe_<date>.json)")
+    args = parser.parse_args()
+
+    if args.uri:
+        MONGO_URI = args.uri
+    if diagnose() and args.probe:
+        run_probe(args)
@@ -0,0 +1,231 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from read_cache import get_version
+from crypto_queries import FRAME_SCHEMA, MODIFIED_FIELD
+
+# Snapshots colonnes des collections propres, écrits par les scripts de clean :
+# <base>.<collection>-v<version>.arrow (Arrow IPC non compressé, lisible en mmap sans copie)
+# + <base>.<collection>.json (manifeste : version, heure serveur, lignes), et en option un .parquet.
+# Les dashboards partent du snapshot puis ne relisent dans MongoDB que les documents
+# modifiés depuis (champ MODIFIED_FIELD, posé par les écritures des dashboards).
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots"))
+PARQUET = os.getenv("SNAPSHOT_PARQUET", "0") == "1" # copie Parquet pour les outils externes
+KEEP = 2           # versions conservées sur disque (un dashboard peut encore lire l'avant-dernière)
+BATCH_SIZE = 10_000
+# Marge sur l'heure du snapshot : les dates posées par les clients peuvent être décalées
+CLOCK_SKEW = timedelta(seconds=int(os.getenv("SNAPSHOT_CLOCK_SKEW", "60")))
+
+# Colonnes typées par collection (_id en texte, comme dans les DataFrames des dashboards).
+# market_cap_clean : le schéma des pages lues dans MongoDB, pour que get_data renvoie les mêmes
+# types (market_cap int64, catégorie / tendance en dictionnaire) avec ou sans snapshot.
+SCHEMAS = {
+    "market_cap_clean": FRAME_SCHEMA,
+    "memes_clean": pa.schema([
+        ("_id", pa.string()),
+        ("id_original", pa.string()),
+        ("titre", pa.string()),
+        ("url_image", pa.string()),
+        ("largeur", pa.int64()),
+        ("hauteur", pa.int64()),
+        ("nb_zones_texte", pa.int64()),
+        ("format", pa.string()),
+        ("ratio", pa.float64()),
+    ]),
+}
+
+def now():
+    """Date de modification d'un document (UTC)"""
+    return datetime.now(timezone.utc)
+
+def _manifest_path(name):
+    return os.path.join(SNAPSHOT_DIR, f"{name}.json")
+
+def read_manifest(name):
+    try:
+        with open(_manifest_path(name), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _encode(values, value_type, dictionary):
+    """Colonne dictionnaire dont le dictionnaire prolonge celui des lots précédents.
+
+    Un fichier IPC n'accepte qu'un dictionnaire par colonne : les nouvelles valeurs sont
+    ajoutées à la fin (delta), les indices déjà émis restent valables.
+    """
+    index = dictionary.setdefault("index", {})
+    known = dictionary.setdefault("values", [])
+    indices = []
+    for value in values:
+        if value is None:
+            indices.append(None)
+            continue
+        i = index.get(value)
+        if i is None:
+            i = index[value] = len(known)
+            known.append(value)
+        indices.append(i)
+    return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(known, value_type))
+
+def _to_batch(docs, schema, dictionaries=None):
+    # dictionaries : état des colonnes dictionnaire partagé par les lots d'un même fichier
+    dictionaries = {} if dictionaries is None else dictionaries
+    arrays = []
+    for field in schema:
+        if field.name == "_id":
+            values = [str(d["_id"]) for d in docs]
+        else:
+            values = [d.get(field.name) for d in docs]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(_encode(values, field.type.value_type, dictionaries.setdefault(field.name, {})))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def write_snapshot(collection, batch_size=BATCH_SIZE):
+    """Écrit le snapshot de la collection (lecture par lots) ; renvoie le manifeste"""
+    name = collection.full_name
+    schema = SCHEMAS[collection.name]
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+    # Version et heure serveur lues avant la lecture : une écriture concurrente sera relue en delta
+    version = get_version(collection, fresh=True)
+    taken_at = collection.database.command("hello")["localTime"].replace(tzinfo=timezone.utc)
+
+    filename = f"{name}-v{version}.arrow"
+    path = os.path.join(SNAPSHOT_DIR, filename)
+    projection = {field: 1 for field in schema.names}
+    rows = 0
+    batch = []
+    dictionaries = {}
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    with pa.OSFile(path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+        for doc in collection.find({}, projection, batch_size=batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                writer.write_batch(_to_batch(batch, schema, dictionaries))
+                rows += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(_to_batch(batch, schema, dictionaries))
+            rows += len(batch)
+    os.replace(path + ".tmp", path)
+
+    if PARQUET:
+        with pa.memory_map(path) as source:
+            pq.write_table(pa.ipc.open_file(source).read_all(), path.replace(".arrow", ".parquet"))
+
+    manifest = {"collection": name, "version": version, "taken_at": taken_at.isoformat(),
+                "rows": rows, "file": filename, "written_at": datetime.now().isoformat(timespec="seconds")}
+    with open(_manifest_path(name) + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(_manifest_path(name) + ".tmp", _manifest_path(name))
+    _prune(name, version)
+    return manifest
+
+def _prune(name, version):
+    versions = []
+    for filename in os.listdir(SNAPSHOT_DIR):
+        if filename.startswith(f"{name}-v") and filename.endswith(".arrow"):
+            versions.append(int(filename[len(name) + 2:-len(".arrow")]))
+    for old in sorted(v for v in versions if v != version)[:-KEEP + 1 or None]:
+        for ext in (".arrow", ".parquet"):
+            try:
+                os.remove(os.path.join(SNAPSHOT_DIR, f"{name}-v{old}{ext}"))
+            except OSError:
+                pass
+
+def drop_snapshot(name):
+    """Retire le manifeste (snapshot périmé) : les dashboards relisent MongoDB.
+
+    À appeler avant de réécrire la collection : ses documents ne portent pas MODIFIED_FIELD.
+    """
+    try:
+        os.remove(_manifest_path(name))
+    except OSError:
+        pass
+
+def save_snapshot(collection):
+    """write_snapshot pour les scripts de clean : un échec retire l'ancien snapshot au lieu de lever"""
+    try:
+        return write_snapshot(collection)
+    except Exception as e:
+        print(f"⚠️ Snapshot de '{collection.name}' impossible, les dashboards liront MongoDB : {e}")
+        drop_snapshot(collection.full_name)
+        return None
+
+def read_snapshot(name, columns=None):
+    """(DataFrame, manifeste) depuis le fichier Arrow en mmap, réduit aux colonnes demandées.
+
+    Colonnes pandas adossées à Arrow : les valeurs restent dans la page mappée (pas de copie).
+    """
+    manifest = read_manifest(name)
+    if manifest is None:
+        return None, None
+    try:
+        with pa.memory_map(os.path.join(SNAPSHOT_DIR, manifest["file"])) as source:
+            table = pa.ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None, None
+    # Snapshot écrit avec un ancien schéma : ignoré jusqu'au prochain clean (lecture MongoDB)
+    if not table.schema.equals(SCHEMAS[name.split(".", 1)[1]]):
+        return None, None
+    if columns:
+        table = table.select(columns)
+    return table.to_pandas(types_mapper=pd.ArrowDtype), manifest
+
+def changes_since(collection, manifest, columns):
+    """Documents modifiés depuis le snapshot, au même format que celui-ci"""
+    schema = SCHEMAS[collection.name]
+    since = datetime.fromisoformat(manifest["taken_at"]) - CLOCK_SKEW
+    docs = list(collection.find({MODIFIED_FIELD: {"$gte": since}}, {field: 1 for field in schema.names}))
+    table = pa.Table.from_batches([_to_batch(docs, schema)], schema=schema)
+    if columns:
+        table = table.select(columns)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def build_frame(collection, columns=None):
+    """Snapshot + documents modifiés depuis sa version (et sans les documents supprimés)"""
+    frame, manifest = read_snapshot(collection.full_name, columns)
+    if frame is None:
+        return None
+    if manifest["version"] == get_version(collection):
+        return frame
+
+    changed = changes_since(collection, manifest, columns)
+    kept = frame[~frame["_id"].isin(changed["_id"])]
+    frame = pd.concat([kept, changed], ignore_index=True) if len(changed) else kept.reset_index(drop=True)
+
+    # Suppressions : la version n'a bougé que par des écritures des dashboards / de l'agent
+    # (un clean retire le snapshot). Le compte ne suffit pas (une suppression + une création
+    # dans le même tour le laissent inchangé) : on relit toujours les _id (projection minimale).
+    alive = [str(d["_id"]) for d in collection.find({}, {"_id": 1})]
+    return frame[frame["_id"].isin(alive)].reset_index(drop=True)
+
+_lock = threading.Lock()
+_frames = {} # (collection, colonnes) -> (version, DataFrame) : seule la dernière version est gardée
+
+def load_frame(collection, columns=None, prepare=None):
+    """DataFrame de toute la collection pour la version courante, ou None sans snapshot.
+
+    prepare(frame) (tri, colonnes calculées...) n'est appliqué qu'une fois par version.
+    """
+    key = (collection.full_name, tuple(columns or ()))
+    version = get_version(collection)
+    with _lock:
+        cached = _frames.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    frame = build_frame(collection, columns)
+    if frame is not None and prepare is not None:
+        frame = prepare(frame)
+    with _lock:
+        _frames[key] = (version, frame)
+    return frame
@@ -1,51 +1,254 @@
 import os
-from pymongo import MongoClient
+import sys
+import time
+from datetime import datetime
+from pymongo.errors import PyMongoError
 from neo4j import GraphDatabase
+from neo4j.exceptions import Neo4jError, ServiceUnavailable, SessionExpired
 from dotenv import load_dotenv
+from mongo_client import get_client
 
 load_dotenv()
 
-# 1. Connexion MongoDB
-mongo_client = MongoClient(os.getenv("MONGO_URI"))
-db_mongo = mongo_client["crypto_data"] # Vérifie le nom de ta db
-col_clean = db_mongo["market_cap_clean"]
+# Aucune connexion à l'import : le module est aussi importé par le pipeline et le bench
 
-# 2. Connexion Neo4j
+# 1. MongoDB (client partagé du profil "etl")
+DB_NAME = "crypto_data" # Vérifie le nom de ta db
+SYNC_STATE_ID = "neo4j_market_cap_clean"
+
+def get_collections(client=None):
+    """(market_cap_clean, sync_state) ; sync_state garde le resume token du mode --watch"""
+    db_mongo = (client or get_client("etl"))[DB_NAME]
+    return db_mongo["market_cap_clean"], db_mongo["sync_state"]
+
+# 2. Neo4j
 neo4j_uri = os.getenv("NEO4J_URI") # URL neo4j+s://...
 neo4j_user = "neo4j"
 neo4j_password = os.getenv("NEO4J_PASSWORD")
 
-driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+def get_driver():
+    return GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+
+# Nombre de cryptos envoyées par transaction
+BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", "1000"))
+
+# Mode --watch : attente avant de reprendre après une erreur, doublée à chaque échec
+RETRY_DELAY = 5
+MAX_RETRY_DELAY = 300
+
+# Contraintes d'unicité : les MERGE s'appuient sur l'index associé
+CONSTRAINTS = [
+    "CREATE CONSTRAINT crypto_symbole IF NOT EXISTS FOR (c:Crypto) REQUIRE c.symbole IS UNIQUE",
+    "CREATE CONSTRAINT categorie_nom IF NOT EXISTS FOR (cat:Categorie) REQUIRE cat.nom IS UNIQUE",
+    "CREATE CONSTRAINT tendance_type IF NOT EXISTS FOR (t:Tendance) REQUIRE t.type IS UNIQUE",
+    # Les suppressions du change stream ne donnent que l'_id MongoDB
+    "CREATE INDEX crypto_mongo_id IF NOT EXISTS FOR (c:Crypto) ON (c.mongo_id)",
+]
+
+# Un seul aller-retour par lot : UNWIND sur la liste des cryptos.
+# Les liens vers une ancienne catégorie / tendance sont supprimés (re-liaison).
+UPSERT_QUERY = """
+UNWIND $rows AS row
+MERGE (c:Crypto {symbole: row.symbole})
+SET c.nom = row.nom, c.prix = row.prix, c.mongo_id = row.mongo_id
+
+WITH c, row
+OPTIONAL MATCH (c)-[old_cat:APPARTIENT_A]->(ancienne:Categorie)
+WHERE ancienne.nom <> row.categorie
+DELETE old_cat
+
+WITH DISTINCT c, row
+OPTIONAL MATCH (c)-[old_t:A_POUR_ETAT]->(ancien:Tendance)
+WHERE ancien.type <> row.tendance
+DELETE old_t
+
+WITH DISTINCT c, row
+MERGE (cat:Categorie {nom: row.categorie})
+MERGE (c)-[:APPARTIENT_A]->(cat)
+
+MERGE (t:Tendance {type: row.tendance})
+MERGE (c)-[:A_POUR_ETAT]->(t)
+"""
+
+DELETE_QUERY = """
+UNWIND $ids AS mongo_id
+MATCH (c:Crypto {mongo_id: mongo_id})
+DETACH DELETE c
+"""
+
+PRUNE_QUERY = """
+MATCH (c:Crypto)
+WHERE NOT c.symbole IN $symboles
+DETACH DELETE c
+"""
+
+def to_row(coin):
+    """Document MongoDB -> paramètres Cypher"""
+    return {
+        "mongo_id": str(coin["_id"]),
+        "symbole": coin["symbole"],
+        "nom": coin["nom"],
+        "prix": coin["prix_usd"],
+        "categorie": coin["categorie"],
+        "tendance": coin["tendance"],
+    }
+
+def create_constraints(session):
+    for query in CONSTRAINTS:
+        session.run(query)
+
+def upsert_rows(tx, rows):
+    tx.run(UPSERT_QUERY, rows=rows).consume()
+
+def delete_ids(tx, ids):
+    tx.run(DELETE_QUERY, ids=ids).consume()
+
+def prune_missing(tx, symboles):
+    tx.run(PRUNE_QUERY, symboles=symboles).consume()
+
+def sync_data(batch_size=BATCH_SIZE, client=None, driver=None, collection=None, timings=None):
+    """market_cap_clean -> graphe ; renvoie le nombre de cryptos écrites.
+
+    collection : autre source que crypto_data.market_cap_clean (bench).
+    timings : liste complétée par la durée de chaque lot écrit.
+    """
+    col_clean = collection if collection is not None else get_collections(client)[0]
+    own_driver = driver is None
+    driver = driver or get_driver()
+    start = time.perf_counter()
+    projection = {"symbole": 1, "nom": 1, "prix_usd": 1, "categorie": 1, "tendance": 1}
+    nb_rows = 0
+    symboles = []
 
-def sync_data():
-    data = list(col_clean.find())
-    
     with driver.session() as session:
-        # On nettoie le graphe avant de remplir pour éviter les doublons
-        session.run("MATCH (n) DETACH DELETE n")
-        
-        for coin in data:
-            # Requête Cypher pour créer les nœuds et les liens
-            query = """
-            MERGE (c:Crypto {symbole: $symbole})
-            SET c.nom = $nom, c.prix = $prix
-            
-            MERGE (cat:Categorie {nom: $categorie})
-            MERGE (c)-[:APPARTIENT_A]->(cat)
-            
-            MERGE (t:Tendance {type: $tendance})
-            MERGE (c)-[:A_POUR_ETAT]->(t)
-            """
-            session.run(query, 
-                symbole=coin["symbole"],
-                nom=coin["nom"],
-                prix=coin["prix_usd"],
-                categorie=coin["categorie"],
-                tendance=coin["tendance"]
-            )
-            
-    print(f"✅ {len(data)} cryptos synchronisées vers Neo4j !")
+        create_constraints(session)
+
+        def write(batch):
+            batch_start = time.perf_counter()
+            session.execute_write(upsert_rows, batch)
+            if timings is not None:
+                timings.append(time.perf_counter() - batch_start)
+
+        batch = []
+        for coin in col_clean.find({}, projection, batch_size=batch_size):
+            batch.append(to_row(coin))
+            symboles.append(coin["symbole"])
+            if len(batch) >= batch_size:
+                write(batch)
+                nb_rows += len(batch)
+                batch = []
+        if batch:
+            write(batch)
+            nb_rows += len(batch)
+
+        # Plus de "MATCH (n) DETACH DELETE n" : on retire seulement les cryptos disparues
+        session.execute_write(prune_missing, symboles)
+
+    if own_driver:
+        driver.close()
+    elapsed = time.perf_counter() - start
+    print(f"✅ {nb_rows} cryptos synchronisées vers Neo4j en {elapsed:.2f}s "
+          f"({nb_rows / elapsed:.0f} lignes/s, lots de {batch_size}) !")
+    return nb_rows
+
+# MODE CONTINU (change stream)
+
+def load_resume_token(col_sync_state):
+    doc = col_sync_state.find_one({"_id": SYNC_STATE_ID}) or {}
+    return doc.get("resume_token")
+
+def save_resume_token(col_sync_state, token):
+    col_sync_state.update_one(
+        {"_id": SYNC_STATE_ID},
+        {"$set": {"resume_token": token, "updated_at": datetime.now()}},
+        upsert=True
+    )
+
+def apply_changes(tx, upserts, deletes):
+    if deletes:
+        delete_ids(tx, deletes)
+    if upserts:
+        upsert_rows(tx, upserts)
+
+def flush(session, pending):
+    """Applique un micro-lot : un seul événement par document (le dernier gagne)"""
+    upserts = [to_row(doc) for doc in pending.values() if doc is not None]
+    deletes = [str(_id) for _id, doc in pending.items() if doc is None]
+    session.execute_write(apply_changes, upserts, deletes)
+    print(f"🔄 {len(upserts)} upsert(s), {len(deletes)} suppression(s) appliqués à Neo4j.")
+
+def watch_changes(batch_size=BATCH_SIZE, max_wait=1.0, client=None, driver=None):
+    """Suit market_cap_clean en continu et répercute les changements sur le graphe.
+
+    Nécessite un replica set (Atlas, ou mongod local lancé avec --replSet).
+    """
+    col_clean, col_sync_state = get_collections(client)
+    driver = driver or get_driver() # boucle sans fin : fermé avec le process
+    token = load_resume_token(col_sync_state)
+    delay = RETRY_DELAY
+    print("👀 Écoute des changements sur 'market_cap_clean'... (Ctrl+C pour arrêter)")
+
+    while True:
+        try:
+            # Session rouverte à chaque reprise : celle d'avant peut être morte avec le serveur
+            with driver.session() as session:
+                create_constraints(session)
+                with col_clean.watch(full_document="updateLookup", resume_after=token,
+                                     max_await_time_ms=int(max_wait * 1000)) as stream:
+                    if token is None:
+                        # Pas de point de reprise : synchro complète une fois le stream ouvert
+                        # (les changements concurrents seront rejoués, les MERGE sont idempotents)
+                        sync_data(batch_size, client, driver)
+                        token = stream.resume_token
+                        save_resume_token(col_sync_state, token)
+                        delay = RETRY_DELAY
+
+                    pending = {}
+                    deadline = None
+                    while stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            op = change["operationType"]
+                            if op in ("drop", "rename", "dropDatabase", "invalidate"):
+                                # Collection remplacée (clean en mode --full) : on resynchronise
+                                token = None
+                                break
+                            doc_id = change["documentKey"]["_id"]
+                            pending[doc_id] = None if op == "delete" else change.get("fullDocument")
+                            deadline = deadline or time.monotonic() + max_wait
+
+                        if pending and (len(pending) >= batch_size or time.monotonic() >= deadline):
+                            flush(session, pending)
+                            token = stream.resume_token
+                            save_resume_token(col_sync_state, token)
+                            delay = RETRY_DELAY
+                            pending = {}
+                            deadline = None
+
+                    if pending and token is not None:
+                        flush(session, pending)
+                        token = stream.resume_token
+                        save_resume_token(col_sync_state, token)
+
+        except (PyMongoError, Neo4jError, ServiceUnavailable, SessionExpired) as e:
+            # MongoDB ou Neo4j indisponible : on attend (de plus en plus longtemps)
+            # puis on repart du dernier point de reprise sauvegardé, le micro-lot en cours est rejoué
+            print(f"❌ Erreur de synchronisation : {e} (nouvelle tentative dans {delay:.0f}s)")
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+            try:
+                token = load_resume_token(col_sync_state)
+            except PyMongoError:
+                pass # MongoDB toujours absent : le token en mémoire est le dernier sauvegardé
 
 if __name__ == "__main__":
-    sync_data()
-    driver.close()
\ No newline at end of file
+    driver = get_driver()
+    try:
+        if "--watch" in sys.argv:
+            watch_changes(driver=driver)
+        else:
+            sync_data(driver=driver)
+    except KeyboardInterrupt:
+        print("👋 Arrêt de la synchronisation.")
+    finally:
+        driver.close()
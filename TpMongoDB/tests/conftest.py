@@ -0,0 +1,21 @@
+import os
+import sys
+import mongomock
+import pytest
+
+# Les tests importent les modules partagés comme les scripts (racine du projet dans le path)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "scripts")]
+
+import read_cache
+
+@pytest.fixture(autouse=True)
+def fresh_read_cache():
+    """Chaque test repart d'un cache de lecture vide (les versions recommencent à 0 dans mongomock)"""
+    read_cache._entries.clear()
+    read_cache._versions.clear()
+    yield
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()["tests"]
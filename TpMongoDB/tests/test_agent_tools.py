@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+import pytest
+from pymongo.errors import BulkWriteError
+from crypto_queries import agent_limit, top_movers, AGENT_MAX_RESULTS
+from crypto_writes import execute_batch
+
+@pytest.mark.parametrize("limit, expected", [
+    (5, 5), ("3", 3), (0, 1), (-4, 1), (10_000, AGENT_MAX_RESULTS), (2.9, 2),
+])
+def test_agent_limit_is_clamped(limit, expected):
+    assert agent_limit(limit) == expected
+
+@pytest.mark.parametrize("limit", ["beaucoup", None, [3], True])
+def test_agent_limit_rejects_non_numbers(limit):
+    with pytest.raises((TypeError, ValueError)):
+        agent_limit(limit)
+
+def test_top_movers_never_dumps_the_collection(db):
+    col = db["market_cap_clean"]
+    col.insert_many({"nom": f"C{i}", "symbole": f"C{i}", "variation_24h": i} for i in range(50))
+    assert len(top_movers(col, "hausse", 0)) == 1
+    assert len(top_movers(col, "hausse", 500)) == AGENT_MAX_RESULTS
+
+def test_malformed_write_arguments_are_reported_not_raised(db):
+    calls = [
+        ("c1", "create_crypto", {"nom": "X"}),                                   # clés manquantes
+        ("c2", "create_crypto", {"nom": "Y", "symbole": "Y", "prix": "cher", "categorie": "Altcoin"}),
+        ("c3", "create_cryptos", {"cryptos": 12}),                               # pas une liste
+        ("c4", "update_cryptos_by_symbol", {"cryptos": ["BTC"]}),                # éléments qui ne sont pas des objets
+    ]
+    results, written, deleted = execute_batch(None, db["market_cap_clean"], calls)
+
+    assert results["c1"][0]["statut"].startswith("argument manquant")
+    for call_id in ("c2", "c3", "c4"):
+        assert results[call_id][0]["statut"].startswith("argument invalide")
+    assert written == deleted == set()
+
+def test_standalone_server_writes_without_transaction():
+    # hello d'un mongod standalone : ni setName ni mongos -> pas de session ni de transaction
+    client = SimpleNamespace(admin=SimpleNamespace(command=lambda name: {"isWritablePrimary": True}))
+    bulk_calls = []
+
+    def bulk_write(ops, ordered=True, session=None):
+        bulk_calls.append((len(ops), ordered, session))
+        # Non ordonné : la 2e opération échoue, la 1re (upsert) est appliquée
+        raise BulkWriteError({"upserted": [{"index": 0, "_id": 1}],
+                              "writeErrors": [{"index": 1, "errmsg": "document invalide"}]})
+
+    collection = SimpleNamespace(
+        find=lambda query, projection, session=None: [{"nom": "Bitcoin", "symbole": "BTC"}],
+        bulk_write=bulk_write,
+    )
+    calls = [
+        ("c1", "create_crypto", {"nom": "Nouveau", "symbole": "new", "prix": 2, "categorie": "Altcoin"}),
+        ("c2", "update_crypto_by_symbol", {"symbole": "btc", "prix": "3.5"}),
+    ]
+    results, written, deleted = execute_batch(client, collection, calls)
+
+    assert bulk_calls == [(2, False, None)]
+    assert results["c1"][0]["statut"] == "créé"
+    assert results["c2"][0]["statut"] == "échec : document invalide"
+    assert all(r[0]["transaction"].startswith("non") for r in results.values())
+    assert written == {"NEW"} and deleted == set()
@@ -0,0 +1,80 @@
+import clean_crypto
+import clean_memes
+
+# Parité des trois transformations (document par document, par lots en colonnes, pipeline d'agrégation).
+# Le pipeline est exécuté par mongomock : ses opérateurs ($floor, $add...) font les mêmes opérations
+# flottantes que le serveur, c'est la traduction des règles qui est vérifiée ici.
+
+RAW_COINS = [
+    {"name": "Bitcoin", "symbol": "btc", "current_price": 64000.125, "market_cap": 1_260_000_000_000,
+     "market_cap_rank": 1, "price_change_percentage_24h": 2.675, "image": "https://example.com/btc.png"},
+    {"name": "Bitcoin Wrapped", "symbol": "BTC", "current_price": 64001, "market_cap": 10_000_000,
+     "market_cap_rank": 15, "price_change_percentage_24h": 1.0, "image": None}, # doublon moins bien classé
+    {"name": "Unranked Ten", "symbol": "TEN", "current_price": 3, "market_cap": 1,
+     "market_cap_rank": None, "price_change_percentage_24h": 5, "image": None}, # sans rang : perd le doublon
+    {"name": "Tenth", "symbol": "ten", "current_price": 1.005, "market_cap": 10**9,
+     "market_cap_rank": 10, "price_change_percentage_24h": -0.125, "image": "https://example.com/ten.png"},
+    {"name": "Eleventh", "symbol": "elv", "current_price": 0.125, "market_cap": None,
+     "market_cap_rank": 11, "price_change_percentage_24h": None, "image": "https://example.com/elv.png"},
+    {"name": None, "symbol": "anon", "current_price": None, "market_cap": 12_345,
+     "market_cap_rank": 12, "price_change_percentage_24h": 0, "image": None},
+    {"name": "Half", "symbol": "hlf", "current_price": 2.675, "market_cap": 99,
+     "market_cap_rank": 13, "price_change_percentage_24h": -2.675, "image": "https://example.com/hlf.png"},
+]
+
+RAW_MEMES = [
+    {"id": "1", "name": "Square", "url": "https://i.imgflip.com/1.jpg", "width": 500, "height": 500, "box_count": 2},
+    {"id": "2", "name": "Wide", "url": "https://i.imgflip.com/2.jpg", "width": 1200, "height": 675, "box_count": 3},
+    {"id": "3", "name": "Tall", "url": "https://i.imgflip.com/3.jpg", "width": 600, "height": 1067, "box_count": 1},
+    {"id": "4", "name": "Limit", "url": "https://i.imgflip.com/4.jpg", "width": 110, "height": 100, "box_count": None},
+    {"id": "5", "name": "No width", "url": "https://i.imgflip.com/5.jpg", "width": None, "height": 8, "box_count": 2},
+    {"id": "6", "name": "Half", "url": "https://i.imgflip.com/6.jpg", "width": 1, "height": 8, "box_count": 2},
+]
+
+def without_id(doc):
+    return {k: v for k, v in doc.items() if k != "_id"}
+
+def test_crypto_transforms_agree(db):
+    raw = db["market_cap_raw"]
+    raw.insert_many([dict(coin) for coin in RAW_COINS])
+
+    python_docs = {d["symbole"]: without_id(d) for d in clean_crypto.read_clean_data(raw)}
+    batched_docs = clean_crypto.batched_clean_data(raw, batch_size=2) # doublon dans un autre lot
+    pipeline_docs = {d["symbole"]: d for d in raw.aggregate(clean_crypto.transform_pipeline())}
+
+    assert len(python_docs) == 5
+    assert python_docs == batched_docs == pipeline_docs
+    assert python_docs["BTC"]["nom"] == "Bitcoin" and python_docs["TEN"]["nom"] == "Tenth"
+    assert python_docs["TEN"]["categorie"] == "Top 10" and python_docs["ELV"]["categorie"] == "Altcoin"
+    assert python_docs["HLF"]["empreinte"] == clean_crypto.fingerprint(python_docs["HLF"])
+
+def test_crypto_batched_load_matches_the_loop(db):
+    db["market_cap_raw"].insert_many([dict(coin) for coin in RAW_COINS])
+    stats = clean_crypto.load_batched(db, batch_size=2)
+
+    loaded = {d["symbole"]: without_id(d) for d in db["market_cap_clean"].find()}
+    assert stats["inserted"] == len(loaded) == 5
+    assert loaded == {d["symbole"]: without_id(d) for d in clean_crypto.read_clean_data(db["market_cap_raw"])}
+
+def test_meme_transforms_agree(db):
+    raw = db["memes_top_100"]
+    raw.insert_many([dict(meme) for meme in RAW_MEMES])
+
+    python_docs = [clean_memes.transform_meme(meme) for meme in RAW_MEMES]
+    batched_docs = clean_memes.transform_batch(RAW_MEMES)
+    pipeline_docs = sorted(raw.aggregate(clean_memes.transform_pipeline()), key=lambda d: d["id_original"])
+
+    assert python_docs == batched_docs == pipeline_docs
+    assert [d["format"] for d in python_docs] == [
+        "Carré (Insta)", "Paysage (YouTube)", "Portrait (TikTok)", "Carré (Insta)", "Portrait (TikTok)", "Portrait (TikTok)",
+    ]
+
+def test_batched_loads_keep_the_clean_collections_when_raw_is_empty(db):
+    db["market_cap_clean"].insert_one({"symbole": "BTC"})
+    db["memes_clean"].insert_one({"id_original": "1"})
+
+    assert clean_crypto.load_batched(db)["inserted"] == 0
+    assert clean_memes.load_batched(db) == 0
+    assert db["market_cap_clean"].count_documents({}) == 1
+    assert db["memes_clean"].count_documents({}) == 1
+    assert "market_cap_clean_staging" not in db.list_collection_names()
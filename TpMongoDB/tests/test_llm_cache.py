@@ -0,0 +1,173 @@
+from types import SimpleNamespace
+import pytest
+from llm_cache import LLMCache, StreamedCompletion
+
+MODEL = "llama-3.3-70b-versatile"
+MESSAGES = [{"role": "user", "content": "Top 3 des hausses ?"}]
+TOOL_CALL = {"id": "call_1", "type": "function",
+             "function": {"name": "top_movers", "arguments": '{"direction": "hausse", "limit": 3}'}}
+
+def completion(content, tool_calls=None):
+    return {
+        "id": "cmpl-1", "object": "chat.completion", "created": 0, "model": MODEL,
+        "choices": [{"index": 0, "finish_reason": "tool_calls" if tool_calls else "stop", "logprobs": None,
+                     "message": {"role": "assistant", "content": content, "tool_calls": tool_calls}}],
+        "usage": {"total_tokens": 42},
+    }
+
+def chunk(content=None, tool_calls=None, finish_reason=None):
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)], x_groq=None)
+
+def tool_delta(index, id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+class StubGroq:
+    """Remplace le client Groq : renvoie les réponses prévues et compte les appels"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.responses.pop(0)
+
+@pytest.fixture
+def cache(db):
+    return LLMCache(db["llm_cache"])
+
+def test_make_key_is_stable_and_covers_every_input():
+    key = LLMCache.make_key(MODEL, 0.2, MESSAGES, None)
+    assert key == LLMCache.make_key(MODEL, 0.2, [dict(m) for m in MESSAGES], None)
+    assert key != LLMCache.make_key(MODEL, 0.7, MESSAGES, None)
+    assert key != LLMCache.make_key("autre-modele", 0.2, MESSAGES, None)
+    assert key != LLMCache.make_key(MODEL, 0.2, MESSAGES + [{"role": "user", "content": "et BTC ?"}], None)
+    assert key != LLMCache.make_key(MODEL, 0.2, MESSAGES, [{"type": "function", "function": {"name": "x"}}])
+    assert key != LLMCache.make_key(MODEL, 0.2, MESSAGES, None, tool_choice="none")
+    assert key != LLMCache.make_key(MODEL, 0.2, MESSAGES, None, max_tokens=100)
+    assert key == LLMCache.make_key(MODEL, 0.2, MESSAGES, None, tool_choice=None)
+
+def test_tool_choice_none_does_not_replay_a_tool_call_answer(cache):
+    # Au-delà de MAX_TOOL_ROUNDS l'agent passe à tool_choice="none" : la réponse "auto" ne doit pas resservir
+    client = StubGroq(completion(None, [TOOL_CALL]), completion("Synthèse"))
+    _, from_cache = cache.create(client, model=MODEL, messages=MESSAGES, tool_choice="auto", timeout=10)
+    assert not from_cache
+
+    answer, from_cache = cache.create(client, model=MODEL, messages=MESSAGES, tool_choice="none")
+    assert not from_cache and answer["choices"][0]["message"]["content"] == "Synthèse"
+    # Le délai (transport) ne fait pas partie de la clé
+    _, from_cache = cache.create(client, model=MODEL, messages=MESSAGES, tool_choice="auto")
+    assert from_cache
+
+def test_hit_replays_the_stored_response_without_calling_groq(cache):
+    client = StubGroq(completion("BTC, ETH, SOL"))
+
+    first, from_cache = cache.create(client, model=MODEL, messages=MESSAGES)
+    assert not from_cache and first["choices"][0]["message"]["content"] == "BTC, ETH, SOL"
+
+    second, from_cache = cache.create(client, model=MODEL, messages=MESSAGES)
+    assert from_cache
+    assert second.choices[0].message.content == "BTC, ETH, SOL"
+    assert len(client.calls) == 1
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_tokens"]) == (1, 1, 42)
+    assert stats["hit_rate"] == 0.5
+
+def test_variants_are_collected_then_served_in_rotation(db):
+    cache = LLMCache(db["llm_cache"], variants=2)
+    client = StubGroq(completion("A"), completion("B"))
+
+    answers = [cache.create(client, model=MODEL, messages=MESSAGES) for _ in range(4)]
+    contents = [r["choices"][0]["message"]["content"] if not hit else r.choices[0].message.content
+                for r, hit in answers]
+
+    assert [hit for _, hit in answers] == [False, False, True, True]
+    assert contents[:2] == ["A", "B"]
+    assert sorted(contents[2:]) == ["A", "B"] # chaque variante servie une fois
+    assert len(client.calls) == 2
+
+def test_streamed_tool_calls_are_stored_and_replayed(cache):
+    chunks = [
+        chunk(tool_calls=[tool_delta(0, id="call_1", name="top_movers", arguments='{"direction": ')]),
+        chunk(tool_calls=[tool_delta(0, arguments='"hausse", "limit": 3}')], finish_reason="tool_calls"),
+    ]
+    client = StubGroq(iter(chunks))
+
+    live_calls = []
+    completion_1, from_cache = cache.stream(client, on_tool_call=live_calls.append, model=MODEL, messages=MESSAGES)
+    assert not from_cache
+    list(completion_1)
+    assert live_calls == [TOOL_CALL]
+
+    replayed_calls = []
+    completion_2, from_cache = cache.stream(client, on_tool_call=replayed_calls.append, model=MODEL, messages=MESSAGES)
+    assert from_cache
+    list(completion_2)
+    assert replayed_calls == [TOOL_CALL]
+    assert completion_2.message()["tool_calls"] == [TOOL_CALL]
+    assert len(client.calls) == 1
+
+def test_stats_are_read_once_per_version(cache, monkeypatch):
+    reads = []
+    find_one = cache.stats_col.find_one
+    monkeypatch.setattr(cache.stats_col, "find_one", lambda *a, **k: reads.append(1) or find_one(*a, **k))
+
+    cache.stats()
+    cache.stats() # rerun du dashboard : servi par read_cache
+    assert len(reads) == 1
+
+    cache.create(StubGroq(completion("ok")), model=MODEL, messages=MESSAGES)
+    assert cache.stats()["misses"] == 1 # l'appel a changé la version
+    assert len(reads) == 2
+
+def test_stream_assembles_split_tool_call_deltas():
+    # Nom et arguments découpés sur plusieurs deltas ; l'id n'arrive qu'avec le premier fragment
+    chunks = [
+        chunk(content="Je regarde "),
+        chunk(content="ça."),
+        chunk(tool_calls=[tool_delta(0, id="call_1", name="search_", arguments='{"que')]),
+        chunk(tool_calls=[tool_delta(0, name="crypto", arguments='ry": "bt')]),
+        chunk(tool_calls=[tool_delta(0, arguments='c"}')]),
+        chunk(tool_calls=[tool_delta(1, id="call_2", name="category_stats", arguments="")]),
+        chunk(tool_calls=[tool_delta(1, arguments="{}")]),
+        chunk(finish_reason="tool_calls"),
+    ]
+    emitted = []
+    completion = StreamedCompletion(iter(chunks), on_tool_call=emitted.append)
+    texts = list(completion)
+
+    first, second = emitted
+    assert first == {"id": "call_1", "type": "function",
+                     "function": {"name": "search_crypto", "arguments": '{"query": "btc"}'}}
+    assert second == {"id": "call_2", "type": "function", "function": {"name": "category_stats", "arguments": "{}"}}
+    assert completion.tool_calls == [first, second]
+    assert texts == ["Je regarde ", "ça."] and completion.content == "Je regarde ça."
+    assert completion.finish_reason == "tool_calls"
+    assert completion.message()["tool_calls"] == [first, second]
+    assert completion.first_token_s is not None and completion.total_s >= completion.first_token_s
+
+def test_stream_emits_a_tool_call_as_soon_as_the_next_one_starts():
+    received = []
+    before_end = []
+
+    def chunks():
+        yield chunk(tool_calls=[tool_delta(0, id="call_1", name="top_movers", arguments="{}")])
+        yield chunk(tool_calls=[tool_delta(1, id="call_2", name="category_stats", arguments="{}")])
+        before_end.append([call["id"] for call in received]) # le flux n'est pas encore terminé
+        yield chunk(finish_reason="tool_calls")
+
+    list(StreamedCompletion(chunks(), on_tool_call=received.append))
+    assert before_end == [["call_1"]]
+    assert [call["id"] for call in received] == ["call_1", "call_2"]
+
+def test_latency_keeps_a_window_of_api_calls_only(cache):
+    client = StubGroq(completion("A"))
+    cache.create(client, model=MODEL, messages=MESSAGES)
+    cache.create(client, model=MODEL, messages=MESSAGES) # hit : hors latences de l'API
+
+    latency = cache.latency()
+    assert latency["calls"] == 1
+    assert latency["total_s"] >= latency["first_token_s"] >= 0
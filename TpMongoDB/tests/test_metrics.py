@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+import pytest
+import metrics
+from metrics import CommandMetrics, registry
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    registry.reset()
+    yield
+    registry.reset()
+
+def run(listener, request_id, name, command, ok=True):
+    listener.started(SimpleNamespace(request_id=request_id, command_name=name, command=command))
+    end = SimpleNamespace(request_id=request_id, command_name=name, duration_micros=1500,
+                          reply={"cursor": {"firstBatch": [{}, {}]}})
+    (listener.succeeded if ok else listener.failed)(end)
+
+def test_command_series_are_labelled_by_collection():
+    listener = CommandMetrics("ui")
+    run(listener, 1, "find", {"find": "market_cap_clean", "filter": {}})
+    run(listener, 2, "getMore", {"getMore": 987654, "collection": "market_cap_clean"})
+    run(listener, 3, "ping", {"ping": 1})
+    run(listener, 4, "aggregate", {"aggregate": "memes_clean", "pipeline": []}, ok=False)
+
+    assert registry.histogram("mongo_command_duration_seconds", command="find",
+                              collection="market_cap_clean", client="ui").count == 1
+    assert registry.histogram("mongo_command_duration_seconds", command="getMore",
+                              collection="market_cap_clean", client="ui").count == 1
+    assert registry.histogram("mongo_command_duration_seconds", command="ping", collection="", client="ui").count == 1
+    assert registry.counters[("mongo_command_failures_total",
+                              (("client", "ui"), ("collection", "memes_clean"), ("command", "aggregate")))] == 1
+    assert listener._collections == {} # rien ne reste en attente
+
+def test_reply_bytes_are_not_measured_unless_enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "MEASURE_BYTES", False)
+    run(CommandMetrics("ui"), 1, "find", {"find": "market_cap_clean"})
+    assert not any(name == "mongo_reply_bytes_total" for name, _ in registry.counters)
+
+def test_reply_bytes_when_enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "MEASURE_BYTES", True)
+    run(CommandMetrics("ui"), 1, "find", {"find": "market_cap_clean"})
+    assert any(name == "mongo_reply_bytes_total" for name, _ in registry.counters)
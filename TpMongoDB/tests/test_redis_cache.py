@@ -0,0 +1,127 @@
+import fnmatch
+import pytest
+from redis_cache import CryptoRedisCache
+
+class FakeRedis:
+    """Sous-ensemble de redis.Redis (decode_responses=True) utilisé par CryptoRedisCache, en mémoire"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+        self.fail = False
+
+    def _check(self):
+        if self.fail:
+            raise OSError("connexion refusée")
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = value
+        self.ttl[key] = ex
+
+    def incr(self, key):
+        self._check()
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    def hset(self, key, mapping):
+        self._check()
+        self.data.setdefault(key, {}).update(mapping)
+
+    def hgetall(self, key):
+        self._check()
+        return dict(self.data.get(key, {}))
+
+    def expire(self, key, seconds):
+        self.ttl[key] = seconds
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    unlink = delete
+
+    def scan_iter(self, match="*", count=None):
+        self._check()
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.queued = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.queued.append((name, args, kwargs))
+
+    def execute(self):
+        self.client._check()
+        queued, self.queued = self.queued, []
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in queued]
+
+@pytest.fixture
+def fake():
+    return FakeRedis()
+
+@pytest.fixture
+def cache(fake):
+    return CryptoRedisCache(url=None, client=fake, coin_ttl=300, view_ttl=30)
+
+BTC = {"nom": "Bitcoin", "symbole": "BTC", "prix_usd": 60000.0}
+
+def test_view_miss_then_hit(cache, fake):
+    calls = []
+    loader = lambda: calls.append(1) or [BTC]
+
+    assert cache.read_view({"page": 0}, loader) == [BTC]
+    assert cache.read_view({"page": 0}, loader) == [BTC]
+    assert len(calls) == 1
+    assert cache.stats == {"hits": 1, "misses": 1, "errors": 0}
+    # Les lignes de la vue alimentent aussi les hashes par crypto
+    assert cache.get_coin("btc") == BTC
+    assert fake.ttl["crypto:BTC"] == 300
+
+def test_version_bump_invalidates_views(cache):
+    calls = []
+    loader = lambda: calls.append(1) or [BTC]
+    cache.read_view({"page": 0}, loader)
+    cache.invalidate_views()
+    cache.read_view({"page": 0}, loader)
+    assert len(calls) == 2
+
+def test_set_coin_writes_through_and_invalidates_views(cache):
+    calls = []
+    loader = lambda: calls.append(1) or [BTC]
+    cache.read_view({"page": 0}, loader)
+
+    cache.set_coin({**BTC, "prix_usd": 61000.0})
+    assert cache.get_coin("BTC")["prix_usd"] == 61000.0
+    cache.read_view({"page": 0}, loader)
+    assert len(calls) == 2
+
+    cache.delete_coin("btc")
+    assert cache.get_coin("BTC") is None
+
+def test_invalidate_all_drops_coin_hashes(cache, fake):
+    cache.set_coin(BTC)
+    cache.set_coin({"nom": "Ether", "symbole": "ETH", "prix_usd": 3000.0})
+    version = fake.get("crypto:views:version")
+
+    cache.invalidate_all(batch=1)
+    assert cache.get_coin("BTC") is None and cache.get_coin("ETH") is None
+    assert int(fake.get("crypto:views:version")) == int(version) + 1
+
+def test_errors_fall_back_to_loader(cache, fake):
+    fake.fail = True
+    assert cache.read_view({"page": 0}, lambda: [BTC]) == [BTC]
+    assert cache.stats["errors"] == 1 and cache.stats["misses"] == 1
+    # Redis mis de côté après une erreur : pas de nouvel essai avant RETRY_AFTER
+    fake.fail = False
+    assert not cache.enabled
+    assert cache.get_coin("BTC") is None
+    assert cache.stats["errors"] == 1
@@ -0,0 +1,38 @@
+import pytest
+import crypto_history
+import run_crypto
+
+COINS = [{"id": f"coin-{i}", "symbol": f"c{i}", "current_price": 1.0 + i, "market_cap": 100 * i,
+          "total_volume": 10, "price_change_percentage_24h": 0.5} for i in range(5)]
+
+@pytest.fixture
+def history(db, monkeypatch):
+    # mongomock ne crée pas de collection time-series : une collection simple la remplace
+    monkeypatch.setattr(crypto_history, "ensure_history_collection", lambda db: db[crypto_history.COLLECTION_HISTORY])
+    return db[crypto_history.COLLECTION_HISTORY]
+
+def serve(monkeypatch, failing=()):
+    def fetch_page(page, per_page, limiter, api_url):
+        if page in failing:
+            raise ConnectionError("page perdue")
+        return [dict(coin) for coin in COINS[(page - 1) * per_page:page * per_page]]
+    monkeypatch.setattr(run_crypto, "fetch_page", fetch_page)
+
+def extract(db, pages):
+    return run_crypto.extract_crypto(pages=pages, per_page=2, rpm=0, client=db.client, db_name=db.name)
+
+def test_incomplete_run_writes_no_history(db, history, monkeypatch):
+    serve(monkeypatch, failing={2})
+    with pytest.raises(RuntimeError):
+        extract(db, pages=3)
+    assert history.count_documents({}) == 0
+    assert run_crypto.COLLECTION_RAW not in db.list_collection_names()
+
+def test_complete_run_appends_one_snapshot(db, history, monkeypatch):
+    serve(monkeypatch)
+    assert extract(db, pages=3)["docs"] == 5
+
+    points = list(history.find({}, {"_id": 0}))
+    assert len(points) == 5 and len({p["ingested_at"] for p in points}) == 1
+    assert sorted(p["coin"]["symbole"] for p in points) == ["C0", "C1", "C2", "C3", "C4"]
+    assert db[run_crypto.COLLECTION_RAW].count_documents({}) == 5
@@ -0,0 +1,61 @@
+from datetime import datetime
+import mongomock
+import pytest
+import snapshots
+from crypto_queries import DISPLAY_FIELDS, cryptos_frame_from_rows
+from read_cache import bump_version
+
+COLUMNS = ["_id"] + DISPLAY_FIELDS
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch, db):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", str(tmp_path))
+    # mongomock n'implémente pas db.command : l'heure du serveur est celle du client
+    monkeypatch.setattr(mongomock.database.Database, "command",
+                        lambda self, name: {"localTime": datetime.utcnow()}, raising=False)
+    collection = db["market_cap_clean"]
+    collection.insert_many([
+        {"nom": f"Coin {i}", "symbole": f"C{i}", "prix_usd": 1.5 * i, "variation_24h": 0.1 * i,
+         "tendance": ["🔥 Hausse", "🔻 Baisse"][i % 2], "categorie": ["Top 10", "Altcoin", "Meme Coin"][i // 4],
+         "image": None, "market_cap": 1000 * i}
+        for i in range(12)
+    ])
+    return collection
+
+def test_snapshot_frame_has_the_mongo_dtypes(collection):
+    # Plusieurs lots : les dictionnaires de catégorie / tendance grandissent d'un lot à l'autre
+    snapshots.write_snapshot(collection, batch_size=5)
+    frame, _ = snapshots.read_snapshot(collection.full_name, COLUMNS)
+    expected = cryptos_frame_from_rows([{**d, "_id": str(d["_id"])} for d in collection.find()])
+
+    assert list(frame.columns) == list(expected.columns)
+    assert frame.dtypes.to_dict() == expected.dtypes.to_dict()
+    assert sorted(frame["categorie"].astype(str)) == sorted(expected["categorie"].astype(str))
+
+def test_delta_keeps_the_snapshot_dtypes(collection):
+    snapshots.write_snapshot(collection, batch_size=5)
+    collection.update_one({"symbole": "C1"}, {"$set": {"categorie": "Nouvelle", snapshots.MODIFIED_FIELD: datetime.utcnow()}})
+    bump_version(collection)
+
+    frame = snapshots.build_frame(collection, COLUMNS)
+    snapshot, _ = snapshots.read_snapshot(collection.full_name, COLUMNS)
+    assert len(frame) == 12
+    assert frame.dtypes.to_dict() == snapshot.dtypes.to_dict()
+    assert frame.loc[frame["symbole"] == "C1", "categorie"].tolist() == ["Nouvelle"]
+
+def test_delete_and_create_in_one_turn_leave_no_ghost_row(collection):
+    snapshots.write_snapshot(collection, batch_size=5)
+    collection.delete_one({"symbole": "C2"})
+    collection.insert_one({"nom": "Nouveau", "symbole": "NEW", "prix_usd": 1.0, "variation_24h": 0.0,
+                           "tendance": "🔥 Hausse", "categorie": "Altcoin", "image": None, "market_cap": 1,
+                           snapshots.MODIFIED_FIELD: datetime.utcnow()})
+    bump_version(collection)
+
+    frame = snapshots.build_frame(collection, COLUMNS)
+    assert len(frame) == 12
+    assert "C2" not in set(frame["symbole"]) and "NEW" in set(frame["symbole"])
+
+def test_ensure_indexes_covers_the_delta_field(collection):
+    from crypto_queries import ensure_indexes
+    ensure_indexes(collection)
+    assert "modifie_le" in collection.index_information()
@@ -0,0 +1,128 @@
+import os
+import io
+import json
+import hashlib
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# Stockage local des miniatures de mèmes, adressé par contenu :
+# <sha256 de l'image originale>.jpg + un index url -> hash (index.json).
+# La taille totale est bornée, les miniatures les moins récemment lues sont évincées (LRU).
+
+THUMB_DIR = os.getenv("THUMB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".thumbnails"))
+THUMB_SIZE = (320, 320)
+MAX_CACHE_BYTES = int(os.getenv("THUMB_CACHE_MB", "200")) * 1024 * 1024
+
+class ThumbnailStore:
+
+    def __init__(self, root=THUMB_DIR, max_bytes=MAX_CACHE_BYTES, size=THUMB_SIZE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = size
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self._index = {}
+        self._index_mtime = None
+        os.makedirs(root, exist_ok=True)
+
+    # INDEX url -> hash
+
+    def _reload_index(self):
+        """Relit l'index s'il a été réécrit (ex: par le script ETL)"""
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        if mtime != self._index_mtime:
+            with open(self.index_path, encoding="utf-8") as f:
+                self._index = json.load(f)
+            self._index_mtime = mtime
+
+    def _save_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.index_path)
+        self._index_mtime = os.path.getmtime(self.index_path)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, f"{digest}.jpg")
+
+    # LECTURE / ÉCRITURE
+
+    def get(self, url):
+        """Chemin de la miniature, ou None si absente (jamais téléchargée ou évincée)"""
+        with self._lock:
+            self._reload_index()
+            digest = self._index.get(url)
+        if not digest:
+            return None
+        path = self._blob_path(digest)
+        try:
+            os.utime(path) # accès = plus récemment utilisée
+        except OSError:
+            return None
+        return path
+
+    def put(self, url, content):
+        """Réduit l'image et l'enregistre sous le hash de son contenu"""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            img = Image.open(io.BytesIO(content))
+            img.thumbnail(self.size)
+            tmp = path + ".tmp"
+            img.convert("RGB").save(tmp, "JPEG", quality=80, optimize=True)
+            os.replace(tmp, path)
+        with self._lock:
+            self._index[url] = digest
+        return path
+
+    def fetch_many(self, urls, workers=8):
+        """Télécharge en parallèle les images absentes du cache, puis applique la politique LRU"""
+        with self._lock:
+            self._reload_index()
+        missing = [url for url in set(urls) if url and self.get(url) is None]
+
+        def fetch(url):
+            try:
+                response = requests.get(url, timeout=10)
+                response.raise_for_status()
+                return self.put(url, response.content)
+            except Exception as e:
+                print(f"⚠️ Miniature impossible pour {url} : {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            created = sum(1 for path in pool.map(fetch, missing) if path)
+
+        with self._lock:
+            self._save_index()
+        evicted = self.evict()
+        return {"fetched": created, "cached": len(set(urls)) - len(missing), "evicted": evicted}
+
+    def evict(self):
+        """Supprime les miniatures les moins récemment lues tant que le cache dépasse max_bytes"""
+        blobs = []
+        for name in os.listdir(self.root):
+            if name.endswith(".jpg"):
+                stat = os.stat(os.path.join(self.root, name))
+                blobs.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in blobs)
+        evicted = 0
+        for _, size, name in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.root, name))
+            total -= size
+            evicted += 1
+
+        if evicted:
+            with self._lock:
+                kept = {url: d for url, d in self._index.items() if os.path.exists(self._blob_path(d))}
+                self._index = kept
+                self._save_index()
+        return evicted